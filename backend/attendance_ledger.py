@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from records import AttendanceEntry, parse_date
+
+
+class AttendanceLedger:
+    """
+    Every player's "present" check-ins (their attendance history), kept out of the
+    player records in an append-only JSON-lines file:
+
+        {"op": "add", "player_id", "class_id", "date", "time", "coach"}
+        {"op": "remove", "player_id", "class_id"}
+
+    In memory the live entries are indexed by player, then by class, so checking
+    for a duplicate and reversing a check-in are dict lookups. Changes are kept as
+    pending lines until the owner's commit takes them (`snapshot`) and appends them
+    (`write`). Once removed lines outnumber the live ones the file is rewritten
+    with just the live entries. Thread-safe.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._by_player = {}  # player_id -> {class_id: AttendanceEntry}, in check-in order
+        self._pending = []
+        self._lines = 0  # Lines in the file, live or not
+        self._live = 0
+        self._offset = 0  # Bytes of the file applied so far (see follow)
+        self._lock = threading.Lock()
+        self.reload()
+
+    def __len__(self) -> int:
+        return self._live
+
+    # --- Loading ---
+    def reload(self):
+        """Forgets everything (pending lines included) and replays the file."""
+        with self._lock:
+            self._by_player = {}
+            self._pending = []
+            self._lines = self._live = self._offset = 0
+            self._follow()
+
+    def follow(self):
+        """Applies lines another process appended since the last load."""
+        with self._lock:
+            self._follow()
+
+    def _follow(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A line still being appended is picked up next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+                self._lines += 1
+        self._offset += complete
+
+    def _apply(self, row: Dict) -> bool:
+        player_id, class_id = row["player_id"], row["class_id"]
+        history = self._by_player.get(player_id)
+        if row["op"] == "add":
+            if history is None:
+                history = self._by_player[player_id] = {}
+            if class_id in history:
+                return False
+            history[class_id] = AttendanceEntry(class_id, parse_date(row["date"]).toordinal(), row["time"], row.get("coach"))
+            self._live += 1
+            return True
+        if history is None or class_id not in history:
+            return False
+        del history[class_id]
+        if not history:
+            del self._by_player[player_id]
+        self._live -= 1
+        return True
+
+    # --- Changes ---
+    def add(self, player_id: str, entry: AttendanceEntry) -> bool:
+        """Records a check-in. False when the player's history already has that class."""
+        row = {"op": "add", "player_id": player_id, "class_id": entry.class_id, "date": entry.date, "time": entry.time,
+               "coach": entry.coach}
+        return self._change(row)
+
+    def remove(self, player_id: str, class_id: str) -> bool:
+        """Reverses a check-in. False when there was none."""
+        return self._change({"op": "remove", "player_id": player_id, "class_id": class_id})
+
+    def drop_player(self, player_id: str) -> int:
+        """Removes a player's whole history. Returns how many entries it had."""
+        with self._lock:
+            class_ids = list(self._by_player.get(player_id, ()))
+        return sum(self.remove(player_id, class_id) for class_id in class_ids)
+
+    def _change(self, row: Dict) -> bool:
+        with self._lock:
+            if not self._apply(row):
+                return False
+            self._pending.append(json.dumps(row, separators=(",", ":")))
+            return True
+
+    # --- Saving ---
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def snapshot(self) -> Optional[Tuple[bool, List[str]]]:
+        """
+        Takes the pending lines for `write`, as (rewrite, lines): the lines to append,
+        or every live entry when the file is due for a rewrite. None when nothing changed.
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            lines, self._pending = self._pending, []
+            self._lines += len(lines)
+            if self._lines - self._live <= max(self._live, 1000):
+                return False, lines
+            self._lines = self._live
+            return True, [json.dumps({"op": "add", "player_id": player_id, "class_id": e.class_id, "date": e.date,
+                                      "time": e.time, "coach": e.coach}, separators=(",", ":"))
+                          for player_id, history in self._by_player.items() for e in history.values()]
+
+    def write(self, snapshot: Tuple[bool, List[str]]):
+        rewrite, lines = snapshot
+        data = "".join(line + "\n" for line in lines)
+        target = f"{self.path}.tmp" if rewrite else self.path
+        try:
+            with open(target, "w" if rewrite else "a") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                end = f.tell()
+            if rewrite:
+                os.replace(target, self.path)
+        except Exception as e:
+            print(f"Error saving {self.path}: {e}")
+            return
+        with self._lock:
+            self._offset = end
+
+    # --- Queries ---
+    def count(self, player_id: str) -> int:
+        return len(self._by_player.get(player_id, ()))
+
+    def has(self, player_id: str, class_id: str) -> bool:
+        return class_id in self._by_player.get(player_id, ())
+
+    def history(self, player_id: str, after: Optional[tuple] = None) -> Iterator[AttendanceEntry]:
+        """A player's check-ins, newest first, starting after the (date, time, class_id) key `after`."""
+        with self._lock:
+            entries = sorted(self._by_player.get(player_id, {}).values(),
+                             key=lambda e: (e.day, e.time, e.class_id), reverse=True)
+        if after is not None:
+            after = (parse_date(after[0]).toordinal(), after[1], after[2])
+            entries = [e for e in entries if (e.day, e.time, e.class_id) < after]
+        return iter(entries)
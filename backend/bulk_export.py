@@ -0,0 +1,40 @@
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, Sequence
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+# Columns of each export, in CSV order
+MONTH_STATS_COLUMNS = ("month", "student_id", "name", "target", "attended", "absences", "rollover_credits", "achieved")
+ROSTER_COLUMNS = ("date", "time", "coach", "class_id", "max_students", "player_id", "player_name", "level", "status", "makeup")
+LEDGER_COLUMNS = ("date", "time", "coach", "class_id", "player_id", "player_name", "status", "makeup")
+
+
+def check_format(fmt: str) -> str:
+    """The media type of an export format. ValueError for unknown formats."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r} (expected csv or jsonl)")
+    return FORMATS[fmt]
+
+
+def encode_rows(rows: Iterable[Dict], columns: Sequence[str], fmt: str, chunk_size: int = 64 << 10) -> Iterator[bytes]:
+    """
+    Encodes rows as CSV (header line first) or JSON lines, in chunks of about
+    `chunk_size` bytes, pulling rows only as chunks are consumed.
+    """
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([row.get(c) for c in columns])
+    else:
+        write = lambda row: buffer.write(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False, separators=(",", ":")) + "\n")
+    for row in rows:
+        write(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
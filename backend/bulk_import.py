@@ -0,0 +1,228 @@
+import argparse
+import csv
+import io
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from conflict_index import parse_minutes
+from records import parse_date
+
+# Row kinds, with the singular a mixed file may name in a "kind" column
+KINDS = {"players": "player", "classes": "class", "enrollments": "enrollment"}
+FORMATS = ("csv", "jsonl")
+
+# Most rejected rows listed in an import result (all are counted)
+MAX_ERRORS = 1000
+
+
+class ImportRow:
+    """A validated import row: its kind, its line in the source and its cleaned fields."""
+
+    __slots__ = ("kind", "line", "fields")
+
+    def __init__(self, kind: str, line: int, fields: Dict):
+        self.kind = kind
+        self.line = line
+        self.fields = fields
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    """The explicit format, else the one of the file extension. ValueError when neither tells."""
+    if fmt:
+        fmt = fmt.lower()
+    elif filename:
+        ext = os.path.splitext(filename)[1].lower()
+        fmt = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(ext)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt or filename!r} (expected csv or jsonl)")
+    return fmt
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    (line number, row dict) per data row of a CSV (with a header line) or
+    JSON-lines source, read lazily. Rows that cannot be read come as
+    (line number, error message) instead.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        line = 1
+        for row in reader:
+            # A quoted value may span lines: report the row's first one
+            start, line = line + 1, reader.line_num
+            if None in row:
+                yield start, "More values than header columns"
+            else:
+                yield start, {k.strip(): v.strip() if isinstance(v, str) else v for k, v in row.items() if k}
+        return
+    for line, text in enumerate(lines, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, f"Invalid JSON: {e}"
+            continue
+        yield line, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def _text(row: Dict, name: str, required: bool = False) -> Optional[str]:
+    value = row.get(name)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be text")
+    return value
+
+
+def _int(row: Dict, name: str, default: int, minimum: int = 0) -> int:
+    value = row.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number")
+    if number < minimum or isinstance(value, bool):
+        raise ValueError(f"{name} must be a whole number of at least {minimum}")
+    return number
+
+
+def _bool(row: Dict, name: str) -> bool:
+    value = row.get(name)
+    if isinstance(value, bool):
+        return value
+    if value is None or str(value).strip().lower() in ("", "0", "false", "no", "n"):
+        return False
+    if str(value).strip().lower() in ("1", "true", "yes", "y"):
+        return True
+    raise ValueError(f"{name} must be true or false")
+
+
+def _list(row: Dict, name: str) -> List[str]:
+    """A JSON list, or ";"-separated values in CSV."""
+    value = row.get(name)
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(";") if v.strip()]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    raise ValueError(f"{name} must be a list of text values")
+
+
+def _date(row: Dict) -> str:
+    date_str = _text(row, "date", required=True)
+    try:
+        return parse_date(date_str).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date: {date_str!r} (expected YYYY-MM-DD)")
+
+
+def _time(row: Dict) -> str:
+    time_str = _text(row, "time", required=True)
+    if parse_minutes(time_str) is None:
+        raise ValueError(f"Invalid time: {time_str!r} (expected HH:MM)")
+    return time_str
+
+
+def clean_player(row: Dict) -> Dict:
+    default_days = _list(row, "default_days")
+    for slot in default_days:
+        if len(slot.split("|")) < 2:
+            raise ValueError(f"Invalid default day: {slot!r} (expected Day|Time|Coach)")
+    return {
+        "id": _text(row, "id"),
+        "name": _text(row, "name", required=True),
+        "level": _int(row, "level", 0),
+        "default_days": default_days,
+        "makeup_credits": _int(row, "makeup_credits", 0),
+        "has_subscription": _bool(row, "has_subscription"),
+    }
+
+
+def clean_class(row: Dict) -> Dict:
+    return {
+        "id": _text(row, "id"),
+        "date": _date(row),
+        "time": _time(row),
+        "coach": _text(row, "coach"),
+        "max_students": _int(row, "max_students", 4, minimum=1),
+        "student_ids": _list(row, "student_ids"),
+    }
+
+
+def clean_enrollment(row: Dict) -> Dict:
+    """An enrollment names its class by class_id, or by date, time and coach."""
+    fields = {"player_id": _text(row, "player_id", required=True), "class_id": _text(row, "class_id")}
+    if fields["class_id"] is None:
+        fields.update(date=_date(row), time=_time(row), coach=_text(row, "coach"))
+    return fields
+
+
+CLEANERS = {"player": clean_player, "class": clean_class, "enrollment": clean_enrollment}
+
+
+def validate_rows(lines: Iterable[str], fmt: str, kind: Optional[str] = None) -> Tuple[List[ImportRow], List[Dict]]:
+    """
+    Reads and validates a source row by row. `kind` ("players", "classes" or
+    "enrollments") applies to every row; without it each row names its own in a
+    "kind" column. Returns the valid rows and {line, error} per rejected one.
+    """
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"Unknown import kind: {kind!r} (expected one of {', '.join(KINDS)})")
+    rows, errors = [], []
+    for line, row in read_rows(lines, fmt):
+        if isinstance(row, str):
+            errors.append({"line": line, "error": row})
+            continue
+        row_kind = KINDS[kind] if kind else row.get("kind")
+        row_kind = KINDS.get(row_kind, row_kind)
+        if row_kind not in CLEANERS:
+            errors.append({"line": line, "error": f"Unknown row kind: {row_kind!r}"})
+            continue
+        try:
+            rows.append(ImportRow(row_kind, line, CLEANERS[row_kind](row)))
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+    return rows, errors
+
+
+def import_file(manager, stream, filename: Optional[str] = None, fmt: Optional[str] = None, kind: Optional[str] = None) -> Dict:
+    """
+    Validates a binary stream while reading it, then applies the valid rows as
+    one batch (ScheduleManager.import_rows). Returns the counts per kind and the
+    rejected rows, by line. ValueError for an unknown format or kind.
+    """
+    fmt = detect_format(filename, fmt)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+    try:
+        rows, errors = validate_rows(text, fmt, kind)
+    finally:
+        text.detach()  # The caller closes the stream
+    imported, rejected = manager.import_rows(rows)
+    errors = sorted(errors + rejected, key=lambda e: e["line"])
+    return {"imported": imported, "rejected": len(errors), "errors": errors[:MAX_ERRORS]}
+
+
+if __name__ == "__main__":
+    # python bulk_import.py players.csv [--kind players] [--format csv]
+    # Imports into the data files of the current directory (set SHARED_STATE=1 while the server runs).
+    from schedule_manager import ScheduleManager
+
+    parser = argparse.ArgumentParser(description="Import scheduler players, classes and enrollments from CSV or JSON lines.")
+    parser.add_argument("file")
+    parser.add_argument("--kind", choices=list(KINDS), help="kind of every row (default: each row's \"kind\" column)")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    args = parser.parse_args()
+
+    manager = ScheduleManager(shared=os.getenv("SHARED_STATE", "0") == "1")
+    with open(args.file, "rb") as f:
+        result = import_file(manager, f, args.file, args.format, args.kind)
+    print(", ".join(f"{count} {kind}" for kind, count in result["imported"].items()) + " imported")
+    for error in result["errors"]:
+        print(f"line {error['line']}: {error['error']}")
+    if result["rejected"] > len(result["errors"]):
+        print(f"... {result['rejected'] - len(result['errors'])} more rejected rows")
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Optional
+
+
+class ChangeLog:
+    """
+    Bounded log of committed mutations: (version, entity, id, op, payload), plus
+    the month the change belongs to (None for players, which span months).
+
+    Versions increase by one per change. They start from the boot time in
+    milliseconds, so a version handed out by a previous run of the server is
+    older than anything in the log and the client gets a full-reload answer
+    instead of silently missing changes. Thread-safe; listeners are called in
+    version order. Worker processes sharing one store start from the same
+    `version` and `replay` each other's entries, so versions agree across them.
+
+    Entries are recorded while a mutation runs but only `publish`ed once it is
+    saved: until then `since`, `version` and the listeners don't see them, so a
+    client told about a change never refetches the data from before it.
+    """
+
+    def __init__(self, max_entries: int = 5000, version: int = None):
+        self.version = int(time.time() * 1000) if version is None else version  # Last published
+        self.recorded = self.version  # Last recorded, published or not
+        self._entries = deque(maxlen=max_entries)
+        self._pending = deque()  # Recorded, not published yet
+        # Called with every published entry (e.g. to push it to live subscribers)
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def record(self, entity: str, entity_id: str, op: str, payload: Optional[Dict] = None, month: str = None) -> int:
+        """op: "upsert" (payload is the entity's JSON shape) or "delete" (no payload)."""
+        with self._lock:
+            self.recorded += 1
+            entry = {"version": self.recorded, "entity": entity, "id": entity_id, "op": op, "month": month, "payload": payload}
+            self._pending.append(entry)
+            return entry["version"]
+
+    def publish(self, version: int):
+        """Publishes the entries recorded up to `version` (the changes saved so far)."""
+        with self._lock:
+            while self._pending and self._pending[0]["version"] <= version:
+                entry = self._pending.popleft()
+                self.version = entry["version"]
+                self._entries.append(entry)
+                for listener in self.listeners:
+                    listener(entry)
+
+    def replay(self, entry: Dict):
+        """Appends an entry recorded by another process (keeping its version)."""
+        with self._lock:
+            if entry["version"] <= self.recorded:
+                return  # Already known
+            self.version = self.recorded = entry["version"]
+            self._entries.append(entry)
+            for listener in self.listeners:
+                listener(entry)
+
+    def reset(self, version: int):
+        """Forgets all entries: clients older than `version` get a full-reload answer."""
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self.version = self.recorded = max(self.recorded, version)
+
+    def since(self, version: int) -> Optional[List[Dict]]:
+        """Changes after `version`, or None when they are no longer (or never were) in the log."""
+        with self._lock:
+            if version > self.version:
+                return None
+            oldest = self._entries[0]["version"] if self._entries else self.version + 1
+            if version < oldest - 1:
+                return None
+            # Entries are ordered by version: skip the ones the client already has
+            skip = version - (oldest - 1)
+            return list(islice(self._entries, skip, None))
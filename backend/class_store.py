@@ -0,0 +1,517 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from records import ClassSession
+
+
+def _timeline_key(cls: ClassSession):
+    return (cls.day, cls.time, cls.id)
+
+
+def _players_of(classes: Iterable[ClassSession]) -> Set[str]:
+    """Players on the roster or attendance of any of the classes."""
+    players = set()
+    for c in classes:
+        players.update(c.student_ids)
+        players.update(c.attendance or ())
+    return players
+
+
+class _Shard:
+    """
+    The classes of one month, kept in (date, time) order. `keys` runs parallel to
+    `classes`; each class's key is remembered so it can be found again after
+    its date or time was edited in place.
+    """
+
+    def __init__(self, classes: List[ClassSession]):
+        self.classes = sorted(classes, key=_timeline_key)
+        self.keys = [_timeline_key(c) for c in self.classes]
+        self.by_id = {c.id: c for c in self.classes}
+        self._key_of = {c.id: k for c, k in zip(self.classes, self.keys)}
+
+    def insert(self, cls: ClassSession):
+        key = _timeline_key(cls)
+        i = bisect_left(self.keys, key)
+        self.keys.insert(i, key)
+        self.classes.insert(i, cls)
+        self.by_id[cls.id] = cls
+        self._key_of[cls.id] = key
+
+    def discard(self, class_id: str) -> Optional[ClassSession]:
+        cls = self.by_id.pop(class_id, None)
+        if cls is None:
+            return None
+        i = bisect_left(self.keys, self._key_of.pop(class_id))
+        del self.keys[i]
+        del self.classes[i]
+        return cls
+
+    def reposition(self, cls: ClassSession):
+        """Moves a class whose date or time changed back into order."""
+        if self._key_of.get(cls.id) != _timeline_key(cls):
+            self.discard(cls.id)
+            self.insert(cls)
+
+    def between(self, start: int, end: int) -> List[ClassSession]:
+        """Classes with start <= day <= end (date ordinals)."""
+        return self.classes[bisect_left(self.keys, (start,)):bisect_left(self.keys, (end + 1,))]
+
+    def clear(self):
+        self.classes.clear()
+        self.keys.clear()
+        self.by_id.clear()
+        self._key_of.clear()
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], path: str) -> "_Shard":
+        classes = []
+        for row in rows:
+            try:
+                classes.append(ClassSession.from_dict(row))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping malformed class in {path}: {e}")
+        return cls(classes)
+
+
+class ClassStore:
+    """
+    Month-sharded storage for scheduler classes.
+
+    Each month lives in its own file (`classes/2025-01.json`). Months are loaded
+    on first access and kept in a small LRU cache, so startup and save cost depend
+    on the months actually in use rather than on the whole history.
+    Months older than `archive_after_months` are stored gzipped
+    (`classes/2024-01.json.gz`) and are still readable through the same API.
+    The class id -> month index is split by month too (`classes/index/2025-01.json`),
+    so adding or removing a class rewrites the ids of its month only.
+
+    All methods are thread-safe. Saving is split in two: `snapshot` collects the
+    modified months (to be called while no mutation is half-done) and `write`
+    puts them on disk, which can then happen without blocking anyone.
+    """
+
+    def __init__(self, base_dir: str, legacy_file: str = None, max_cached_months: int = 6, archive_after_months: int = 12):
+        self.base_dir = base_dir
+        self.index_dir = os.path.join(base_dir, "index")  # The ids of each month's classes, one file per month
+        self.rosters_dir = os.path.join(base_dir, "rosters")  # The players of each month's classes, one file per month
+        self.max_cached_months = max(2, max_cached_months)
+        self.archive_after_months = archive_after_months
+
+        self._cache = OrderedDict()  # month -> _Shard
+        self._dirty = set()
+        self._index_dirty = set()  # Months whose ids changed since the last snapshot
+        self._pinned = set()  # Months with classes checked out for editing, kept until the next snapshot
+        self._lock = threading.RLock()
+        # month -> number of committed changes, bumped on every flush of that month
+        self.versions = {}
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        if not os.path.isdir(self.index_dir):
+            single_index = os.path.join(base_dir, "index.json")  # Before the index was split by month
+            if os.path.exists(single_index):
+                self._split_index(single_index)
+            elif legacy_file and os.path.exists(legacy_file):
+                self._migrate_legacy(legacy_file)
+            else:
+                os.makedirs(self.index_dir)
+
+        # class_id -> month. A month's file is only rewritten when classes are added to or removed from it.
+        self.reload_index()
+        # month -> players on its rosters or attendance. A month's file is only rewritten when its players change.
+        if not os.path.isdir(self.rosters_dir):
+            self._build_rosters()
+        self.reload_rosters()
+
+    # --- Files ---
+    def _read_json(self, filepath: str, default_type=list):
+        if not os.path.exists(filepath):
+            return default_type()
+        try:
+            opener = gzip.open if filepath.endswith(".gz") else open
+            with opener(filepath, "rt") as f:
+                return json.load(f)
+        except:
+            return default_type()
+
+    def _write_json(self, data, filepath: str):
+        temp_file = f"{filepath}.tmp"
+        # Shards stay readable; the index files below base_dir are only read back by the store
+        indent = 4 if os.path.dirname(filepath) == self.base_dir else None
+        try:
+            if filepath.endswith(".gz"):
+                with open(temp_file, "wb") as raw:
+                    with gzip.open(raw, "wt") as f:
+                        json.dump(data, f)
+                    # Archiving deletes the plain shard next: the archive must be on disk first
+                    raw.flush()
+                    os.fsync(raw.fileno())
+            else:
+                with open(temp_file, "w") as f:
+                    json.dump(data, f, indent=indent)
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_file, filepath)
+        except Exception as e:
+            print(f"Error saving {filepath}: {e}")
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _shard_path(self, month: str) -> str:
+        return os.path.join(self.base_dir, f"{month}.json")
+
+    def _archive_path(self, month: str) -> str:
+        return os.path.join(self.base_dir, f"{month}.json.gz")
+
+    def _index_path(self, month: str) -> str:
+        return os.path.join(self.index_dir, f"{month}.json")
+
+    def _rosters_path(self, month: str) -> str:
+        return os.path.join(self.rosters_dir, f"{month}.json")
+
+    def is_archived(self, month: str) -> bool:
+        return not os.path.exists(self._shard_path(month)) and os.path.exists(self._archive_path(month))
+
+    def _migrate_legacy(self, legacy_file: str):
+        print(f"Migrating {legacy_file} to month shards in {self.base_dir}")
+        by_month = {}
+        for c in self._read_json(legacy_file, list):
+            by_month.setdefault(c["date"][:7], []).append(c)
+        for month, classes in by_month.items():
+            self._write_json(classes, self._shard_path(month))
+        self._write_month_files(self.index_dir, {month: [c["id"] for c in classes] for month, classes in by_month.items()})
+
+    def _split_index(self, single_index: str):
+        by_month = {}
+        for class_id, month in self._read_json(single_index, dict).items():
+            by_month.setdefault(month, []).append(class_id)
+        self._write_month_files(self.index_dir, by_month)
+        os.remove(single_index)
+
+    def _write_month_files(self, directory: str, by_month: Dict[str, list]):
+        """Creates `directory` with a file per month, all at once: a crash never leaves it half-written."""
+        temp_dir = f"{directory}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        for month, data in by_month.items():
+            self._write_json(data, os.path.join(temp_dir, f"{month}.json"))
+        os.replace(temp_dir, directory)
+
+    # --- Shard cache ---
+    def _load(self, month: str) -> _Shard:
+        with self._lock:
+            shard = self._cache.get(month)
+            if shard is not None:
+                self._cache.move_to_end(month)
+                return shard
+
+            path = self._archive_path(month) if self.is_archived(month) else self._shard_path(month)
+            shard = _Shard.from_rows(self._read_json(path, list), path)
+            self._cache[month] = shard
+            self._evict()
+            return shard
+
+    def _evict(self):
+        # Dirty months are never evicted, they would lose unsaved changes; neither are
+        # pinned ones, whose classes may be edited (and marked dirty) any moment now.
+        for month in list(self._cache.keys()):
+            if len(self._cache) <= self.max_cached_months:
+                break
+            if month not in self._dirty and month not in self._pinned:
+                del self._cache[month]
+
+    def mark_dirty(self, month: str):
+        with self._lock:
+            self._dirty.add(month)
+
+    def has_changes(self) -> bool:
+        return bool(self._dirty) or bool(self._index_dirty)
+
+    def pending(self) -> Tuple[List[str], bool]:
+        """Months the next snapshot will save, and whether it saves the id index."""
+        with self._lock:
+            return sorted(self._dirty), bool(self._index_dirty)
+
+    # --- Files changed by another process ---
+    def reload_index(self, months: Iterable[str] = None):
+        """Re-reads the ids of `months` (all when None)."""
+        with self._lock:
+            if months is None:
+                self._index = {}  # class_id -> month
+                self._month_ids = {}  # month -> {class_id}
+                months = [name[:-5] for name in os.listdir(self.index_dir) if name.endswith(".json")]
+            for month in months:
+                for class_id in self._month_ids.pop(month, ()):
+                    self._index.pop(class_id, None)
+                ids = set(self._read_json(self._index_path(month), list))
+                if ids:
+                    self._month_ids[month] = ids
+                    self._index.update(dict.fromkeys(ids, month))
+
+    def _build_rosters(self):
+        # First run with the rosters (or since they were one file): one pass over every month
+        single = os.path.join(self.base_dir, "rosters.json")
+        if os.path.exists(single):
+            rosters = self._read_json(single, dict)
+        else:
+            rosters = {month: sorted(_players_of(self._load(month).classes)) for month in self.months()}
+        self._write_month_files(self.rosters_dir, {month: players for month, players in rosters.items() if players})
+        if os.path.exists(single):
+            os.remove(single)
+
+    def reload_rosters(self, months: Iterable[str] = None):
+        """Re-reads the players of `months` (all when None)."""
+        with self._lock:
+            if months is None:
+                self._rosters = {}  # month -> {player_id}
+                self._months_of = {}  # player_id -> {month}
+                months = [name[:-5] for name in os.listdir(self.rosters_dir) if name.endswith(".json")]
+            for month in months:
+                self._file_players(month, set(self._read_json(self._rosters_path(month), list)))
+
+    def _file_players(self, month: str, players: Set[str]) -> bool:
+        """Files the month under its players. False when they did not change."""
+        old = self._rosters.get(month, set())
+        if players == old:
+            return False
+        for player_id in old - players:
+            months = self._months_of[player_id]
+            months.discard(month)
+            if not months:
+                del self._months_of[player_id]
+        for player_id in players - old:
+            self._months_of.setdefault(player_id, set()).add(month)
+        if players:
+            self._rosters[month] = players
+        else:
+            self._rosters.pop(month, None)
+        return True
+
+    def forget(self, month: str):
+        """Drops a cached month so it is read again from its file; its version moves on."""
+        with self._lock:
+            self._cache.pop(month, None)
+            self._dirty.discard(month)
+            self._pinned.discard(month)
+            self.versions[month] = self.versions.get(month, 0) + 1
+
+    def reload(self):
+        """Forgets every cached month and re-reads the id index."""
+        with self._lock:
+            for month in set(self._cache) | set(self.versions):
+                self.forget(month)
+            self.reload_index()
+            self.reload_rosters()
+
+    def snapshot(self) -> List[Tuple[str, Optional[object]]]:
+        """
+        Serializes every modified month (and the id index if needed) and marks them
+        saved. Returns (path, data) pairs for `write`; data None deletes the file.
+        """
+        files, rosters = [], []
+        with self._lock:
+            for month in sorted(self._dirty):
+                self.versions[month] = self.versions.get(month, 0) + 1
+                shard = self._cache.get(month)
+                if shard is None:
+                    continue
+                players = _players_of(shard.classes)
+                if self._file_players(month, players):
+                    rosters.append((self._rosters_path(month), sorted(players) or None))
+                if not shard.classes:
+                    files += [(self._shard_path(month), None), (self._archive_path(month), None)]
+                elif self.is_archived(month):
+                    files.append((self._archive_path(month), [c.to_dict() for c in shard.classes]))
+                else:
+                    files.append((self._shard_path(month), [c.to_dict() for c in shard.classes]))
+            self._dirty.clear()
+            self._pinned.clear()
+
+            # Rosters before the months: a crash in between leaves a player listed under a
+            # month they have just left (harmless) rather than missing from one they joined
+            files = rosters + files
+            for month in sorted(self._index_dirty):
+                ids = self._month_ids.get(month)
+                files.append((self._index_path(month), sorted(ids) if ids else None))
+            self._index_dirty.clear()
+            self._evict()
+        return files
+
+    def write(self, files: List[Tuple[str, Optional[object]]]):
+        """Writes a snapshot. Snapshots must be written in the order they were taken."""
+        for path, data in files:
+            if data is not None:
+                self._write_json(data, path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def flush(self):
+        """Writes every modified month (and the id index if needed)."""
+        self.write(self.snapshot())
+
+    # --- Queries ---
+    def months(self, prefix: str = None) -> List[str]:
+        """Sorted months that hold classes, optionally limited to a date prefix ("2025", "2025-01", "2025-01-1")."""
+        with self._lock:
+            months = sorted(m for m, ids in self._month_ids.items() if ids)
+            if not prefix:
+                return months
+            return [m for m in months if m.startswith(prefix) or prefix.startswith(m)]
+
+    def version(self, month: str) -> int:
+        return self.versions.get(month, 0)
+
+    def version_range(self, prefix: str = None, first: str = None, last: str = None) -> int:
+        """
+        Version of the months matching a date prefix and/or lying within [first, last]
+        (both "YYYY-MM"). It only grows, with every committed change to one of them.
+        """
+        with self._lock:
+            total = 0
+            for month, version in self.versions.items():
+                if prefix and not (month.startswith(prefix) or prefix.startswith(month)):
+                    continue
+                if (first and month < first) or (last and month > last):
+                    continue
+                total += version
+            return total
+
+    def month_of(self, class_id: str) -> Optional[str]:
+        return self._index.get(class_id)
+
+    def months_of_player(self, player_id: str) -> List[str]:
+        """Months with the player on a roster or attendance when last saved, plus the months modified since."""
+        with self._lock:
+            return sorted(self._months_of.get(player_id, set()) | self._dirty)
+
+    def get_month(self, month: str) -> List[ClassSession]:
+        with self._lock:
+            if not self._month_ids.get(month):
+                return []
+            return self._load(month).classes
+
+    def get(self, class_id: str) -> Optional[ClassSession]:
+        with self._lock:
+            month = self._index.get(class_id)
+            if month is None:
+                return None
+            return self._load(month).by_id.get(class_id)
+
+    def checkout(self, class_id: str) -> Optional[ClassSession]:
+        """
+        Like get(), for a class about to be edited: its month stays cached until the
+        next snapshot, so concurrent loads of other months cannot evict it (and the
+        edit with it) before it is marked dirty.
+        """
+        with self._lock:
+            month = self._index.get(class_id)
+            if month is None:
+                return None
+            self._pinned.add(month)
+            return self._load(month).by_id.get(class_id)
+
+    def iter_classes(self, prefix: str = None) -> Iterator[ClassSession]:
+        """Iterates classes whose date starts with `prefix` (all classes if omitted), in (date, time) order."""
+        for month in self.months(prefix):
+            classes = self._load(month).classes
+            if not prefix or len(prefix) <= 7:
+                yield from classes  # Whole months
+            else:
+                for c in classes:
+                    if c.date.startswith(prefix):
+                        yield c
+
+    def iter_range(self, start: date = None, end: date = None) -> Iterator[ClassSession]:
+        """Iterates classes dated within [start, end] (open-ended when omitted), in (date, time) order."""
+        first = f"{start.year:04d}-{start.month:02d}" if start else None
+        last = f"{end.year:04d}-{end.month:02d}" if end else None
+        lo = start.toordinal() if start else 1
+        hi = end.toordinal() if end else date.max.toordinal()
+        for month in self.months():
+            if (first and month < first) or (last and month > last):
+                continue
+            yield from self._load(month).between(lo, hi)
+
+    # --- Mutations ---
+    def add(self, cls: ClassSession):
+        with self._lock:
+            month = cls.month
+            shard = self._load(month) if self._month_ids.get(month) else self._cache.setdefault(month, _Shard([]))
+            shard.insert(cls)
+            self._index[cls.id] = month
+            self._month_ids.setdefault(month, set()).add(cls.id)
+            self._index_dirty.add(month)
+            self.mark_dirty(month)
+
+    def remove(self, class_id: str) -> Optional[ClassSession]:
+        with self._lock:
+            month = self._index.get(class_id)
+            if month is None:
+                return None
+            cls = self._load(month).discard(class_id)
+            del self._index[class_id]
+            self._month_ids[month].discard(class_id)
+            self._index_dirty.add(month)
+            self.mark_dirty(month)
+            return cls
+
+    def remove_month(self, month: str) -> List[ClassSession]:
+        with self._lock:
+            if not self._month_ids.get(month):
+                return []
+            shard = self._load(month)
+            removed = list(shard.classes)
+            for c in removed:
+                self._index.pop(c.id, None)
+            shard.clear()
+            self._month_ids[month] = set()
+            self._index_dirty.add(month)
+            self.mark_dirty(month)
+            return removed
+
+    def changed(self, cls: ClassSession):
+        """Marks the class's month for saving and keeps the month in order after a date or time edit."""
+        with self._lock:
+            self._load(cls.month).reposition(cls)
+            self.mark_dirty(cls.month)
+
+    def relocate(self, cls: ClassSession, old_month: str):
+        """Moves a class to the shard of its (changed) date."""
+        with self._lock:
+            new_month = cls.month
+            if new_month == old_month:
+                self.changed(cls)
+                return
+            self._load(old_month).discard(cls.id)
+            self._month_ids[old_month].discard(cls.id)
+            self._index_dirty.add(old_month)
+            self.mark_dirty(old_month)
+            del self._index[cls.id]
+            self.add(cls)
+
+    # --- Archiving ---
+    def archive_cold_months(self, today: date = None) -> List[str]:
+        """Compresses months older than the archive horizon. Returns the months archived."""
+        if self.archive_after_months is None:
+            return []
+        today = today or date.today()
+        total = today.year * 12 + (today.month - 1) - self.archive_after_months
+        horizon = f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+        archived = []
+        for month in self.months():
+            if month >= horizon or self.is_archived(month):
+                continue
+            path = self._shard_path(month)
+            if not os.path.exists(path):
+                continue
+            self._write_json(self._read_json(path, list), self._archive_path(month))
+            os.remove(path)
+            archived.append(month)
+        return archived
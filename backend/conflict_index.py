@@ -0,0 +1,169 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional
+from records import ClassSession, iso_date
+
+
+def parse_minutes(time_str: str) -> Optional[int]:
+    """"9:30" -> 570. None for anything that is not a "H:MM" time of day."""
+    try:
+        hours, minutes = map(int, time_str.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class ScheduleConflict(Exception):
+    """A class would overlap another class of its coach, or need more courts than there are."""
+
+    def __init__(self, conflicts: List[Dict]):
+        super().__init__("; ".join(c["message"] for c in conflicts))
+        self.conflicts = conflicts
+
+
+class ConflictIndex:
+    """
+    Per-day interval indexes of class start times: one for every (day, coach) and
+    one for every day over all courts. Each class lasts `session_minutes`, so two
+    classes overlap when they start less than that apart, and the classes a new
+    one would overlap are found by bisecting the day's sorted starts: O(log n)
+    plus the overlaps found.
+
+    `courts`: how many classes can run at the same time (None: no limit).
+    Months are indexed on first use, like SlotIndex; afterwards the manager
+    refreshes single classes whenever their date, time or coach may have changed.
+    Classes whose time is not "H:MM" are left out. Thread-safe.
+    """
+
+    def __init__(self, session_minutes: int = 60, courts: Optional[int] = None):
+        self.session_minutes = session_minutes
+        self.courts = courts
+        self._entries = {}  # class_id -> (day, start minute, coach, month)
+        self._by_day = {}  # day -> sorted [(start, class_id)]
+        self._by_coach = {}  # (day, coach) -> sorted [(start, class_id)]
+        self._months = set()
+        self._lock = threading.RLock()
+
+    def is_built(self, month: str) -> bool:
+        return month in self._months
+
+    def build(self, month: str, classes: Iterable[ClassSession]):
+        with self._lock:
+            if month in self._months:
+                return  # Built meanwhile by another thread
+            self._months.add(month)
+            for cls in classes:
+                self.refresh(cls)
+
+    def refresh(self, cls: ClassSession):
+        """(Re)indexes a class. No-op while its month has not been indexed."""
+        with self._lock:
+            start = parse_minutes(cls.time)
+            entry = (cls.day, start, cls.coach or None, cls.month)
+            if self._entries.get(cls.id) == entry:
+                return  # Roster or attendance change: nothing to move
+            self.remove(cls.id)
+            if cls.month not in self._months or start is None:
+                return
+            self._entries[cls.id] = entry
+            insort(self._by_day.setdefault(cls.day, []), (start, cls.id))
+            if cls.coach:
+                insort(self._by_coach.setdefault((cls.day, cls.coach), []), (start, cls.id))
+
+    def remove(self, class_id: str):
+        with self._lock:
+            entry = self._entries.pop(class_id, None)
+            if entry is None:
+                return
+            day, start, coach, _ = entry
+            self._discard(self._by_day, day, (start, class_id))
+            if coach:
+                self._discard(self._by_coach, (day, coach), (start, class_id))
+
+    @staticmethod
+    def _discard(index: Dict, key, item):
+        items = index[key]
+        i = bisect_left(items, item)
+        if i < len(items) and items[i] == item:
+            del items[i]
+        if not items:
+            del index[key]
+
+    def drop_month(self, month: str):
+        with self._lock:
+            for class_id in [cid for cid, e in self._entries.items() if e[3] == month]:
+                self.remove(class_id)
+            self._months.discard(month)
+
+    # --- Queries ---
+    def _overlapping(self, items: List, start: int, ignore) -> List:
+        """The (start, class_id) items of a sorted list that overlap a class starting at `start`."""
+        lo = bisect_left(items, (start - self.session_minutes + 1,))
+        hi = bisect_left(items, (start + self.session_minutes,))
+        return [item for item in items[lo:hi] if item[1] not in ignore]
+
+    def _peak(self, starts: List[int], start: int) -> int:
+        """Most of the classes starting at (sorted) `starts` that run at once during a class starting at `start`."""
+        points = [start] + starts[bisect_right(starts, start):]
+        return max(bisect_right(starts, t) - bisect_right(starts, t - self.session_minutes) for t in points)
+
+    def check(self, day: int, time: str, coach: Optional[str], ignore: Iterable[str] = ()) -> List[Dict]:
+        """Conflicts a class on `day` at `time` with `coach` would have; classes in `ignore` don't count."""
+        start = parse_minutes(time)
+        if start is None:
+            return []
+        ignore = set(ignore)
+        conflicts = []
+        with self._lock:
+            if coach:
+                clash = self._overlapping(self._by_coach.get((day, coach), []), start, ignore)
+                if clash:
+                    conflicts.append(self._conflict("coach", day, start, coach, clash))
+            if self.courts is not None:
+                busy = self._overlapping(self._by_day.get(day, []), start, ignore)
+                if busy and self._peak([s for s, _ in busy], start) + 1 > self.courts:
+                    conflicts.append(self._conflict("courts", day, start, None, busy))
+        return conflicts
+
+    def month_report(self, month: str) -> List[Dict]:
+        """Every coach double-booking and court overbooking of an indexed month, by date and time."""
+        conflicts = []
+        with self._lock:
+            for (day, coach), items in self._by_coach.items():
+                if self._entries[items[0][1]][3] != month:
+                    continue
+                # Chains of classes each overlapping the next
+                group = [items[0]]
+                for item in items[1:] + [None]:
+                    if item is not None and item[0] - group[-1][0] < self.session_minutes:
+                        group.append(item)
+                        continue
+                    if len(group) > 1:
+                        conflicts.append(self._conflict("coach", day, group[0][0], coach, group))
+                    group = [item]
+            if self.courts is not None:
+                for day, items in self._by_day.items():
+                    if self._entries[items[0][1]][3] != month:
+                        continue
+                    reported = set()
+                    for i, (start, _) in enumerate(items):
+                        running = items[bisect_left(items, (start - self.session_minutes + 1,)):i + 1]
+                        if len(running) > self.courts and not reported.issuperset(cid for _, cid in running):
+                            reported.update(cid for _, cid in running)
+                            conflicts.append(self._conflict("courts", day, start, None, running))
+        return sorted(conflicts, key=lambda c: (c["date"], c["time"], c["type"], c["coach"] or ""))
+
+    def _conflict(self, kind: str, day: int, start: int, coach: Optional[str], items: List) -> Dict:
+        date, time = iso_date(day), format_minutes(start)
+        if kind == "coach":
+            message = f"Coach {coach} already has a class around {time} on {date}"
+        else:
+            message = f"All {self.courts} courts are taken around {time} on {date}"
+        return {"type": kind, "date": date, "time": time, "coach": coach,
+                "class_ids": [cid for _, cid in items], "message": message}
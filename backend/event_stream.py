@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Dict, List, Optional
+
+# Queued in place of the dropped events when a subscriber falls behind
+_RESET = object()
+
+
+class Subscription:
+    """
+    One live listener, optionally limited to a month ("YYYY-MM") or a single class.
+    Events are queued on the subscriber's event loop; at most `max_queue` wait at
+    once. A subscriber that falls that far behind loses its backlog and gets a
+    single "reset" event instead, telling it to catch up via /scheduler/changes,
+    so a slow client never holds memory or blocks writers.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, month: str = None, class_id: str = None, max_queue: int = 256):
+        self.loop = loop
+        self.month = month
+        self.class_id = class_id
+        self.queue = asyncio.Queue(max_queue)
+
+    def matches(self, entry: Dict) -> bool:
+        if self.class_id is not None:
+            return entry["entity"] == "class" and entry["id"] == self.class_id
+        # Month-less changes (players) concern every month
+        return self.month is None or entry["month"] is None or entry["month"] == self.month
+
+    def _put(self, item):
+        # Runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESET)
+
+
+class EventHub:
+    """Fans change log entries out to live subscribers. `publish` may be called from any thread."""
+
+    def __init__(self, heartbeat_seconds: float = 15.0):
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, month: str = None, class_id: str = None, max_queue: int = 256) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop(), month, class_id, max_queue)
+        with self._lock:
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def publish(self, entry: Dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.matches(entry):
+                try:
+                    sub.loop.call_soon_threadsafe(sub._put, entry)
+                except RuntimeError:
+                    self.unsubscribe(sub)  # Loop already closed
+
+    @staticmethod
+    def format(entry: Dict) -> str:
+        data = {k: entry[k] for k in ("id", "op", "month", "payload")}
+        return f"id: {entry['version']}\nevent: {entry['entity']}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    async def stream(self, sub: Subscription, version: int, backlog: Optional[List[Dict]] = ()) -> AsyncIterator[str]:
+        """
+        SSE text for a subscription that has seen everything up to `version`.
+        `backlog` holds the changes missed since then (after a reconnect), or None
+        when they are no longer available and the client must reload. Live events
+        follow, skipping any already sent, with a comment line as heartbeat.
+        """
+        try:
+            if backlog is None:
+                yield f"id: {version}\nevent: reset\ndata: {json.dumps({'version': version})}\n\n"
+            else:
+                for entry in backlog:
+                    version = entry["version"]
+                    if sub.matches(entry):
+                        yield self.format(entry)
+            while True:
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if item is _RESET:
+                    # Dropped events: catch up with /scheduler/changes?since=<last event id>
+                    yield "event: reset\ndata: {}\n\n"
+                elif item["version"] > version:
+                    version = item["version"]
+                    yield self.format(item)
+        finally:
+            self.unsubscribe(sub)
@@ -1,13 +1,26 @@
 import json
 import os
+import threading
 from datetime import datetime
 from typing import List, Dict
+from shared_state import SharedJournal, journaled
 
 class HistoryManager:
-    def __init__(self, storage_file="history.json"):
+    def __init__(self, storage_file="history.json", shared=False):
         self.storage_file = storage_file
+        # Shared mode: several worker processes use the same file (see shared_state.py)
+        self.journal = SharedJournal(f"{storage_file}.journal", self._apply_shared) if shared else None
+        self.write_lock = threading.RLock()  # Writes from concurrent requests, one at a time
         self.history = self._load_history()
 
+    def _apply_shared(self, entries):
+        self.history = self._load_history()
+
+    def refresh(self):
+        # Picks up records saved by other workers (one stat() when there are none)
+        if self.journal:
+            self.journal.poll()
+
     def _load_history(self) -> Dict[str, List[Dict]]:
         if not os.path.exists(self.storage_file):
             return {}
@@ -25,11 +38,14 @@ class HistoryManager:
                 f.flush()
                 os.fsync(f.fileno())
             os.replace(temp_file, self.storage_file)
+            if self.journal:
+                self.journal.note(history=True)
         except Exception as e:
             print(f"Error saving {self.storage_file}: {e}")
             if os.path.exists(temp_file):
                 os.remove(temp_file)
 
+    @journaled
     def add_record(self, username: str, shot_type: str, score: float, feedback: List[str]):
         if username not in self.history:
             self.history[username] = []
@@ -0,0 +1,68 @@
+import json
+import uuid
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from fastapi import Request, Response
+
+# Versions restart with the process, so ETags from a previous run must never match
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+class ResponseCache:
+    """
+    Conditional GETs for version-stamped reads.
+
+    `respond(request, stamp, build)` answers with an ETag derived from `stamp`
+    (a version, or tuple of versions, that changes whenever the payload may),
+    returns 304 when the client already holds that ETag, and otherwise serves
+    the JSON bytes cached for the request URL, calling `build()` only when the
+    stamp moved. The most recently used `max_entries` URLs are kept.
+    `scope` tells apart the ETags of caches serving the same URLs (tenants).
+
+    Stamps are counters of this process. Workers sharing one store pass
+    `shared_version` instead: a version they all agree on (the change log's),
+    which then makes the ETag on its own, so any worker can answer 304.
+    """
+
+    def __init__(self, max_entries: int = 128, scope: str = "", shared_version: Optional[Callable[[], int]] = None):
+        self.max_entries = max_entries
+        self.scope = scope
+        self.shared_version = shared_version
+        self._entries = OrderedDict()  # url -> (etag, body)
+
+    def etag(self, stamp: Hashable) -> str:
+        if self.shared_version is not None:
+            return f'W/"v{self.scope and "-" + self.scope}-{self.shared_version()}"'
+        if isinstance(stamp, tuple):
+            stamp = ".".join(str(s) for s in stamp)
+        return f'W/"{_BOOT_ID}{self.scope and "-" + self.scope}-{stamp}"'
+
+    @staticmethod
+    def _matches(request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = [t.strip() for t in header.split(",")]
+        return "*" in tags or etag in tags or etag[2:] in tags  # Weak comparison
+
+    def respond(self, request: Request, stamp: Hashable, build: Callable[[], object]) -> Response:
+        etag = self.etag(stamp)
+        # no-cache: browsers keep the body but revalidate it on every read
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self._matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        url = str(request.url)
+        cached = self._entries.get(url)
+        if cached and cached[0] == etag:
+            self._entries.move_to_end(url)
+            body = cached[1]
+        else:
+            # Same encoding as FastAPI's JSONResponse
+            body = json.dumps(build(), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+            self._entries[url] = (etag, body)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,107 @@
+import threading
+from contextlib import contextmanager
+from typing import Hashable, Iterable
+
+
+class RWLock:
+    """
+    Readers-writer lock: any number of readers, or one writer. A waiting writer
+    keeps new readers out, so writers are not starved by a steady read load.
+
+    Both sides are re-entrant per thread and the writer may take the read side
+    too. Upgrading (read -> write) raises RuntimeError: two upgrading readers
+    would wait for each other forever.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, "reads", 0)
+        # Nested reads, and reads inside this thread's write, are already covered
+        counted = depth == 0 and self._writer != threading.get_ident()
+        if counted:
+            with self._cond:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.reads = depth + 1
+        try:
+            yield
+        finally:
+            self._local.reads = depth
+            if counted:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+        else:
+            if getattr(self._local, "reads", 0):
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            with self._cond:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                with self._cond:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class KeyedLocks:
+    """
+    One re-entrant lock per key (e.g. ("class", id)), created on first use and
+    dropped once nobody holds or waits for it.
+
+    `hold` takes all keys of an operation in sorted order, so operations locking
+    overlapping sets of keys always acquire them in the same order and cannot
+    deadlock (with ("class", ...) < ("player", ...), classes come first).
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locks = {}  # key -> [lock, holders and waiters]
+
+    @contextmanager
+    def hold(self, keys: Iterable[Hashable]):
+        held = []
+        try:
+            for key in sorted(set(keys)):
+                with self._mutex:
+                    slot = self._locks.get(key)
+                    if slot is None:
+                        slot = self._locks[key] = [threading.RLock(), 0]
+                    slot[1] += 1
+                slot[0].acquire()
+                held.append(key)
+            yield
+        finally:
+            for key in reversed(held):
+                with self._mutex:
+                    slot = self._locks[key]
+                    slot[0].release()
+                    slot[1] -= 1
+                    if not slot[1]:
+                        del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -1,20 +1,72 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Body, Query, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import shutil
 import os
+import threading
+import time
 from analysis import analyze_video
-from user_manager import UserManager
-from history_manager import HistoryManager
-from schedule_manager import ScheduleManager
-
-
-app = FastAPI()
-user_manager = UserManager()
-history_manager = HistoryManager()
-schedule_manager = ScheduleManager()
+from bulk_import import import_file
+from bulk_export import LEDGER_COLUMNS, MONTH_STATS_COLUMNS, ROSTER_COLUMNS, check_format, encode_rows
+from records import VersionConflict
+from conflict_index import ScheduleConflict
+from paging import decode_cursor, parse_fields, take_page
+from tenants import TenantBound, TenantMiddleware, TenantRegistry
+
+
+# SHARED_STATE=1 lets several workers (uvicorn main:app --workers 4) share the data files:
+# writes are serialized through file-locked journals and every worker follows the others'.
+SHARED_STATE = os.getenv("SHARED_STATE", "0") == "1"
+
+# Several centers in one process: TENANTS_DIR=tenants serves each center from its own
+# directory (tenants/<id>/), picked per request by the X-Tenant header or a /t/<id>/ path
+# prefix. Requests naming neither use the files of the working directory, as before.
+# Centers load on first use and are dropped from memory after TENANTS_IDLE_SECONDS unused.
+tenants = TenantRegistry(
+    root=os.getenv("TENANTS_DIR"),
+    shared=SHARED_STATE,
+    idle_seconds=float(os.getenv("TENANTS_IDLE_SECONDS", 900)),
+    max_loaded=int(os.getenv("TENANTS_MAX_LOADED", 32)),
+    create_missing=os.getenv("TENANTS_AUTO_CREATE", "0") == "1",
+    schedule_options=dict(
+        max_cached_months=int(os.getenv("SCHEDULER_CACHED_MONTHS", 6)),
+        archive_after_months=int(os.getenv("SCHEDULER_ARCHIVE_AFTER_MONTHS", 12)),
+        # Conflict checks: class length, and how many classes can run at once (unset: no court limit)
+        session_minutes=int(os.getenv("SCHEDULER_SESSION_MINUTES", 60)),
+        courts=int(os.environ["SCHEDULER_COURTS"]) if os.getenv("SCHEDULER_COURTS") else None,
+    ),
+)
+# The current request's tenant's stores
+user_manager = TenantBound(tenants, "users")
+history_manager = TenantBound(tenants, "history")
+schedule_manager = TenantBound(tenants, "schedule")
+# Serialized scheduler reads, revalidated with ETags built from the store versions
+scheduler_cache = TenantBound(tenants, "cache")
+# Live change events for open scheduler screens (GET /scheduler/events)
+scheduler_events = TenantBound(tenants, "events")
+
+def sync_shared_state():
+    # Before each request: apply what other workers saved (a stat() per store when nothing changed)
+    user_manager.refresh()
+    history_manager.refresh()
+    schedule_manager.refresh()
+
+def follow_shared_state(interval: float = 1.0):
+    # Keeps the scheduler's live events flowing while this worker gets no requests
+    while True:
+        time.sleep(interval)
+        for tenant in tenants.loaded():
+            try:
+                tenant.schedule.refresh()
+            except Exception as e:
+                print(f"Error following shared state of tenant {tenant.id}: {e}")
+
+app = FastAPI(dependencies=[Depends(sync_shared_state)] if SHARED_STATE else [])
+if SHARED_STATE:
+    threading.Thread(target=follow_shared_state, daemon=True).start()
 
 class UserRegister(BaseModel):
     username: str
@@ -41,6 +93,10 @@ class ResetPassword(BaseModel):
     token: str
     new_password: str
 
+# Every request runs against its tenant's stores (each tenant creates its default admin on load).
+# Added first so CORS and compression wrap its answers too.
+app.add_middleware(TenantMiddleware, registry=tenants)
+
 # Allow CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -49,9 +105,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Initialize default admin
-user_manager.create_default_admin()
+# Large list responses (players, classes, users) are sent compressed
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 UPLOAD_DIR = "uploads"
 PROCESSED_DIR = "processed"
@@ -63,10 +118,50 @@ os.makedirs(PROCESSED_DIR, exist_ok=True)
 def health_check():
     return {"status": "healthy"}
 
+def _page_key(cursor: Optional[str], size: int) -> Optional[list]:
+    # Sort key of the last item of the previous page, or None for the first page
+    if cursor is None:
+        return None
+    try:
+        key = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(key) != size or not all(isinstance(k, str) for k in key):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+def _expected_version(if_match: Optional[str], version: Optional[int]) -> Optional[int]:
+    # The record version the client edited: If-Match ("3", W/"3" or 3) or the body/query version.
+    # None (no header, or If-Match: *) updates whatever version is current, as before.
+    if if_match is None or if_match.strip() == "*":
+        return version
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a record version")
+
+def _version_conflict(e: VersionConflict) -> HTTPException:
+    # 409 with the current version, so the client can reload the record and retry
+    return HTTPException(status_code=409, detail=str(e), headers={"ETag": f'"{e.current}"'})
+
+def _schedule_conflict(e: ScheduleConflict) -> HTTPException:
+    # 409 listing the classes in the way (coach double-booked, or no court left)
+    return HTTPException(status_code=409, detail={"message": str(e), "conflicts": e.conflicts})
+
 @app.get("/users")
-def get_users():
+def get_users(fields: str = None, cursor: str = None, limit: int = Query(None, ge=1, le=1000)):
     # In a real app, check for admin token/session here!
-    return user_manager.get_all_users()
+    # Without a limit the full list is returned, as before; with one, a page plus next_cursor.
+    fields = parse_fields(fields)
+    if limit is None and cursor is None:
+        return user_manager.get_all_users(fields)
+    after = _page_key(cursor, 1)
+    users = user_manager.iter_users(fields, after and after[0])
+    page, next_cursor = take_page(users, lambda u: (u[0],), limit or 100)
+    return {"items": [u for _, u in page], "next_cursor": next_cursor}
 
 @app.put("/users/{username}")
 def update_user(username: str, user: UserUpdate):
@@ -258,6 +353,15 @@ class ClassSeriesCreate(BaseModel):
 class CopySchedule(BaseModel):
     target_month: str
 
+class ScheduleRollout(BaseModel):
+    first_month: str
+    last_month: str
+    source_month: Optional[str] = None # Copy this month's weekly slots...
+    series_ids: Optional[List[str]] = None # ...or these series' slots
+    carry_targets: bool = True
+    enroll_defaults: bool = False # Standing enrollments for players whose default_days name a slot
+    dry_run: bool = False
+
 class BulkDelete(BaseModel):
     class_ids: List[str]
 
@@ -267,12 +371,24 @@ class ClassUpdate(BaseModel):
     coach: Optional[str] = None
     student_ids: Optional[List[str]] = None
     max_students: Optional[int] = None
+    version: Optional[int] = None # Expected version (or send If-Match); 409 when the class changed since
+
+class SeriesUpdate(BaseModel):
+    time: Optional[str] = None
+    coach: Optional[str] = None
+    max_students: Optional[int] = None
+    version: Optional[int] = None # Expected version (or send If-Match); 409 when the series changed since
 
 class BookMakeup(BaseModel):
     class_id: str
     player_id: str
     use_credit: bool = False
 
+class MakeupAutoAssign(BaseModel):
+    month: str
+    player_ids: Optional[List[str]] = None # Default: every player with makeup credits
+    use_preferences: bool = True
+
 class MarkAbsent(BaseModel):
     class_id: str
     player_id: str
@@ -283,12 +399,17 @@ class RosterRemove(BaseModel):
 class MarkAttendance(BaseModel):
     status: str
 
+class BulkAttendance(BaseModel):
+    statuses: Dict[str, str] = {}  # player_id -> status, for the class in the path
+    classes: Dict[str, Dict[str, str]] = {}  # class_id -> {player_id -> status}
+
 class PlayerUpdate(BaseModel):
     name: Optional[str] = None
     level: Optional[int] = None
     default_days: Optional[List[str]] = None
     makeup_credits: Optional[int] = None
     has_subscription: Optional[bool] = None
+    version: Optional[int] = None # Expected version (or send If-Match); 409 when the player changed since
 
 class TargetUpdate(BaseModel):
     target: int
@@ -300,22 +421,65 @@ def add_schedule_player(player: SchedulePlayerCreate):
     # Handle multiple initial enrollments
     for ie in player.enrollments:
         schedule_manager.batch_enroll(
-            new_player["id"], 
+            new_player.id, 
             ie.get("month"), 
             ie.get("weekday"), 
             ie.get("time"), 
             ie.get("coach")
         )
         
-    return new_player
+    return new_player.to_dict()
+
+@app.post("/scheduler/import")
+def import_schedule_rows(file: UploadFile = File(...), kind: str = None, format: str = None):
+    # Onboarding: CSV (with a header line) or JSON lines of players, classes and enrollments,
+    # validated while read and saved once. kind applies to every row, else each row has a "kind".
+    # Rejected rows come back with their line numbers; the others are imported.
+    try:
+        return import_file(schedule_manager, file.file, file.filename, format, kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/scheduler/players")
-def get_schedule_players():
-    return schedule_manager.get_players()
+def get_schedule_players(request: Request, fields: str = None, cursor: str = None, limit: int = Query(None, ge=1, le=1000)):
+    # fields: comma-separated projection, e.g. "id,name,level".
+    # Without a limit the full list is returned, as before; with one, a page plus next_cursor.
+    fields = parse_fields(fields)
+
+    def build():
+        if limit is None and cursor is None:
+            return [p.to_dict(fields) for p in schedule_manager.get_players()]
+        players = schedule_manager.iter_players(_page_key(cursor, 2))
+        page, next_cursor = take_page(players, lambda p: (p.name, p.id), limit or 100)
+        return {"items": [p.to_dict(fields) for p in page], "next_cursor": next_cursor}
+
+    return scheduler_cache.respond(request, schedule_manager.players_version, build)
+
+@app.get("/scheduler/players/search")
+def search_schedule_players(q: str = Query(..., min_length=1), level: int = None, has_subscription: bool = None,
+                            limit: int = Query(20, ge=1, le=100), fields: str = None):
+    # Typeahead: accent- and case-insensitive name matches, best first
+    fields = parse_fields(fields)
+    return [p.to_dict(fields) for p in schedule_manager.search_players(q, level, has_subscription, limit)]
+
+@app.get("/scheduler/players/{player_id}/attendance")
+def get_player_attendance(player_id: str, cursor: str = None, limit: int = Query(20, ge=1, le=1000)):
+    # Attendance history from the ledger, newest first, a page at a time
+    if schedule_manager.get_player(player_id) is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    try:
+        history = schedule_manager.iter_attendance_history(player_id, _page_key(cursor, 3))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    page, next_cursor = take_page(history, lambda h: (h.date, h.time, h.class_id), limit)
+    return {"items": [h.to_dict() for h in page], "next_cursor": next_cursor}
 
 @app.delete("/scheduler/players/{player_id}")
-def delete_schedule_player(player_id: str):
-    success = schedule_manager.delete_player(player_id)
+def delete_schedule_player(player_id: str, version: int = None, if_match: Optional[str] = Header(None)):
+    try:
+        success = schedule_manager.delete_player(player_id, _expected_version(if_match, version))
+    except VersionConflict as e:
+        raise _version_conflict(e)
     if not success:
         raise HTTPException(status_code=404, detail="Player not found")
     return {"message": "Player deleted"}
@@ -349,11 +513,15 @@ def unenroll_player_series(player_id: str, data: BatchEnroll):
     return {"message": f"Unenrolled from {count} classes"}
 
 @app.patch("/scheduler/players/{player_id}")
-def update_schedule_player(player_id: str, data: PlayerUpdate):
-    success = schedule_manager.update_player(player_id, data.name, data.level, data.default_days, data.makeup_credits, data.has_subscription)
+def update_schedule_player(player_id: str, data: PlayerUpdate, if_match: Optional[str] = Header(None)):
+    try:
+        success = schedule_manager.update_player(player_id, data.name, data.level, data.default_days, data.makeup_credits, data.has_subscription,
+                                                 _expected_version(if_match, data.version))
+    except VersionConflict as e:
+        raise _version_conflict(e)
     if not success:
         raise HTTPException(status_code=404, detail="Player not found")
-    return {"message": "Player updated"}
+    return {"message": "Player updated", "version": schedule_manager.get_player(player_id).version}
 
 @app.post("/scheduler/players/{player_id}/credits")
 def adjust_player_credits_endpoint(player_id: str, amount: int):
@@ -371,11 +539,23 @@ def remove_student_from_class_endpoint(class_id: str, player_id: str, data: Rost
 
 @app.post("/scheduler/classes")
 def create_class_schedule(cls: ClassCreate):
-    return schedule_manager.create_class(cls.date, cls.time, cls.student_ids, cls.coach, cls.max_students)
+    try:
+        new_class = schedule_manager.create_class(cls.date, cls.time, cls.student_ids, cls.coach, cls.max_students)
+    except ScheduleConflict as e:
+        raise _schedule_conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return new_class.to_dict()
 
 @app.post("/scheduler/classes/series")
 def create_class_series(data: ClassSeriesCreate):
-    return schedule_manager.create_monthly_series(data.month, data.weekday, data.time, data.student_ids, data.coach, data.max_students)
+    try:
+        created = schedule_manager.create_monthly_series(data.month, data.weekday, data.time, data.student_ids, data.coach, data.max_students)
+    except ScheduleConflict as e:
+        raise _schedule_conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [c.to_dict() for c in created]
 
 @app.post("/scheduler/classes/copy")
 def copy_class_schedule(data: CopySchedule):
@@ -384,30 +564,220 @@ def copy_class_schedule(data: CopySchedule):
         raise HTTPException(status_code=400, detail=msg)
     return {"message": msg}
 
+@app.post("/scheduler/classes/rollout")
+def roll_out_class_schedule(data: ScheduleRollout):
+    # A whole season in one call; dry_run previews it. Slots a month already has are skipped.
+    try:
+        return schedule_manager.roll_out_schedule(data.first_month, data.last_month, data.source_month, data.series_ids,
+                                                  data.carry_targets, data.enroll_defaults, data.dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.patch("/scheduler/classes/{class_id}")
-def update_class_schedule(class_id: str, data: ClassUpdate):
-    success = schedule_manager.update_class(class_id, data.date, data.time, data.coach, data.student_ids, data.max_students)
+def update_class_schedule(class_id: str, data: ClassUpdate, if_match: Optional[str] = Header(None)):
+    expected = _expected_version(if_match, data.version)
+    try:
+        success = schedule_manager.update_class(class_id, data.date, data.time, data.coach, data.student_ids, data.max_students, expected)
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    except ScheduleConflict as e:
+        raise _schedule_conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not success:
         raise HTTPException(status_code=404, detail="Class not found")
-    return {"message": "Class updated"}
+    return {"message": "Class updated", "version": schedule_manager.get_class(class_id).version}
 
 @app.post("/scheduler/classes/{class_id}/propagate")
 def propagate_class_properties(class_id: str, match_time: str = None):
     # match_time is optional query param
-    count = schedule_manager.propagate_class_properties(class_id, match_time)
+    try:
+        count = schedule_manager.propagate_class_properties(class_id, match_time)
+    except ScheduleConflict as e:
+        raise _schedule_conflict(e)
     return {"updated_count": count}
 
+@app.get("/scheduler/conflicts")
+def get_schedule_conflicts(month: str):
+    # Coach double-bookings, and court overbookings when SCHEDULER_COURTS is set
+    return {"month": month, "conflicts": schedule_manager.find_conflicts(month)}
+
+@app.get("/scheduler/series")
+def get_series_schedule(month: str):
+    # Weekly series of the month; their classes carry the series_id
+    return [s.to_dict() for s in schedule_manager.get_series(month)]
+
+@app.patch("/scheduler/series/{series_id}")
+def update_series_schedule(series_id: str, data: SeriesUpdate, if_match: Optional[str] = Header(None)):
+    # Changes every occurrence, except the dates that override the changed field
+    try:
+        count = schedule_manager.update_series(series_id, data.time, data.coach, data.max_students, _expected_version(if_match, data.version))
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    except ScheduleConflict as e:
+        raise _schedule_conflict(e)
+    if count is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return {"updated_count": count, "version": schedule_manager.get_one_series(series_id).version}
+
+@app.delete("/scheduler/series/{series_id}")
+def delete_series_schedule(series_id: str, version: int = None, if_match: Optional[str] = Header(None)):
+    try:
+        count = schedule_manager.delete_series(series_id, _expected_version(if_match, version))
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    if count is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return {"deleted_count": count}
+
+@app.post("/scheduler/series/{series_id}/players/{player_id}")
+def enroll_player_in_series_by_id(series_id: str, player_id: str):
+    count = schedule_manager.enroll_in_series(series_id, player_id)
+    if count is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return {"message": f"Enrolled in {count} classes"}
+
+@app.delete("/scheduler/series/{series_id}/players/{player_id}")
+def unenroll_player_from_series_by_id(series_id: str, player_id: str):
+    count = schedule_manager.unenroll_from_series(series_id, player_id)
+    if count is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return {"message": f"Unenrolled from {count} classes"}
+
 @app.get("/scheduler/classes")
-def get_classes_schedule(month: str = None):
-    return schedule_manager.get_classes(month)
+def get_classes_schedule(request: Request, month: str = None, date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"),
+                         fields: str = None, cursor: str = None, limit: int = Query(None, ge=1, le=1000)):
+    # from/to: inclusive "YYYY-MM-DD" bounds, e.g. one week of the calendar.
+    # Without a limit the full list is returned, as before; with one, a page plus next_cursor.
+    fields = parse_fields(fields)
+
+    def build():
+        try:
+            if limit is None and cursor is None:
+                return [c.to_dict(fields) for c in schedule_manager.get_classes(month, date_from, date_to)]
+            # One past the page tells take_page whether another page follows
+            classes = schedule_manager.iter_classes(month, date_from, date_to, _page_key(cursor, 3), (limit or 100) + 1)
+            page, next_cursor = take_page(classes, lambda c: (c.date, c.time, c.id), limit or 100)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": [c.to_dict(fields) for c in page], "next_cursor": next_cursor}
+
+    stamp = schedule_manager.classes_version(month, date_from, date_to)
+    return scheduler_cache.respond(request, stamp, build)
+
+@app.get("/scheduler/changes")
+def get_schedule_changes(since: int):
+    # Delta sync: mutations after `since` (the "version" of a previous answer).
+    # reset=True means the log no longer reaches back that far: reload everything.
+    changes = schedule_manager.changes.since(since)
+    if changes is None:
+        return {"version": schedule_manager.changes.version, "reset": True, "changes": []}
+    return {"version": schedule_manager.changes.version, "reset": False, "changes": changes}
+
+@app.get("/scheduler/events")
+async def stream_schedule_events(request: Request, month: str = None, class_id: str = None):
+    # Server-sent events: one event per committed change (event: class/player/target),
+    # optionally only for one month or one class. Reconnecting clients send Last-Event-ID
+    # and get what they missed, or a "reset" event when it is no longer in the log.
+    sub = scheduler_events.subscribe(month, class_id)
+    version = schedule_manager.changes.version
+    backlog = ()
+    last_id = request.headers.get("last-event-id")
+    if last_id:
+        try:
+            since = int(last_id)
+        except ValueError:
+            since = -1
+        backlog = schedule_manager.changes.since(since)
+        if backlog is not None:
+            version = since
+    return StreamingResponse(
+        scheduler_events.stream(sub, version, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/scheduler/month-stats")
-def get_month_stats(month: str):
-    return schedule_manager.calculate_month_stats(month)
+def get_month_stats(request: Request, month: str):
+    stamp = schedule_manager.month_stats_version(month)
+    return scheduler_cache.respond(request, stamp, lambda: schedule_manager.calculate_month_stats(month))
+
+def _export(name: str, rows, columns, format: str) -> StreamingResponse:
+    # Rows are encoded as the client reads them, never collected in one list
+    try:
+        media_type = check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        encode_rows(rows, columns, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
+
+@app.get("/scheduler/export/month-stats")
+def export_month_stats(month: str = None, first_month: str = Query(None, alias="from"), last_month: str = Query(None, alias="to"),
+                       format: str = "csv"):
+    # Per-student stats of one month, or of every month of an inclusive "YYYY-MM" range, for spreadsheets
+    first_month = first_month or month
+    if not first_month:
+        raise HTTPException(status_code=400, detail="month or from is required")
+    last_month = last_month or first_month
+    try:
+        rows = schedule_manager.iter_month_stats_rows(first_month, last_month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _export(f"month-stats-{first_month}-{last_month}", rows, MONTH_STATS_COLUMNS, format)
+
+@app.get("/scheduler/export/rosters")
+def export_rosters(date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"), coach: str = None,
+                   format: str = "csv"):
+    # Every rostered player of every class within the inclusive "YYYY-MM-DD" bounds, optionally one coach's
+    try:
+        rows = schedule_manager.iter_roster_rows(date_from, date_to, coach)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _export(f"rosters-{date_from or 'start'}-{date_to or 'end'}", rows, ROSTER_COLUMNS, format)
+
+@app.get("/scheduler/export/attendance")
+def export_attendance(date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"), coach: str = None,
+                      format: str = "csv"):
+    # Attendance ledger: one row per check-in (present / absent), read a month at a time
+    try:
+        rows = schedule_manager.iter_roster_rows(date_from, date_to, coach, ledger=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _export(f"attendance-{date_from or 'start'}-{date_to or 'end'}", rows, LEDGER_COLUMNS, format)
+
+@app.get("/scheduler/analytics/occupancy")
+def get_occupancy(request: Request, month: str = None, first_month: str = Query(None, alias="from"), last_month: str = Query(None, alias="to")):
+    # One month, or an inclusive "YYYY-MM" range (from/to) of up to 36 months:
+    # fill rates per month, per coach and month, and per weekday x slot x coach
+    first_month = first_month or month
+    if not first_month:
+        raise HTTPException(status_code=400, detail="month or from is required")
+    last_month = last_month or first_month
+
+    def build():
+        try:
+            return schedule_manager.occupancy_report(first_month, last_month)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    stamp = schedule_manager.occupancy_version(first_month, last_month)
+    return scheduler_cache.respond(request, stamp, build)
+
+@app.get("/scheduler/month-stats/verify")
+def verify_month_stats(month: str):
+    # Rebuilds the month's attendance counters from scratch and reports any drift
+    mismatches = schedule_manager.verify_month_counts(month)
+    return {"month": month, "consistent": not mismatches, "mismatches": mismatches}
 
 @app.delete("/scheduler/classes/{class_id}")
-def delete_class_schedule(class_id: str):
-    success = schedule_manager.delete_class(class_id)
+def delete_class_schedule(class_id: str, version: int = None, if_match: Optional[str] = Header(None)):
+    try:
+        success = schedule_manager.delete_class(class_id, _expected_version(if_match, version))
+    except VersionConflict as e:
+        raise _version_conflict(e)
     if not success:
         raise HTTPException(status_code=404, detail="Class not found")
     return {"message": "Class deleted"}
@@ -433,6 +803,17 @@ def book_makeup_slot(data: BookMakeup):
         raise HTTPException(status_code=400, detail=msg)
     return {"message": msg}
 
+@app.post("/scheduler/makeups/auto-assign")
+def preview_makeup_auto_assign(data: MakeupAutoAssign):
+    return schedule_manager.plan_makeup_assignments(data.month, data.player_ids, data.use_preferences)
+
+@app.post("/scheduler/makeups/auto-assign/{plan_id}/commit")
+def commit_makeup_auto_assign(plan_id: str):
+    success, msg = schedule_manager.commit_makeup_plan(plan_id)
+    if not success:
+        raise HTTPException(status_code=404 if msg == "Plan not found" else 409, detail=msg)
+    return {"message": msg}
+
 @app.post("/scheduler/classes/{class_id}/attendance/{player_id}")
 def mark_attendance_endpoint(class_id: str, player_id: str, data: MarkAttendance):
     success, msg = schedule_manager.mark_attendance(class_id, player_id, data.status)
@@ -440,6 +821,21 @@ def mark_attendance_endpoint(class_id: str, player_id: str, data: MarkAttendance
         raise HTTPException(status_code=400, detail=msg)
     return {"message": msg}
 
+@app.post("/scheduler/classes/{class_id}/attendance")
+def mark_class_attendance(class_id: str, data: BulkAttendance):
+    # End-of-session check-in: every player of the class in one call and one save
+    return _mark_attendance_bulk({class_id: data.statuses})
+
+@app.post("/scheduler/attendance")
+def mark_attendance_bulk(data: BulkAttendance):
+    return _mark_attendance_bulk(data.classes)
+
+def _mark_attendance_bulk(marks: Dict[str, Dict[str, str]]):
+    if not any(marks.values()):
+        raise HTTPException(status_code=400, detail="No attendance to mark")
+    results = schedule_manager.mark_attendance_bulk(marks)
+    return {"marked": sum(r["success"] for r in results), "results": results}
+
 @app.post("/scheduler/mark-absent")
 def mark_class_absent(data: MarkAbsent):
     success, msg = schedule_manager.mark_absent(data.class_id, data.player_id)
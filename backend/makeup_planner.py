@@ -0,0 +1,270 @@
+import heapq
+from collections import deque
+from typing import Dict, List, Tuple
+from records import ClassSession, Player
+from slot_keys import normalize_coach
+
+INF = float("inf")
+
+
+class MinCostFlow:
+    """
+    Min-cost max-flow (primal-dual): Dijkstra with potentials finds the current
+    shortest distance, then a Dinic blocking flow saturates every path of that
+    length at once. With the small integer costs used by the planner this needs
+    only a handful of phases.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.adj = [[] for _ in range(n)]
+        self.to = []
+        self.cap = []
+        self.cost = []
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        e = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.adj[u].append(e)
+        self.adj[v].append(e + 1)
+        return e
+
+    def flow(self, e: int) -> int:
+        return self.cap[e ^ 1]
+
+    def solve(self, s: int, t: int) -> Tuple[int, int]:
+        n, to, cap, cost, adj = self.n, self.to, self.cap, self.cost, self.adj
+        pot = [0] * n
+        total_flow = total_cost = 0
+        while True:
+            # Shortest reduced distances over the residual graph
+            dist = [INF] * n
+            dist[s] = 0
+            heap = [(0, s)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                pu = pot[u]
+                for e in adj[u]:
+                    if cap[e] > 0:
+                        v = to[e]
+                        nd = d + cost[e] + pu - pot[v]
+                        if nd < dist[v]:
+                            dist[v] = nd
+                            heapq.heappush(heap, (nd, v))
+            if dist[t] == INF:
+                break
+            for v in range(n):
+                if dist[v] < INF:
+                    pot[v] += dist[v]
+
+            # Blocking flows on the admissible (zero reduced cost) subgraph
+            while True:
+                level = [-1] * n
+                level[s] = 0
+                queue = deque([s])
+                while queue:
+                    u = queue.popleft()
+                    for e in adj[u]:
+                        v = to[e]
+                        if cap[e] > 0 and level[v] < 0 and cost[e] + pot[u] - pot[v] == 0:
+                            level[v] = level[u] + 1
+                            queue.append(v)
+                if level[t] < 0:
+                    break
+                it = [0] * n
+
+                def push(u, limit):
+                    if u == t:
+                        return limit
+                    edges = adj[u]
+                    while it[u] < len(edges):
+                        e = edges[it[u]]
+                        v = to[e]
+                        if cap[e] > 0 and level[v] == level[u] + 1 and cost[e] + pot[u] - pot[v] == 0:
+                            pushed = push(v, min(limit, cap[e]))
+                            if pushed:
+                                cap[e] -= pushed
+                                cap[e ^ 1] += pushed
+                                return pushed
+                        it[u] += 1
+                    return 0
+
+                while True:
+                    pushed = push(s, INF)
+                    if not pushed:
+                        break
+                    total_flow += pushed
+                    total_cost += pushed * (pot[t] - pot[s])
+        return total_flow, total_cost
+
+
+def plan_makeups(players: List[Player], slots: List[Tuple[ClassSession, Dict]], use_preferences: bool = True) -> Dict:
+    """
+    Assigns makeup credits of `players` to open classes in one pass.
+
+    `slots` are (class, open-slot entry) pairs. A player may join a class when the
+    class has room, the player is not on its roster yet, and every rostered student
+    has a level <= the player's (the makeup level rule). Each credit fills one seat,
+    a player gets at most one seat per class, and classes on one of the player's
+    default weekday/time slots are preferred when `use_preferences` is set (other
+    coaches at that slot; the player's own default class already has them).
+
+    Players with the same level and preferences are grouped and classes with the
+    same weekday, time, coach and roster max level are pooled, so the flow network
+    stays small (groups + pools + levels) regardless of how many players and dates
+    there are. The pooled flow is then split into concrete (player, class) seats.
+
+    Returns {"assignments": [(player, class)], "unassigned": {player_id: credits}}.
+    Assignments are ordered so that applying them in sequence never breaks the level rule.
+    """
+    # --- Pools of classes ---
+    pools = {}  # (weekday, time, coach, max_level) -> pool
+    for cls, entry in slots:
+        free = cls.max_students - entry["active"]
+        if free <= 0:
+            continue
+        key = (cls.weekday, cls.time, normalize_coach(cls.coach), entry["max_level"])
+        pool = pools.setdefault(key, {"key": key, "classes": []})
+        pool["classes"].append({"cls": cls, "free": free, "taken": set(cls.student_ids)})
+    for pool in pools.values():
+        pool["free"] = sum(c["free"] for c in pool["classes"])
+
+    # --- Groups of players ---
+    groups = {}  # (level, preferred slots) -> group
+    for p in players:
+        credits = p.makeup_credits
+        if credits <= 0:
+            continue
+        prefs = p.default_slots if use_preferences else frozenset()
+        group = groups.setdefault((p.level, prefs), {"level": p.level, "prefs": prefs, "players": [], "supply": 0})
+        group["players"].append({"player": p, "left": credits})
+        group["supply"] += credits
+
+    pool_list = list(pools.values())
+    group_list = list(groups.values())
+    levels = sorted({k[3] for k in pools})
+
+    # --- Network: source -> group -> (preferred pool | level ladder -> pool) -> sink ---
+    source, sink = 0, 1
+    n = 2
+    group_node = {}
+    for i in range(len(group_list)):
+        group_node[i] = n
+        n += 1
+    pool_node = {}
+    for j in range(len(pool_list)):
+        pool_node[j] = n
+        n += 1
+    ladder_node = {}
+    for level in levels:
+        ladder_node[level] = n
+        n += 1
+
+    mcf = MinCostFlow(n)
+    for j, pool in enumerate(pool_list):
+        mcf.add_edge(pool_node[j], sink, pool["free"], 0)
+    # ladder[l] reaches pools whose roster max level is l, then steps down to lower levels
+    ladder_edges = {}
+    for idx, level in enumerate(levels):
+        if idx > 0:
+            mcf.add_edge(ladder_node[level], ladder_node[levels[idx - 1]], INF, 0)
+    for j, pool in enumerate(pool_list):
+        ladder_edges[j] = mcf.add_edge(ladder_node[pool["key"][3]], pool_node[j], INF, 0)
+
+    pools_by_slot = {}
+    for j, pool in enumerate(pool_list):
+        pools_by_slot.setdefault(pool["key"][:2], []).append(j)
+
+    group_edges = []  # (group index, pool index, edge)
+    entry_edges = {}
+    for i, group in enumerate(group_list):
+        mcf.add_edge(source, group_node[i], group["supply"], 0)
+        for slot in {s[:2] for s in group["prefs"]}:
+            for j in pools_by_slot.get(slot, ()):
+                if pool_list[j]["key"][3] <= group["level"] and pool_list[j]["key"][:3] not in group["prefs"]:
+                    cap = min(group["supply"], len(group["players"]) * len(pool_list[j]["classes"]))
+                    group_edges.append((i, j, mcf.add_edge(group_node[i], pool_node[j], cap, 0)))
+        # Non-preferred route: enter the ladder at the highest level the group may join
+        entry = None
+        for level in levels:
+            if level <= group["level"]:
+                entry = level
+        if entry is not None:
+            entry_edges[i] = (entry, mcf.add_edge(group_node[i], ladder_node[entry], group["supply"], 1))
+
+    mcf.solve(source, sink)
+
+    # --- Decompose pooled flow into (group, pool, units) ---
+    demand = []  # (group index, pool index, units)
+    for i, j, e in group_edges:
+        if mcf.flow(e):
+            demand.append((i, j, mcf.flow(e)))
+    # Walk the ladder from the top: groups entering at a level can feed any pool at or below it
+    waiting = []
+    entering = {}
+    for i, (level, e) in entry_edges.items():
+        if mcf.flow(e):
+            entering.setdefault(level, []).append([i, mcf.flow(e)])
+    for level in reversed(levels):
+        waiting.extend(entering.get(level, []))
+        for j, pool in enumerate(pool_list):
+            if pool["key"][3] != level:
+                continue
+            need = mcf.flow(ladder_edges[j])
+            while need and waiting:
+                i, units = waiting[-1]
+                take = min(units, need)
+                demand.append((i, j, take))
+                need -= take
+                waiting[-1][1] -= take
+                if waiting[-1][1] == 0:
+                    waiting.pop()
+
+    # --- Seat players in concrete classes ---
+    assignments = []
+    for i, j, units in demand:
+        group = group_list[i]
+        classes = pool_list[j]["classes"]
+        candidates = [m for m in group["players"] if m["left"] > 0]
+        candidates.sort(key=lambda m: -m["left"])
+        k = 0
+        while units and candidates:
+            member = candidates[k % len(candidates)]
+            pid = member["player"].id
+            best = None
+            for c in classes:
+                if c["free"] > 0 and pid not in c["taken"] and (best is None or c["free"] > best["free"]):
+                    best = c
+            if best is None or member["left"] == 0:
+                candidates.remove(member)
+                continue
+            best["free"] -= 1
+            best["taken"].add(pid)
+            member["left"] -= 1
+            assignments.append((member["player"], best["cls"]))
+            units -= 1
+            k += 1
+
+    # Repair: seats the decomposition could not place (player already on every class of a pool)
+    leftovers = [m for g in group_list for m in g["players"] if m["left"] > 0]
+    if leftovers and any(c["free"] > 0 for pool in pool_list for c in pool["classes"]):
+        for member in sorted(leftovers, key=lambda m: m["player"].level):
+            pid = member["player"].id
+            for pool in pool_list:
+                if pool["key"][3] > member["player"].level:
+                    continue
+                for c in pool["classes"]:
+                    if member["left"] and c["free"] > 0 and pid not in c["taken"]:
+                        c["free"] -= 1
+                        c["taken"].add(pid)
+                        member["left"] -= 1
+                        assignments.append((member["player"], c["cls"]))
+
+    # Lower levels first: each newcomer then only meets rostered levels <= their own
+    assignments.sort(key=lambda a: (a[0].level, a[1].day, a[1].time))
+    unassigned = {m["player"].id: m["left"] for g in group_list for m in g["players"] if m["left"] > 0}
+    return {"assignments": assignments, "unassigned": unassigned}
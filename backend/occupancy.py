@@ -0,0 +1,122 @@
+import threading
+from datetime import date
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+from records import ClassSession
+from slot_keys import WEEKDAYS, normalize_coach
+
+# Measures of a (date, slot, coach) cell, in array order
+MEASURES = ("sessions", "capacity", "enrolled", "present", "absent")
+
+
+class MonthOccupancy:
+    """
+    Occupancy of one month as a dense array of shape (measure, date, slot, coach):
+    `days` are the date ordinals, `slots` the class times and `coaches` the coach
+    labels of the month, all sorted.
+    """
+
+    def __init__(self, month: str, classes: Iterable[ClassSession]):
+        year, mon = map(int, month.split("-"))
+        first = date(year, mon, 1).toordinal()
+        classes = list(classes)
+        self.days = list(range(first, (date(year + mon // 12, mon % 12 + 1, 1)).toordinal()))
+        self.slots = sorted({c.time for c in classes})
+        self.coaches = sorted({normalize_coach(c.coach) for c in classes})
+        slot_index = {s: i for i, s in enumerate(self.slots)}
+        coach_index = {c: i for i, c in enumerate(self.coaches)}
+
+        keys, values = [], []
+        for cls in classes:
+            statuses = list((cls.attendance or {}).values())
+            keys.append((cls.day - first, slot_index[cls.time], coach_index[normalize_coach(cls.coach)]))
+            values.append((1, cls.max_students, len(cls.student_ids), statuses.count("present"), statuses.count("absent")))
+
+        shape = (len(MEASURES), len(self.days), len(self.slots), len(self.coaches))
+        self.array = np.zeros(shape, dtype=np.int64)
+        if keys:
+            d, s, c = np.array(keys, dtype=np.intp).T
+            np.add.at(self.array, (slice(None), d, s, c), np.array(values, dtype=np.int64).T)
+
+
+def _rate(part, whole):
+    """part / whole, element-wise, None where whole is 0 (rounded to 4 places)."""
+    if isinstance(part, list):
+        return [_rate(p, w) for p, w in zip(part, whole)]
+    return round(part / whole, 4) if whole else None
+
+
+class OccupancyCache:
+    """
+    Per-month occupancy arrays, rebuilt only when the month's version moves, and
+    the reports aggregated from them. Thread-safe.
+    """
+
+    def __init__(self, max_months: int = 48):
+        self.max_months = max_months
+        self._months = {}  # month -> (version, MonthOccupancy)
+        self._lock = threading.Lock()
+
+    def month(self, month: str, version, classes: Callable[[], Iterable[ClassSession]]) -> MonthOccupancy:
+        with self._lock:
+            cached = self._months.get(month)
+            if cached and cached[0] == version:
+                return cached[1]
+        occupancy = MonthOccupancy(month, classes())
+        with self._lock:
+            self._months[month] = (version, occupancy)
+            while len(self._months) > self.max_months:
+                self._months.pop(next(iter(self._months)))
+        return occupancy
+
+    @staticmethod
+    def report(months: List[str], occupancies: List[MonthOccupancy]) -> Dict:
+        """
+        Aggregates months into:
+        - totals: every measure per month, plus fill_rate (enrolled / capacity) and
+          attendance_rate (present / (present + absent))
+        - by_coach: every measure as a [coach][month] matrix, plus fill_rate
+        - heatmap: every measure as a [weekday][slot][coach] cube over all months, plus fill_rate
+        """
+        slots = sorted({s for o in occupancies for s in o.slots})
+        coaches = sorted({c for o in occupancies for c in o.coaches})
+        totals, by_coach, heatmap = OccupancyCache._aggregate(occupancies, slots, coaches)
+
+        totals = dict(zip(MEASURES, totals))
+        totals["fill_rate"] = _rate(totals["enrolled"], totals["capacity"])
+        totals["attendance_rate"] = _rate(totals["present"], [p + a for p, a in zip(totals["present"], totals["absent"])])
+        by_coach = dict(zip(MEASURES, by_coach))
+        by_coach["fill_rate"] = _rate(by_coach["enrolled"], by_coach["capacity"])
+        heatmap = dict(zip(MEASURES, heatmap))
+        heatmap["fill_rate"] = _rate(heatmap["enrolled"], heatmap["capacity"])
+        return {
+            "months": months,
+            "weekdays": WEEKDAYS,
+            "slots": slots,
+            "coaches": coaches,
+            "measures": list(MEASURES),
+            "totals": totals,
+            "by_coach": by_coach,
+            "heatmap": heatmap,
+        }
+
+    @staticmethod
+    def _aggregate(occupancies: List[MonthOccupancy], slots: List[str], coaches: List[str]):
+        slot_of = {s: i for i, s in enumerate(slots)}
+        coach_of = {c: i for i, c in enumerate(coaches)}
+        totals = np.zeros((len(MEASURES), len(occupancies)), dtype=np.int64)
+        by_coach = np.zeros((len(MEASURES), len(coaches), len(occupancies)), dtype=np.int64)
+        heatmap = np.zeros((len(MEASURES), len(WEEKDAYS), len(slots), len(coaches)), dtype=np.int64)
+        for m, o in enumerate(occupancies):
+            if not o.slots:
+                continue
+            coach_map = np.array([coach_of[c] for c in o.coaches], dtype=np.intp)
+            slot_map = np.array([slot_of[s] for s in o.slots], dtype=np.intp)
+            weekday_of = np.array([date.fromordinal(d).weekday() for d in o.days], dtype=np.intp)
+            totals[:, m] = o.array.sum(axis=(1, 2, 3))
+            by_coach[:, coach_map, m] = o.array.sum(axis=(1, 2))
+            # Dates fold onto their weekday; local slots and coaches onto the report's
+            np.add.at(heatmap, (slice(None), weekday_of[:, None, None], slot_map[None, :, None], coach_map[None, None, :]), o.array)
+        return totals.tolist(), by_coach.tolist(), heatmap.tolist()
@@ -0,0 +1,39 @@
+import base64
+import json
+from typing import Iterable, List, Optional, Tuple
+
+
+def encode_cursor(key: Tuple) -> str:
+    """Opaque cursor for the sort key of the last item of a page."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Sort key encoded by encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """"id,name, level" -> ["id", "name", "level"] (None when no projection was asked for)."""
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+def take_page(items: Iterable, key_of, limit: int) -> Tuple[list, Optional[str]]:
+    """
+    Takes up to `limit` items from an iterable already positioned after the cursor.
+    Returns the page and the cursor of its last item, or None when nothing follows.
+    """
+    page = []
+    for item in items:
+        if len(page) == limit:
+            return page, encode_cursor(key_of(page[-1]))
+        page.append(item)
+    return page, None
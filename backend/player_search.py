@@ -0,0 +1,158 @@
+import math
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Share of a typed word's trigrams a name's word needs to be a fuzzy match
+MIN_TRIGRAM_SCORE = 0.6
+
+
+def normalize_name(text: Optional[str]) -> str:
+    """"  João da Conceição-Lopes" -> "joao da conceicao lopes": no accents, casefolded, punctuation as spaces."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    letters = "".join(ch if ch.isalnum() else " " for ch in decomposed.casefold() if not unicodedata.combining(ch))
+    return " ".join(letters.split())
+
+
+def trigrams(normalized: str, open_end: bool = False) -> Set[str]:
+    """Trigrams of a normalized name, words padded with spaces. open_end: no padding after the end (a typed prefix)."""
+    padded = f" {normalized}" if open_end else f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PlayerSearchIndex:
+    """
+    Typeahead over player names, accent- and case-insensitive ("joao" finds "João").
+
+    Results come in three tiers, each walked in order until `limit` players are found:
+    1. names starting with the query, by name (bisecting the sorted names)
+    2. names with a word starting with each query word, by matched word (bisecting
+       the sorted (word, player_id) list for the query word with the fewest matches)
+    3. names whose words share most of a query word's trigrams (the word typed from
+       the middle, small typos), best first. The trigrams index the distinct words,
+       not the players, so scoring stays small however common a surname is.
+    So a query costs about `limit` steps, however many players match.
+    Kept up to date by `add`, `update` and `remove`. Thread-safe.
+    """
+
+    def __init__(self, players: Iterable[Tuple[str, str]] = ()):
+        """players: (player_id, name) pairs to start with, indexed in one pass."""
+        self._names = {player_id: normalize_name(name) for player_id, name in players}  # player_id -> normalized name
+        self._by_name = sorted((n, pid) for pid, n in self._names.items())  # sorted [(name, player_id)]
+        self._words = sorted({(w, pid) for pid, n in self._names.items() for w in n.split()})  # sorted [(word, player_id)]
+        self._vocab = Counter(word for word, _ in self._words)  # word -> players with it
+        self._grams = {}  # trigram -> {word}
+        for word in self._vocab:
+            for gram in trigrams(word):
+                self._grams.setdefault(gram, set()).add(word)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, player_id: str, name: str):
+        with self._lock:
+            self._remove(player_id)
+            self._add(player_id, normalize_name(name))
+
+    def update(self, player_id: str, name: str):
+        normalized = normalize_name(name)
+        with self._lock:
+            if self._names.get(player_id) == normalized:
+                return
+            self._remove(player_id)
+            self._add(player_id, normalized)
+
+    def remove(self, player_id: str):
+        with self._lock:
+            self._remove(player_id)
+
+    def _add(self, player_id: str, normalized: str):
+        self._names[player_id] = normalized
+        insort(self._by_name, (normalized, player_id))
+        for word in set(normalized.split()):
+            insort(self._words, (word, player_id))
+            self._vocab[word] += 1
+            if self._vocab[word] == 1:
+                for gram in trigrams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+
+    def _remove(self, player_id: str):
+        normalized = self._names.pop(player_id, None)
+        if normalized is None:
+            return
+        del self._by_name[bisect_left(self._by_name, (normalized, player_id))]
+        for word in set(normalized.split()):
+            del self._words[bisect_left(self._words, (word, player_id))]
+            self._vocab[word] -= 1
+            if self._vocab[word]:
+                continue
+            del self._vocab[word]
+            for gram in trigrams(word):
+                words = self._grams[gram]
+                words.discard(word)
+                if not words:
+                    del self._grams[gram]
+
+    @staticmethod
+    def _span(items: List[tuple], prefix: str) -> Tuple[int, int]:
+        """Index range of the sorted (text, player_id) items whose text starts with prefix."""
+        return bisect_left(items, (prefix,)), bisect_left(items, (prefix + "\U0010ffff",))
+
+    def _similar_words(self, term: str) -> Dict[str, int]:
+        """Words sharing at least MIN_TRIGRAM_SCORE of a typed word's trigrams -> trigrams shared."""
+        grams = trigrams(term, open_end=True)
+        needed = math.ceil(MIN_TRIGRAM_SCORE * len(grams))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        return {word: n for word, n in shared.items() if n >= needed}
+
+    def search(self, query: str, accept: Callable[[str], bool] = None, limit: int = 20) -> List[str]:
+        """Ids of the best matching players that `accept` (all when None), best first."""
+        q = normalize_name(query)
+        if not q or limit < 1:
+            return []
+        accept = accept or (lambda player_id: True)
+        found, taken = [], set()
+
+        def walk(lo: int, hi: int, items: List[tuple], match: Callable[[List[str]], bool]) -> bool:
+            """Takes the players of items[lo:hi] that `match` their name's words; True once the page is full."""
+            for i in range(lo, hi):
+                player_id = items[i][1]
+                if player_id not in taken and match(self._names[player_id].split()) and accept(player_id):
+                    found.append(player_id)
+                    taken.add(player_id)
+                    if len(found) == limit:
+                        return True
+            return False
+
+        terms = q.split()
+        with self._lock:
+            # 1. Names starting with the query
+            if walk(*self._span(self._by_name, q), self._by_name, lambda words: True):
+                return found
+
+            # 2. A word starting with every query word: walk the rarest one's matches
+            spans = {t: self._span(self._words, t) for t in terms}
+            rarest = min(terms, key=lambda t: spans[t][1] - spans[t][0])
+            others = [t for t in terms if t != rarest]
+            if walk(*spans[rarest], self._words,
+                    lambda words: all(any(w.startswith(t) for w in words) for t in others)):
+                return found
+
+            # 3. Each query word starts or resembles a word of the name: walk the players
+            # of the words resembling the query word with the fewest of them, best first
+            similar = {t: self._similar_words(t) for t in terms if len(t) >= 3}
+            if not similar:
+                return found
+            driver = min(similar, key=lambda t: len(similar[t]))
+            others = [t for t in terms if t != driver]
+            match = lambda words: all(any(w.startswith(t) or w in similar.get(t, ()) for w in words) for t in others)
+            for word in sorted(similar[driver], key=lambda w: (-similar[driver][w], w)):
+                lo = bisect_left(self._words, (word,))
+                if walk(lo, lo + self._vocab[word], self._words, match):
+                    break
+        return found
@@ -0,0 +1,261 @@
+import sys
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+from slot_keys import WEEKDAYS, parse_default_days
+
+# Ids and statuses repeat across thousands of rows; interning stores each string once
+_intern = sys.intern
+
+
+def parse_date(date_str: str) -> date:
+    """"2025-01-06" -> date. Raises ValueError for malformed dates."""
+    if not isinstance(date_str, str):
+        raise ValueError(f"Invalid date: {date_str!r}")
+    return date.fromisoformat(date_str)
+
+
+def iso_date(day: int) -> str:
+    return date.fromordinal(day).isoformat()
+
+
+class VersionConflict(Exception):
+    """An update or delete expected another version of the record than the current one."""
+
+    def __init__(self, kind: str, record_id: str, expected: int, current: int):
+        super().__init__(f"{kind.capitalize()} {record_id} was changed meanwhile (version {current}, expected {expected})")
+        self.kind = kind
+        self.record_id = record_id
+        self.expected = expected
+        self.current = current
+
+
+class AttendanceEntry:
+    """One "present" check-in in a player's attendance history."""
+
+    __slots__ = ("class_id", "day", "time", "coach")
+
+    def __init__(self, class_id: str, day: int, time: str, coach: Optional[str]):
+        self.class_id = class_id
+        self.day = day  # date ordinal
+        self.time = time
+        self.coach = coach
+
+    @property
+    def date(self) -> str:
+        return iso_date(self.day)
+
+    def _key(self):
+        return (self.class_id, self.day, self.time, self.coach)
+
+    def __eq__(self, other):
+        return isinstance(other, AttendanceEntry) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "AttendanceEntry":
+        return cls(_intern(d["class_id"]), parse_date(d["date"]).toordinal(), _intern(d["time"]), d.get("coach"))
+
+    def to_dict(self) -> Dict:
+        return {"date": self.date, "time": self.time, "class_id": self.class_id, "coach": self.coach}
+
+
+class ClassSession:
+    """
+    A scheduled class. The date is kept as an ordinal (`day`) together with its
+    month ("YYYY-MM") and weekday name, so filtering, sorting and slot matching
+    never re-parse date strings. `attendance` stays None until the first check-in.
+    `version` goes up with every change, for optimistic concurrency. Occurrences
+    of a recurring series carry its id (`series_id`).
+    """
+
+    __slots__ = ("id", "day", "month", "weekday", "time", "coach", "max_students", "student_ids", "attendance",
+                 "version", "series_id")
+
+    def __init__(self, id: str, date_str: str, time: str, student_ids: List[str] = None, max_students: int = 4,
+                 coach: Optional[str] = None, attendance: Optional[Dict[str, str]] = None, version: int = 1,
+                 series_id: Optional[str] = None):
+        self.id = _intern(id)
+        self.set_date(date_str)
+        self.time = _intern(time)
+        self.coach = coach
+        self.max_students = max_students
+        self.student_ids = [_intern(sid) for sid in student_ids or []]
+        self.attendance = attendance
+        self.version = version
+        self.series_id = series_id
+
+    @property
+    def date(self) -> str:
+        return iso_date(self.day)
+
+    def set_date(self, date_str: str):
+        d = parse_date(date_str)
+        self.day = d.toordinal()
+        self.month = _intern(f"{d.year:04d}-{d.month:02d}")
+        self.weekday = WEEKDAYS[d.weekday()]
+
+    def status_of(self, player_id: str) -> Optional[str]:
+        return self.attendance.get(player_id) if self.attendance else None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "ClassSession":
+        attendance = d.get("attendance")
+        if attendance is not None:
+            attendance = {_intern(pid): _intern(status) for pid, status in attendance.items()}
+        return cls(d["id"], d["date"], d["time"], d.get("student_ids"), d.get("max_students", 4), d.get("coach"), attendance,
+                   d.get("version", 1), d.get("series_id"))
+
+    def to_dict(self, fields: Iterable[str] = None) -> Dict:
+        """JSON shape of the class, optionally projected to `fields` (unknown names are ignored)."""
+        data = {
+            "id": self.id,
+            "date": self.date,
+            "time": self.time,
+            "student_ids": list(self.student_ids),
+            "max_students": self.max_students,
+            "coach": self.coach,
+            "weekday": self.weekday,
+            "version": self.version,
+        }
+        if self.attendance is not None:
+            data["attendance"] = dict(self.attendance)
+        if self.series_id is not None:
+            data["series_id"] = self.series_id
+        return data if fields is None else {f: data[f] for f in fields if f in data}
+
+
+class ClassSeries:
+    """
+    A weekly class over one month: weekday, time, coach and capacity, plus the
+    standing roster its occurrences start with. The occurrences are ordinary
+    classes carrying the series' id; `class_ids` lists them in date order.
+
+    `overrides` holds the per-date exceptions: occurrence id -> the fields
+    ("date", "time", "coach", "max_students") that occurrence sets on its own.
+    Series-wide edits leave those fields alone.
+    """
+
+    __slots__ = ("id", "month", "weekday", "time", "coach", "max_students", "student_ids", "class_ids", "overrides",
+                 "version")
+
+    # Properties an occurrence takes from its series unless overridden
+    PROPERTIES = ("time", "coach", "max_students")
+
+    def __init__(self, id: str, month: str, weekday: str, time: str, coach: Optional[str] = None, max_students: int = 4,
+                 student_ids: List[str] = None, class_ids: List[str] = None, overrides: Dict[str, List[str]] = None,
+                 version: int = 1):
+        self.id = _intern(id)
+        self.month = _intern(month)
+        self.weekday = weekday
+        self.time = _intern(time)
+        self.coach = coach
+        self.max_students = max_students
+        self.student_ids = [_intern(sid) for sid in student_ids or []]
+        self.class_ids = [_intern(cid) for cid in class_ids or []]
+        self.overrides = {cid: list(f) for cid, f in (overrides or {}).items()}
+        self.version = version
+
+    @property
+    def key(self) -> tuple:
+        return (self.month, self.weekday, self.time, self.coach)
+
+    def overridden(self, class_id: str, field: str) -> bool:
+        return field in self.overrides.get(class_id, ())
+
+    def set_override(self, class_id: str, field: str, on: bool):
+        fields = self.overrides.get(class_id, [])
+        if on and field not in fields:
+            self.overrides[class_id] = sorted(fields + [field])
+        elif not on and field in fields:
+            fields.remove(field)
+            if not fields:
+                del self.overrides[class_id]
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "ClassSeries":
+        return cls(d["id"], d["month"], d["weekday"], d["time"], d.get("coach"), d.get("max_students", 4),
+                   d.get("student_ids"), d.get("class_ids"), d.get("overrides"), d.get("version", 1))
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "month": self.month,
+            "weekday": self.weekday,
+            "time": self.time,
+            "coach": self.coach,
+            "max_students": self.max_students,
+            "student_ids": list(self.student_ids),
+            "class_ids": list(self.class_ids),
+            "overrides": {cid: list(f) for cid, f in self.overrides.items()},
+            "version": self.version,
+        }
+
+
+class Player:
+    """
+    A scheduler player. `default_slots` holds the parsed (weekday, time, coach)
+    keys of `default_days` and is rebuilt whenever `default_days` is assigned.
+    `version` goes up with every saved change, for optimistic concurrency.
+    The attendance history is kept apart, in the AttendanceLedger.
+    """
+
+    __slots__ = ("id", "name", "level", "_default_days", "default_slots", "makeup_credits", "has_subscription",
+                 "classes_attended", "makeups_used", "version")
+
+    # Every field of the delta-sync player payload
+    SUMMARY_FIELDS = ("id", "name", "level", "default_days", "makeup_credits", "stats", "has_subscription", "version")
+
+    def __init__(self, id: str, name: str, level: int, default_days: List[str] = None, makeup_credits: int = 0,
+                 has_subscription: bool = False, classes_attended: int = 0, makeups_used: int = 0, version: int = 1):
+        self.id = _intern(id)
+        self.name = name
+        self.level = level
+        self.default_days = default_days
+        self.makeup_credits = makeup_credits
+        self.has_subscription = has_subscription
+        self.classes_attended = classes_attended
+        self.makeups_used = makeups_used
+        self.version = version
+
+    @property
+    def default_days(self) -> List[str]:
+        return self._default_days
+
+    @default_days.setter
+    def default_days(self, default_days: Optional[List[str]]):
+        self._default_days = list(default_days or [])
+        self.default_slots = parse_default_days(self._default_days)
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "Player":
+        stats = d.get("stats") or {}
+        return cls(
+            d["id"],
+            d.get("name", ""),
+            d.get("level", 0),
+            d.get("default_days"),
+            d.get("makeup_credits", 0),
+            d.get("has_subscription", False),
+            stats.get("classes_attended", 0),
+            stats.get("makeups_used", 0),
+            d.get("version", 1),
+        )
+
+    def to_dict(self, fields: Iterable[str] = None) -> Dict:
+        """JSON shape of the player, optionally projected to `fields` (unknown names are ignored)."""
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "level": self.level,
+            "default_days": list(self.default_days),
+            "makeup_credits": self.makeup_credits,
+            "stats": {
+                "classes_attended": self.classes_attended,
+                "makeups_used": self.makeups_used
+            },
+            "has_subscription": self.has_subscription,
+            "version": self.version,
+        }
+        return data if fields is None else {f: data[f] for f in fields if f in data}
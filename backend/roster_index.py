@@ -0,0 +1,70 @@
+import threading
+from typing import Iterable, List
+from records import ClassSession
+
+
+class RosterIndex:
+    """
+    Reverse index between players and classes: which classes have a player on
+    their roster or attendance, and which players a class has. Cascading
+    deletions use it to touch only the records involved.
+
+    Months are indexed on first use, like SlotIndex; afterwards the manager
+    refreshes single classes whenever their roster or attendance changes.
+    Thread-safe.
+    """
+
+    def __init__(self):
+        self._by_player = {}  # player_id -> {class_id}
+        self._by_class = {}  # class_id -> (month, frozenset of player_ids)
+        self._months = set()
+        self._lock = threading.RLock()
+
+    def is_built(self, month: str) -> bool:
+        return month in self._months
+
+    def build(self, month: str, classes: Iterable[ClassSession]):
+        with self._lock:
+            if month in self._months:
+                return  # Built meanwhile by another thread
+            self._months.add(month)
+            for cls in classes:
+                self.refresh(cls)
+
+    def refresh(self, cls: ClassSession):
+        """Re-files a class under its current players. No-op while its month has not been indexed."""
+        with self._lock:
+            if cls.month not in self._months:
+                self.remove(cls.id)  # Moved to a month not indexed yet
+                return
+            players = frozenset(cls.student_ids).union(cls.attendance or ())
+            _, old = self._by_class.get(cls.id, (None, frozenset()))
+            for player_id in old - players:
+                self._unfile(player_id, cls.id)
+            for player_id in players - old:
+                self._by_player.setdefault(player_id, set()).add(cls.id)
+            self._by_class[cls.id] = (cls.month, players)
+
+    def remove(self, class_id: str):
+        with self._lock:
+            _, players = self._by_class.pop(class_id, (None, ()))
+            for player_id in players:
+                self._unfile(player_id, class_id)
+
+    def _unfile(self, player_id: str, class_id: str):
+        ids = self._by_player.get(player_id)
+        if ids is not None:
+            ids.discard(class_id)
+            if not ids:
+                del self._by_player[player_id]
+
+    def drop_month(self, month: str):
+        with self._lock:
+            for class_id in [cid for cid, (m, _) in self._by_class.items() if m == month]:
+                self.remove(class_id)
+            self._months.discard(month)
+
+    def classes_of(self, player_id: str) -> List[str]:
+        """Indexed classes with the player on their roster or attendance."""
+        with self._lock:
+            return list(self._by_player.get(player_id, ()))
@@ -1,18 +1,211 @@
+import calendar
+import functools
+import inspect
 import json
 import os
+import threading
 import uuid
-from datetime import datetime
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import date
+from bisect import bisect_right
+from itertools import dropwhile, islice
+from typing import Iterator, List, Dict, Optional
+from attendance_ledger import AttendanceLedger
+from bulk_import import ImportRow
+from change_log import ChangeLog
+from class_store import ClassStore
+from conflict_index import ConflictIndex, ScheduleConflict
+from locks import KeyedLocks, RWLock
+from slot_index import SlotIndex
+from makeup_planner import plan_makeups
+from player_search import PlayerSearchIndex
+from occupancy import OccupancyCache
+from roster_index import RosterIndex
+from records import AttendanceEntry, ClassSeries, ClassSession, Player, VersionConflict, iso_date, parse_date
+from series_index import SeriesIndex
+from shared_state import SharedJournal
+from slot_keys import WEEKDAYS, class_slot_key, normalize_coach
+
+
+def _mutation(exclusive: bool = False, classes: str = None, players: str = None):
+    """
+    Runs a ScheduleManager method as one mutation.
+
+    By default it takes the shared side of the manager's lock plus the locks of the
+    class / player ids passed in the arguments named by `classes` and `players`, so
+    bookings or check-ins of different classes and players run in parallel.
+    Mutations that add, remove or move entities, or sweep many of them, pass
+    `exclusive` instead. Changes are saved once the outermost mutation has
+    released its locks (see _commit). In shared mode the outermost mutation is
+    also one write of the journal: other workers' changes are applied first and
+    ours are announced to them afterwards.
+    """
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            keys = []
+            if classes or players:
+                arguments = signature.bind(self, *args, **kwargs).arguments
+                if classes:
+                    keys.append(("class", arguments[classes]))
+                if players:
+                    keys.append(("player", arguments[players]))
+            depth = getattr(self._local, "depth", 0)
+            with self.journal.writing() if self.journal is not None and not depth else nullcontext():
+                since = self.changes.version
+                self._local.depth = depth + 1
+                try:
+                    with self._lock.write() if exclusive else self._lock.read():
+                        with self._entity_locks.hold(keys):
+                            return method(self, *args, **kwargs)
+                finally:
+                    self._local.depth = depth
+                    if not depth:
+                        self._commit()
+                        if self.journal is not None:
+                            self._announce(since)
+        return run
+    return decorate
+
+
+def _reads(method):
+    """Runs a ScheduleManager method under the shared lock: no exclusive mutation is half-done meanwhile."""
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return run
+
+
+def _month_range(first: str, last: str, max_months: int = 36) -> List[str]:
+    """["2025-01", ..., "2025-06"] for ("2025-01", "2025-06"). ValueError for malformed or too long ranges."""
+    def parse(month: str) -> int:
+        try:
+            year, mon = map(int, month.split("-"))
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid month: {month!r}")
+        if not 1 <= mon <= 12:
+            raise ValueError(f"Invalid month: {month!r}")
+        return year * 12 + mon - 1
+
+    start, end = parse(first), parse(last)
+    if end < start:
+        raise ValueError(f"{last} is before {first}")
+    if end - start >= max_months:
+        raise ValueError(f"At most {max_months} months at once")
+    return [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in range(start, end + 1)]
+
 
 class ScheduleManager:
-    def __init__(self, players_file="players.json", classes_file="classes.json", targets_file="targets.json"):
+    def __init__(self, players_file="players.json", classes_file="classes.json", targets_file="targets.json",
+                 series_file="series.json", attendance_file="attendance.jsonl", max_cached_months: int = 6, archive_after_months: int = 12,
+                 max_changes: int = 5000, shared: bool = False, session_minutes: int = 60, courts: Optional[int] = None):
         self.players_file = players_file
         self.classes_file = classes_file
         self.targets_file = targets_file
-        self.players = self._load_json(self.players_file, list)
-        self.classes = self._load_json(self.classes_file, list)
+        self.series_file = series_file
+        self.attendance_file = attendance_file
+        # Shared mode: several worker processes use the same files (see shared_state.py)
+        self.journal = None
+        if shared:
+            self.journal = SharedJournal(f"{os.path.splitext(self.classes_file)[0]}.journal", self._apply_shared)
+        player_rows = self._load_json(self.players_file, list)
+        self.players = [Player.from_dict(p) for p in player_rows]
+        self._player_map = {p.id: p for p in self.players}
+        self.player_search = self._index_player_names()
+        # Classes are sharded per month in a directory next to the legacy file
+        # ("classes.json" -> "classes/2025-01.json"). The legacy file is migrated on first run.
+        with self.journal.locked() if self.journal else nullcontext():  # One worker migrates / archives
+            self.class_store = ClassStore(
+                os.path.splitext(self.classes_file)[0],
+                legacy_file=self.classes_file,
+                max_cached_months=max_cached_months,
+                archive_after_months=archive_after_months,
+            )
+            self.class_store.archive_cold_months()
+            # Attendance histories: an append-only ledger beside the player records
+            self.attendance = AttendanceLedger(self.attendance_file)
+            self._migrate_attendance_history(player_rows)
+            # Recurring series; their occurrences are classes linked by series_id
+            self.series = SeriesIndex(ClassSeries.from_dict(s) for s in self._load_json(self.series_file, list))
+            self._link_legacy_classes()
         self.monthly_targets = self._load_json(self.targets_file, dict)
 
+        # Incrementally maintained attendance counters: month -> {player_id: [present, absent]}.
+        # A month is counted once on first use, then kept up to date by every attendance change.
+        # Both caches keep the max_cached_months most recently used months, like the shard cache.
+        self.max_cached_months = max_cached_months
+        self._month_counts = OrderedDict()
+        self._month_stats_cache = OrderedDict()  # month -> (version stamp, stats)
+        self._players_by_name = None  # (players_version, players sorted by (name, id), their keys)
+        self.players_version = 0
+        self.targets_version = 0
+        self.series_version = 0
+
+        # Classes with free capacity per month, with precomputed active count and roster levels
+        self.slot_index = SlotIndex(self._player_level)
+        # Coach and court overlaps: every class lasts session_minutes, at most `courts` run at once
+        self.conflicts = ConflictIndex(session_minutes, courts)
+        # Player <-> class reverse index for cascading deletions
+        self.rosters = RosterIndex()
+        # Occupancy arrays per month for the analytics reports, rebuilt when the month's version moves
+        self.occupancy = OccupancyCache()
+        self._makeup_plans = {}  # plan_id -> previewed auto-assignment, until committed
+
+        # Recent mutations for delta sync (GET /scheduler/changes)
+        self.changes = ChangeLog(max_changes, self.journal.version if self.journal else None)
+
+        # Concurrency (see _mutation): `_lock` is shared by entity-level mutations, which
+        # `_entity_locks` serializes per class and per player, and taken exclusively by
+        # structural ones. `_meta_lock` guards the bookkeeping all of them update.
+        self._lock = RWLock()
+        self._entity_locks = KeyedLocks()
+        self._meta_lock = threading.Lock()
+        self._local = threading.local()
+        # Saving (see _commit): what changed since the last snapshot, and whether one is being written
+        self._players_dirty = False
+        self._targets_dirty = False
+        self._series_dirty = False
+        self._writing = False
+        self._saving = threading.Condition()
+
+    def _migrate_attendance_history(self, player_rows: List[Dict]):
+        """Moves attendance histories still stored in the player records into the ledger."""
+        legacy = [(row["id"], row["attendance_history"]) for row in player_rows if row.get("attendance_history") is not None]
+        if not legacy:
+            return
+        for player_id, history in legacy:
+            for h in history:
+                self.attendance.add(player_id, AttendanceEntry.from_dict(h))
+        snapshot = self.attendance.snapshot()
+        if snapshot is not None:
+            self.attendance.write(snapshot)
+        self._save_json([p.to_dict() for p in self.players], self.players_file)
+        print(f"Moved the attendance history of {len(legacy)} players to {self.attendance_file}")
+
+    def _link_legacy_classes(self):
+        """
+        Links the classes from before series existed to the series of their weekly
+        slot, once: on the first run without a series file. Later classes are linked
+        when they are created, so reading a month's series never edits anything.
+        """
+        if os.path.exists(self.series_file):
+            return
+        linked = 0
+        for month in self.class_store.months():
+            for cls in self.class_store.iter_classes(month):
+                if cls.series_id is None or self.series.get(cls.series_id) is None:
+                    self._join_series(cls)
+                    linked += 1
+            self.class_store.mark_dirty(month)
+            self.class_store.flush()  # One month in memory at a time
+        self._save_json(self.series.to_rows(), self.series_file)
+        if linked:
+            print(f"Linked {linked} classes to the series of their weekly slot")
+
     def _load_json(self, filepath: str, default_type=list) -> any:
         if not os.path.exists(filepath):
             return default_type()
@@ -35,87 +228,519 @@ class ScheduleManager:
             if os.path.exists(temp_file):
                 os.remove(temp_file)
 
+    def _save_players(self, *changed: Player):
+        """Marks the players for saving; `changed` get a new version and are logged for delta sync."""
+        with self._meta_lock:
+            self.players_version += 1
+            self._players_dirty = True
+        for player in changed:
+            player.version += 1
+            self.changes.record("player", player.id, "upsert", player.to_dict(Player.SUMMARY_FIELDS))
+
+    def _save_series(self, *changed: ClassSeries):
+        """Marks the series for saving; `changed` get a new version and are logged for delta sync."""
+        with self._meta_lock:
+            self.series_version += 1
+            self._series_dirty = True
+        for series in changed:
+            series.version += 1
+            self.changes.record("series", series.id, "upsert", series.to_dict(), series.month)
+
+    def _unsaved(self) -> bool:
+        return (self._players_dirty or self._targets_dirty or self._series_dirty or self.class_store.has_changes()
+                or self.attendance.has_pending())
+
+    def _commit(self):
+        """
+        Saves everything changed by the mutations finished so far (group commit).
+
+        One thread at a time writes. The others wait for it and then either find
+        their changes saved already, or one of them snapshots and writes all that
+        piled up meanwhile. The snapshot is taken under the exclusive lock, so it
+        never holds half of an operation, and written after releasing it: other
+        mutations go on while the files are fsync'd. Every mutation is on disk
+        when it returns, and its change log entries are published after that.
+        """
+        with self._saving:
+            while self._writing:
+                self._saving.wait()
+            if not self._unsaved():
+                return
+            self._writing = True
+        try:
+            with self._lock.write():
+                attendance = self.attendance.snapshot()
+                if self.journal is not None:
+                    months, index = self.class_store.pending()
+                    self.journal.note(months=months, index=index, players=self._players_dirty, targets=self._targets_dirty,
+                                      series=self._series_dirty, attendance=attendance is not None,
+                                      attendance_rewritten=attendance is not None and attendance[0])
+                classes = self.class_store.snapshot()
+                players = [p.to_dict() for p in self.players] if self._players_dirty else None
+                targets = dict(self.monthly_targets) if self._targets_dirty else None
+                series = self.series.to_rows() if self._series_dirty else None
+                self._players_dirty = self._targets_dirty = self._series_dirty = False
+                logged = self.changes.recorded
+            self.class_store.write(classes)
+            if players is not None:
+                self._save_json(players, self.players_file)
+            if targets is not None:
+                self._save_json(targets, self.targets_file)
+            if series is not None:
+                self._save_json(series, self.series_file)
+            if attendance is not None:
+                self.attendance.write(attendance)
+            # Only now are the changes (and the versions they bumped) visible to clients
+            self.changes.publish(logged)
+        finally:
+            with self._saving:
+                self._writing = False
+                self._saving.notify_all()
+
+    # --- Shared mode ---
+    def refresh(self):
+        """Applies changes saved by other workers (one stat() when there are none)."""
+        if self.journal is not None:
+            self.journal.poll()
+
+    def _announce(self, since: int):
+        # Tells the other workers about our write, with its change log entries for their clients
+        log = self.changes.since(since)
+        self.journal.version = self.changes.version
+        if log is None:
+            self.journal.note(log_reset=True)
+        elif log:
+            self.journal.note(log=log)
+
+    def _apply_shared(self, entries: Optional[List[Dict]]):
+        """
+        Reloads what other workers changed: the months, players, targets, series and
+        attendance their entries name (all when None).
+        """
+        with self._lock.write():
+            if entries is None:
+                self.class_store.reload()
+                self._month_counts.clear()
+                self._month_stats_cache.clear()
+                self.slot_index = SlotIndex(self._player_level)
+                self.conflicts = ConflictIndex(self.conflicts.session_minutes, self.conflicts.courts)
+                self.rosters = RosterIndex()
+                self._reload_players()
+                self.monthly_targets = self._load_json(self.targets_file, dict)
+                self.targets_version += 1
+                self._reload_series()
+                self.attendance.reload()
+                self.changes.reset(self.journal.version)
+                return
+
+            months, index, players, targets, series, log_reset, log = set(), False, False, False, False, False, []
+            attendance, attendance_rewritten = False, False
+            for entry in entries:
+                changes = entry["changes"]
+                months.update(changes.get("months", ()))
+                index = index or changes.get("index", False)
+                players = players or changes.get("players", False)
+                targets = targets or changes.get("targets", False)
+                series = series or changes.get("series", False)
+                attendance = attendance or changes.get("attendance", False)
+                attendance_rewritten = attendance_rewritten or changes.get("attendance_rewritten", False)
+                log_reset = log_reset or changes.get("log_reset", False)
+                log.extend(changes.get("log", ()))
+            if index:
+                self.class_store.reload_index(months)
+            for month in months:
+                self.class_store.forget(month)
+                self.slot_index.drop_month(month)
+                self.conflicts.drop_month(month)
+                self.rosters.drop_month(month)
+                self._month_counts.pop(month, None)
+                self._month_stats_cache.pop(month, None)
+            self.class_store.reload_rosters(months)  # Saved with the months
+            if players:
+                self._reload_players()
+            if targets:
+                self.monthly_targets = self._load_json(self.targets_file, dict)
+                self.targets_version += 1
+            if series:
+                self._reload_series()
+            if attendance_rewritten:
+                self.attendance.reload()
+            elif attendance:
+                self.attendance.follow()
+            if log_reset:
+                self.changes.reset(self.journal.version)
+            for change in log:
+                self.changes.replay(change)
+
+    def _reload_players(self):
+        old_levels = {p.id: p.level for p in self.players}
+        self.players = [Player.from_dict(p) for p in self._load_json(self.players_file, list)]
+        self._player_map = {p.id: p for p in self.players}
+        self.player_search = self._index_player_names()
+        self.players_version += 1
+        # Roster levels in the open-slot index follow level changes
+        for p in self.players:
+            if old_levels.get(p.id, p.level) != p.level:
+                for class_id in self.slot_index.classes_of(p.id):
+                    cls = self.class_store.get(class_id)
+                    if cls:
+                        self.slot_index.refresh(cls)
+
+    def _index_player_names(self) -> PlayerSearchIndex:
+        return PlayerSearchIndex((p.id, p.name) for p in self.players)
+
+    def _reload_series(self):
+        self.series = SeriesIndex(ClassSeries.from_dict(s) for s in self._load_json(self.series_file, list))
+        self.series_version += 1
+
+    def _is_default_class(self, player_id: str, cls: ClassSession) -> bool:
+        """True when the class is one of the player's regular "Day|Time|Coach" slots."""
+        player = self._player_map.get(player_id)
+        return player is not None and class_slot_key(cls) in player.default_slots
+
+    def _player_level(self, player_id: str) -> Optional[int]:
+        player = self._player_map.get(player_id)
+        return player.level if player else None
+
+    @staticmethod
+    def _check_version(kind: str, record, expected_version: Optional[int]):
+        """Raises VersionConflict when the caller edited another version of the record (None: don't check)."""
+        if expected_version is not None and record.version != expected_version:
+            raise VersionConflict(kind, record.id, expected_version, record.version)
+
+    # --- Class Indexes ---
+    def _class_changed(self, cls: ClassSession):
+        """Marks the class's month for saving, bumps its version and refreshes its timeline position and open-slot entry."""
+        cls.version += 1
+        self.class_store.changed(cls)
+        self.slot_index.refresh(cls)
+        self.conflicts.refresh(cls)
+        self.rosters.refresh(cls)
+        self.changes.record("class", cls.id, "upsert", cls.to_dict(), cls.month)
+
+    def _class_removed(self, cls: ClassSession):
+        self._uncount_class(cls)
+        self.slot_index.remove(cls.id)
+        self.conflicts.remove(cls.id)
+        self.rosters.remove(cls.id)
+        self._unlink(cls)
+        self.changes.record("class", cls.id, "delete", month=cls.month)
+
+    def _add_class(self, cls: ClassSession) -> ClassSession:
+        self.class_store.add(cls)
+        self.slot_index.refresh(cls)
+        self.conflicts.refresh(cls)
+        self.rosters.refresh(cls)
+        self.changes.record("class", cls.id, "upsert", cls.to_dict(), cls.month)
+        return cls
+
+    # --- Series ---
+    def _link(self, cls: ClassSession):
+        """Adds a class to the series of its weekly slot in its month, starting a series if there is none."""
+        series = self._join_series(cls)
+        self.class_store.changed(cls)  # Saves the link; not an edit of the class, so no new version
+        self._save_series(series)
+
+    def _join_series(self, cls: ClassSession) -> ClassSeries:
+        # _link without saving anything
+        found = self.series.find(cls.month, cls.weekday, cls.time, cls.coach)
+        if found:
+            series = found[0]
+        else:
+            series = ClassSeries(str(uuid.uuid4()), cls.month, cls.weekday, cls.time, cls.coach, cls.max_students, version=0)
+            self.series.add(series)
+        series.class_ids.append(cls.id)
+        if cls.max_students != series.max_students:
+            series.set_override(cls.id, "max_students", True)
+        cls.series_id = series.id
+        return series
+
+    def _unlink(self, cls: ClassSession):
+        """Takes a removed class out of its series; a series without occurrences is deleted."""
+        series = self.series.get(cls.series_id) if cls.series_id else None
+        if series is None or cls.id not in series.class_ids:
+            return
+        series.class_ids.remove(cls.id)
+        series.overrides.pop(cls.id, None)
+        if series.class_ids:
+            self._save_series(series)
+        else:
+            self._drop_series(series)
+
+    def _drop_series(self, series: ClassSeries):
+        self.series.remove(series.id)
+        self._save_series()
+        self.changes.record("series", series.id, "delete", month=series.month)
+
+    def _occurrences(self, series: ClassSeries) -> List[ClassSession]:
+        classes = (self.class_store.get(class_id) for class_id in series.class_ids)
+        return [c for c in classes if c is not None]
+
+    def _enroll_in_series(self, series: ClassSeries, player_id: str) -> int:
+        """Adds the player to the standing roster and to every occurrence with room. Returns the occurrences joined."""
+        if self.series.enroll(series, player_id):
+            self._save_series(series)
+        count = 0
+        for cls in self._occurrences(series):
+            if player_id not in cls.student_ids and len(cls.student_ids) < cls.max_students:
+                cls.student_ids.append(player_id)
+                self._class_changed(cls)
+                count += 1
+        return count
+
+    def _unenroll_from_series(self, series: ClassSeries, player_id: str) -> int:
+        """Removes the player from the standing roster and every occurrence. Returns the occurrences left."""
+        if self.series.unenroll(series, player_id):
+            self._save_series(series)
+        count = 0
+        for cls in self._occurrences(series):
+            if player_id in cls.student_ids:
+                cls.student_ids.remove(player_id)
+                if cls.status_of(player_id) is not None:
+                    self._set_attendance(cls, player_id, None)
+                self._class_changed(cls)
+                count += 1
+        return count
+
+    def _apply_series(self, series: ClassSeries, skip: str = None) -> int:
+        """Copies the series' properties to its occurrences, except the fields they override. Returns the occurrences updated."""
+        count = 0
+        for cls in self._occurrences(series):
+            if cls.id == skip:
+                continue
+            for field in ClassSeries.PROPERTIES:
+                if not series.overridden(cls.id, field):
+                    setattr(cls, field, getattr(series, field))
+            self._class_changed(cls)
+            count += 1
+        return count
+
+    def _check_series_moves(self, moves: List[tuple], skip: str = None):
+        """ScheduleConflict when giving the occurrences of each (series, time, coach) that time and coach would clash."""
+        placements, moving = [], {skip}
+        for series, time, coach in moves:
+            for cls in self._occurrences(series):
+                if cls.id == skip:
+                    continue
+                new_time = cls.time if series.overridden(cls.id, "time") else time
+                new_coach = cls.coach if series.overridden(cls.id, "coach") else coach
+                if (new_time, new_coach) != (cls.time, cls.coach):
+                    placements.append((cls.day, new_time, new_coach))
+                    moving.add(cls.id)
+        self._check_conflicts(placements, ignore=moving)
+
+    def _month_slots(self, month: str) -> SlotIndex:
+        if not self.slot_index.is_built(month):
+            self.slot_index.build(month, self.class_store.get_month(month))
+        return self.slot_index
+
+    def _classes_of_player(self, player_id: str) -> List[ClassSession]:
+        """Every class with the player on its roster or attendance, indexing the player's months not indexed yet."""
+        for month in self.class_store.months_of_player(player_id):
+            if not self.rosters.is_built(month):
+                self.rosters.build(month, self.class_store.get_month(month))
+        classes = (self.class_store.checkout(class_id) for class_id in self.rosters.classes_of(player_id))
+        return [c for c in classes if c is not None]
+
+    def _month_conflicts(self, month: str) -> ConflictIndex:
+        if not self.conflicts.is_built(month):
+            self.conflicts.build(month, self.class_store.get_month(month))
+        return self.conflicts
+
+    def _conflicts_of(self, placements: List[tuple], ignore=()) -> List[Dict]:
+        """Conflicts of classes placed at (day, time, coach); classes in `ignore` are the ones being moved."""
+        conflicts = []
+        for day, time, coach in placements:
+            month = iso_date(day)[:7]
+            conflicts += self._month_conflicts(month).check(day, time, coach, ignore)
+        return conflicts
+
+    def _check_conflicts(self, placements: List[tuple], ignore=()):
+        conflicts = self._conflicts_of(placements, ignore)
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+
+    # --- Attendance Counters ---
+    @staticmethod
+    def _count_attendance(classes) -> Dict[str, List[int]]:
+        counts = {}
+        for c in classes:
+            if not c.attendance:
+                continue
+            for pid, status in c.attendance.items():
+                if status == "present":
+                    counts.setdefault(pid, [0, 0])[0] += 1
+                elif status == "absent":
+                    counts.setdefault(pid, [0, 0])[1] += 1
+        return counts
+
+    def _month_attendance(self, month: str) -> Dict[str, List[int]]:
+        with self._meta_lock:
+            counts = self._month_counts.get(month)
+            if counts is None:
+                counts = self._count_attendance(self.class_store.get_month(month))
+            self._remember(self._month_counts, month, counts)
+            return counts
+
+    def _remember(self, cache: OrderedDict, month: str, value):
+        # Caller holds _meta_lock. Evicted counters are rebuilt from the shard on next use.
+        cache[month] = value
+        cache.move_to_end(month)
+        while len(cache) > self.max_cached_months:
+            cache.popitem(last=False)
+
+    def _adjust_counts(self, month: str, player_id: str, status: Optional[str], delta: int):
+        counts = self._month_counts.get(month)
+        if counts is None or status not in ("present", "absent"):
+            return  # Not counted yet, will be built from the shard on first use
+        entry = counts.setdefault(player_id, [0, 0])
+        entry[0 if status == "present" else 1] += delta
+
+    def _set_attendance(self, cls: ClassSession, player_id: str, status: Optional[str]):
+        """Sets (or clears, when status is empty) a player's attendance and keeps the month counters in sync."""
+        # One step for counters being built concurrently: they see the status before or after, with its count
+        with self._meta_lock:
+            old_status = cls.status_of(player_id)
+            if old_status == status:
+                return
+            self._adjust_counts(cls.month, player_id, old_status, -1)
+            if status:
+                if cls.attendance is None:
+                    cls.attendance = {}
+                cls.attendance[player_id] = status
+                self._adjust_counts(cls.month, player_id, status, 1)
+            elif cls.attendance:
+                cls.attendance.pop(player_id, None)
+
+    def _uncount_class(self, cls: ClassSession, month: str = None):
+        for pid, status in (cls.attendance or {}).items():
+            self._adjust_counts(month or cls.month, pid, status, -1)
+
+    def _count_class(self, cls: ClassSession):
+        for pid, status in (cls.attendance or {}).items():
+            self._adjust_counts(cls.month, pid, status, 1)
+
+    @_mutation(exclusive=True)
+    def verify_month_counts(self, month: str) -> Dict[str, Dict]:
+        """
+        Rebuilds the attendance counters of `month` from scratch and compares them with
+        the incrementally maintained ones. Returns the mismatches (empty when consistent)
+        and replaces the counters with the rebuilt ones.
+        """
+        expected = self._count_attendance(self.class_store.get_month(month))
+        actual = self._month_counts.get(month)
+        if actual is None:
+            with self._meta_lock:
+                self._remember(self._month_counts, month, expected)
+            return {}
+
+        mismatches = {}
+        for pid in set(expected) | set(actual):
+            e = expected.get(pid, [0, 0])
+            a = actual.get(pid, [0, 0])
+            if e != a:
+                mismatches[pid] = {"expected": e, "actual": a}
+        if mismatches:
+            self._month_counts[month] = expected
+            self._month_stats_cache.pop(month, None)
+        return mismatches
+
     # --- Player Management ---
-    def add_player(self, name: str, level: int, default_days: List[str] = [], has_subscription: bool = False) -> Dict:
-        player = {
-            "id": str(uuid.uuid4()),
-            "name": name,
-            "level": level,
-            "default_days": default_days,
-            "makeup_credits": 0,
-            "has_subscription": has_subscription,
-            "stats": {
-                "classes_attended": 0,
-                "makeups_used": 0
-            }
-        }
+    @_mutation(exclusive=True)
+    def add_player(self, name: str, level: int, default_days: List[str] = [], has_subscription: bool = False) -> Player:
+        player = Player(str(uuid.uuid4()), name, level, default_days, has_subscription=has_subscription, version=0)
         self.players.append(player)
-        self._save_json(self.players, self.players_file)
+        self._player_map[player.id] = player
+        self.player_search.add(player.id, player.name)
+        self._save_players(player)
         return player
 
-    def get_players(self) -> List[Dict]:
+    def get_players(self) -> List[Player]:
         return self.players
 
-    def get_player(self, player_id: str) -> Optional[Dict]:
-        for p in self.players:
-            if p["id"] == player_id:
-                return p
-        return None
+    @_reads
+    def iter_players(self, after: Optional[tuple] = None) -> Iterator[Player]:
+        """
+        Players ordered by (name, id), starting after the (name, id) key `after`.
+        The order is cached until the players change.
+        """
+        if self._players_by_name is None or self._players_by_name[0] != self.players_version:
+            ordered = sorted(self.players, key=lambda p: (p.name, p.id))
+            self._players_by_name = (self.players_version, ordered, [(p.name, p.id) for p in ordered])
+        _, ordered, keys = self._players_by_name
+        start = bisect_right(keys, tuple(after)) if after else 0
+        return iter(ordered[start:])
+
+    def get_player(self, player_id: str) -> Optional[Player]:
+        return self._player_map.get(player_id)
+
+    @_reads
+    def search_players(self, query: str, level: Optional[int] = None, has_subscription: Optional[bool] = None,
+                       limit: int = 20) -> List[Player]:
+        """Typeahead: the players whose names best match `query` (see PlayerSearchIndex), optionally of one level / subscription state."""
+        def accept(player_id: str) -> bool:
+            p = self._player_map.get(player_id)
+            return p is not None and (level is None or p.level == level) and (has_subscription is None or p.has_subscription == has_subscription)
 
-    def delete_player(self, player_id: str) -> bool:
+        return [self._player_map[pid] for pid in self.player_search.search(query, accept, limit)]
+
+    def iter_attendance_history(self, player_id: str, after: Optional[tuple] = None) -> Iterator[AttendanceEntry]:
+        """
+        A player's check-ins from the attendance ledger, newest first, starting after
+        the (date, time, class_id) key `after` (ValueError for a malformed date).
+        """
+        return self.attendance.history(player_id, after)
+
+    @_mutation(exclusive=True)
+    def delete_player(self, player_id: str, expected_version: int = None) -> bool:
         # Check if player exists
-        player_exists = any(p["id"] == player_id for p in self.players)
+        player_exists = player_id in self._player_map
         if not player_exists:
             return False
+        self._check_version("player", self._player_map[player_id], expected_version)
             
         # 1. Remove from players list
-        self.players = [p for p in self.players if p["id"] != player_id]
-        self._save_json(self.players, self.players_file)
+        self.players = [p for p in self.players if p.id != player_id]
+        del self._player_map[player_id]
+        self.player_search.remove(player_id)
+        self.changes.record("player", player_id, "delete")
+        self._save_players()
         
-        # 2. Remove from all class rosters and attendance
-        modified_classes = False
-        for c in self.classes:
-            removed = False
-            if player_id in c["student_ids"]:
-                c["student_ids"].remove(player_id)
-                removed = True
-            
-            if "attendance" in c and player_id in c["attendance"]:
-                del c["attendance"][player_id]
-                removed = True
-                
-            if removed:
-                modified_classes = True
-                
-        if modified_classes:
-            self._save_json(self.classes, self.classes_file)
-            
+        # 2. Remove from the rosters and attendance of their classes (found in the reverse index)
+        for c in self._classes_of_player(player_id):
+            if player_id in c.student_ids:
+                c.student_ids.remove(player_id)
+            self._set_attendance(c, player_id, None)
+            self._class_changed(c)
+
+        # 3. And from the standing rosters of their series
+        for series in self.series.of_player(player_id):
+            self.series.unenroll(series, player_id)
+            self._save_series(series)
+
+        for counts in self._month_counts.values():
+            counts.pop(player_id, None)
+        self.attendance.drop_player(player_id)
         return True
 
     # --- Class Management ---
-    def create_class(self, date_str: str, time_str: str, student_ids: List[str] = [], coach_name: str = None, max_students: int = 4) -> Dict:
-        # date_str format: "YYYY-MM-DD"
+    @_mutation(exclusive=True)
+    def create_class(self, date_str: str, time_str: str, student_ids: List[str] = [], coach_name: str = None, max_students: int = 4) -> ClassSession:
+        # date_str format: "YYYY-MM-DD" (ValueError when malformed)
         # time_str format: "HH:MM"
-        new_class = {
-            "id": str(uuid.uuid4()),
-            "date": date_str,
-            "time": time_str,
-            "student_ids": [sid for sid in student_ids], # Copy list
-            "max_students": max_students,
-            "coach": coach_name
-        }
-        self.classes.append(new_class)
-        self._save_json(self.classes, self.classes_file)
+        new_class = ClassSession(str(uuid.uuid4()), date_str, time_str, student_ids, max_students, coach_name)
+        self._check_conflicts([(new_class.day, new_class.time, new_class.coach)])  # ScheduleConflict
+        self._add_class(new_class)
+        self._link(new_class)
         return new_class
 
-    def create_monthly_series(self, month_str: str, weekday: str, time_str: str, student_ids: List[str] = [], coach_name: str = None, max_students: int = 4) -> List[Dict]:
+    @_mutation(exclusive=True)
+    def create_monthly_series(self, month_str: str, weekday: str, time_str: str, student_ids: List[str] = [], coach_name: str = None, max_students: int = 4) -> List[ClassSession]:
         """
-        Creates a class for every occurrence of `weekday` in `month_str`.
+        Creates a series and a class for every occurrence of `weekday` in `month_str`.
         month_str: "2025-01"
         weekday: "Monday", "Tuesday", etc.
         """
-        import calendar
-        
         # Parse year, month
         year, month = map(int, month_str.split("-"))
         
@@ -129,239 +754,267 @@ class ScheduleManager:
 
         cal = calendar.monthcalendar(year, month)
         created_classes = []
+        series = ClassSeries(str(uuid.uuid4()), f"{year:04d}-{month:02d}", weekday, time_str, coach_name, max_students,
+                             student_ids, version=0)
         
         for week in cal:
             day = week[target_weekday]
             if day != 0:
                 date_str = f"{year}-{month:02d}-{day:02d}"
-                # Create the class
-                new_cls = self.create_class(date_str, time_str, student_ids, coach_name, max_students)
-                created_classes.append(new_cls)
-                
+                # The class, linked to the series
+                created_classes.append(ClassSession(str(uuid.uuid4()), date_str, time_str, student_ids, max_students,
+                                                    coach_name, series_id=series.id))
+
+        # ScheduleConflict before any class is created
+        self._check_conflicts([(c.day, c.time, c.coach) for c in created_classes])
+        for new_cls in created_classes:
+            self._add_class(new_cls)
+            series.class_ids.append(new_cls.id)
+        self.series.add(series)
+        self._save_series(series)
         return created_classes
 
-    def update_player(self, player_id: str, name: str = None, level: int = None, default_days: List[str] = None, makeup_credits: int = None, has_subscription: bool = None) -> bool:
-        for p in self.players:
-            if p["id"] == player_id:
-                if name is not None:
-                    p["name"] = name
-                if level is not None:
-                    try:
-                        p["level"] = int(level)
-                    except:
-                        pass
-                if default_days is not None:
-                    p["default_days"] = default_days
-                if makeup_credits is not None:
-                    try:
-                        p["makeup_credits"] = int(makeup_credits)
-                    except:
-                        pass
-                if has_subscription is not None:
-                    p["has_subscription"] = has_subscription
-                
-                self._save_json(self.players, self.players_file)
-                return True
-        return False
-
-    def update_class(self, class_id: str, date: str = None, time: str = None, coach: str = None, student_ids: List[str] = None, max_students: int = None) -> bool:
-        for c in self.classes:
-            if c["id"] == class_id:
-                if date:
-                    c["date"] = date
-                if time:
-                    c["time"] = time
-                if coach is not None:
-                    c["coach"] = coach
-                if student_ids is not None:
-                    c["student_ids"] = student_ids
-                if max_students is not None:
-                    c["max_students"] = max_students
-                self._save_json(self.classes, self.classes_file)
-                return True
-        return False
+    @_mutation(players="player_id")
+    def update_player(self, player_id: str, name: str = None, level: int = None, default_days: List[str] = None, makeup_credits: int = None, has_subscription: bool = None,
+                      expected_version: int = None) -> bool:
+        """`expected_version`: the version the caller edited; VersionConflict when the player changed since."""
+        p = self._player_map.get(player_id)
+        if not p:
+            return False
+        self._check_version("player", p, expected_version)
 
-    def batch_enroll(self, player_id: str, month: str, weekday: str, time: str, coach: str = None) -> int:
+        if name is not None:
+            p.name = name
+            self.player_search.update(player_id, name)
+        if level is not None:
+            try:
+                p.level = int(level)
+            except:
+                pass
+            # Roster levels of every indexed class with this player are now stale
+            for class_id in self.slot_index.classes_of(player_id):
+                self.slot_index.refresh(self.class_store.get(class_id))
+        if default_days is not None:
+            p.default_days = default_days  # Also re-parses the default slots
+        if makeup_credits is not None:
+            try:
+                p.makeup_credits = int(makeup_credits)
+            except:
+                pass
+        if has_subscription is not None:
+            p.has_subscription = has_subscription
+
+        self._save_players(p)
+        return True
+
+    @_mutation(exclusive=True)
+    def update_class(self, class_id: str, date: str = None, time: str = None, coach: str = None, student_ids: List[str] = None, max_students: int = None,
+                     expected_version: int = None) -> bool:
         """
-        Enrolls a player into all classes matching the pattern in the given month.
+        `expected_version`: the version the caller edited; VersionConflict when the class changed since.
+        For an occurrence of a series, the edited properties become its per-date overrides.
         """
-        import datetime
-        count = 0
-        for cls in self.classes:
-            # Check Month
-            if not cls["date"].startswith(month):
-                continue
-            
-            # Check Time
-            if cls["time"] != time:
-                continue
+        c = self.class_store.get(class_id)
+        if not c:
+            return False
+        self._check_version("class", c, expected_version)
+        if date or time or coach is not None:
+            # ScheduleConflict before anything changes (ValueError for a malformed date).
+            # Only a new placement is checked: classes already overlapping stay editable.
+            placement = (parse_date(date).toordinal() if date else c.day, time or c.time, c.coach if coach is None else coach)
+            if placement[:2] != (c.day, c.time) or normalize_coach(placement[2]) != normalize_coach(c.coach):
+                self._check_conflicts([placement], ignore=[c.id])
 
-            # Check Coach
-            # If function arg is None, we act liberally? No, strict matching usually.
-            # Interpreting "coach=None" as "Any" might be risky. Let's assume strict if provided.
-            # Check Coach
-            # Strict matching: if function arg 'coach' provided (even None), it must match cls['coach']
-            # NOTE: We treat empty string as None for comparison safety if needed, 
-            # but usually it's better to be exact.
-            if coach != cls.get("coach"):
-                continue
+        old_month, old_day = c.month, c.day
+        if date:
+            c.set_date(date)  # ValueError when malformed
+        if time:
+            c.time = time
+        if coach is not None:
+            c.coach = coach
+        if student_ids is not None:
+            c.student_ids = list(student_ids)
+        if max_students is not None:
+            c.max_students = max_students
+        c.version += 1
+        # Moves the class to another shard if the date changed month
+        if c.month != old_month:
+            self._uncount_class(c, old_month)
+            self._count_class(c)
+        self.class_store.relocate(c, old_month)
+        self.slot_index.refresh(c)
+        self.conflicts.refresh(c)
+        self.rosters.refresh(c)
+        if c.month != old_month:
+            self.changes.record("class", c.id, "delete", month=old_month)  # Gone from the old month's view
+        self.changes.record("class", c.id, "upsert", c.to_dict(), c.month)
 
-            # Check Weekday
-            try:
-                dt = datetime.datetime.strptime(cls["date"], "%Y-%m-%d")
-                d_name = dt.strftime("%A")
-                if d_name != weekday:
-                    continue
-            except:
-                continue
-
-            # Checks passed -> Enroll
-            if "student_ids" not in cls:
-                cls["student_ids"] = []
+        series = self.series.get(c.series_id) if c.series_id else None
+        if series is not None:
+            before = {cid: list(f) for cid, f in series.overrides.items()}
+            if c.day != old_day:
+                series.set_override(c.id, "date", True)
+            for field in ClassSeries.PROPERTIES:
+                series.set_override(c.id, field, getattr(c, field) != getattr(series, field))
+            if series.overrides != before:
+                self._save_series(series)
+        return True
 
-            if player_id not in cls["student_ids"]:
-                if len(cls["student_ids"]) < cls["max_students"]:
-                    cls["student_ids"].append(player_id)
-                    count += 1
-        
-        if count > 0:
-            self._save_json(self.classes, self.classes_file)
+    @_mutation(exclusive=True)
+    def batch_enroll(self, player_id: str, month: str, weekday: str, time: str, coach: str = None) -> int:
+        """
+        Enrolls a player into the series matching the pattern in the given month:
+        its standing roster and every occurrence with room, including dates
+        rescheduled as exceptions.
+        """
+        count = 0
+        # Strict matching: coach=None only matches classes without a coach
+        for series in self.series.find(month, weekday, time, coach):
+            count += self._enroll_in_series(series, player_id)
         return count
 
+    @_mutation(exclusive=True)
     def batch_unenroll(self, player_id: str, month: str, weekday: str, time: str, coach: str = None) -> int:
         """
-        Removes a player from all classes matching the pattern in the given month.
+        Removes a player from the series matching the pattern in the given month,
+        and from all its occurrences (attendance included).
         """
-        import datetime
         count = 0
-        for cls in self.classes:
-            # Check Month
-            if not cls["date"].startswith(month):
-                continue
-            
-            # Check Time
-            if cls["time"] != time:
-                continue
-
-            # Check Coach (Strict)
-            if coach != cls.get("coach"):
-                continue
-
-            # Check Weekday
-            try:
-                dt = datetime.datetime.strptime(cls["date"], "%Y-%m-%d")
-                d_name = dt.strftime("%A")
-                if d_name != weekday:
-                    continue
-            except:
-                continue
-
-            # Checks passed -> Unenroll
-            if "student_ids" in cls and player_id in cls["student_ids"]:
-                cls["student_ids"].remove(player_id)
-                
-                # Cleanup attendance too
-                if "attendance" in cls and player_id in cls["attendance"]:
-                    del cls["attendance"][player_id]
-                    
-                count += 1
-        
-        if count > 0:
-            self._save_json(self.classes, self.classes_file)
+        for series in self.series.find(month, weekday, time, coach):
+            count += self._unenroll_from_series(series, player_id)
         return count
 
-    def delete_class(self, class_id: str) -> bool:
-        initial_len = len(self.classes)
-        self.classes = [c for c in self.classes if c["id"] != class_id]
-        if len(self.classes) < initial_len:
-            self._save_json(self.classes, self.classes_file)
-            return True
-        return False
+    @_mutation(exclusive=True)
+    def delete_class(self, class_id: str, expected_version: int = None) -> bool:
+        cls = self.class_store.get(class_id)
+        if cls is None:
+            return False
+        self._check_version("class", cls, expected_version)
+        self._delete_classes([cls])
+        return True
 
+    @_mutation(exclusive=True)
     def delete_classes(self, class_ids: List[str]) -> int:
-        initial_len = len(self.classes)
-        self.classes = [c for c in self.classes if c["id"] not in class_ids]
-        deleted_count = initial_len - len(self.classes)
-        if deleted_count > 0:
-            self._save_json(self.classes, self.classes_file)
-        return deleted_count
+        classes = (self.class_store.get(class_id) for class_id in set(class_ids))
+        return self._delete_classes([c for c in classes if c is not None])
 
+    @_mutation(exclusive=True)
     def delete_month_classes(self, month: str) -> int:
-        print(f"DEBUG: Deleting classes for month: {month}")
-        initial_len = len(self.classes)
-        self.classes = [c for c in self.classes if not c["date"].startswith(month)]
-        deleted_count = initial_len - len(self.classes)
-        print(f"DEBUG: Deleted {deleted_count} classes.")
-        if deleted_count > 0:
-            self._save_json(self.classes, self.classes_file)
-        return deleted_count
+        return self._delete_classes(list(self.class_store.iter_classes(month)))
+
+    def _delete_classes(self, classes: List[ClassSession]) -> int:
+        """
+        Deletes classes with what depends on them: the check-ins (ledger entries and
+        attended counts) and absence credits their attendance gave players are taken
+        back, and players booked in as a makeup get their credit refunded, as in
+        remove_student_from_class. Whole months are dropped at once.
+        """
+        changed_players = {}
+        for cls in classes:
+            series = self.series.get(cls.series_id) if cls.series_id else None
+            for player_id in cls.student_ids:
+                player = self._player_map.get(player_id)
+                if player is None or self._is_default_class(player_id, cls):
+                    continue
+                if series is not None and player_id in series.student_ids:
+                    continue  # Enrolled in the series, no credit was used
+                player.makeup_credits += 1
+                changed_players[player_id] = player
+            for player_id, status in (cls.attendance or {}).items():
+                player = self._player_map.get(player_id)
+                if player is not None:
+                    self._reverse_attendance(cls, player, status)
+                    changed_players[player_id] = player
+
+        by_month = {}
+        for cls in classes:
+            by_month.setdefault(cls.month, []).append(cls)
+        for month, removed in by_month.items():
+            if len(removed) == len(self.class_store.get_month(month)):
+                self.class_store.remove_month(month)
+                self._month_counts.pop(month, None)
+                self.slot_index.drop_month(month)
+                self.conflicts.drop_month(month)
+                self.rosters.drop_month(month)
+                for c in removed:
+                    self._unlink(c)
+                    self.changes.record("class", c.id, "delete", month=month)
+            else:
+                for c in removed:
+                    self.class_store.remove(c.id)
+                    self._class_removed(c)
+        if changed_players:
+            self._save_players(*changed_players.values())
+        return len(classes)
 
+    @_mutation(exclusive=True)
     def propagate_class_properties(self, source_class_id: str, match_time: str = None) -> int:
         """
-        Copies time, coach, and max_students from the source class to all other classes
-        that share the same weekday and month.
-        If match_time is provided, it targets classes with that time.
+        Copies time, coach, and max_students from the source class to the series of
+        its weekday in its month, and from there to their other occurrences
+        (except for the fields an occurrence overrides).
+        If match_time is provided, it targets series at that time.
         Otherwise, it defaults to the source class's CURRENT time.
         """
-        import datetime
-        
-        source = next((c for c in self.classes if c["id"] == source_class_id), None)
+        source = self.class_store.get(source_class_id)
         if not source:
             return 0
-            
-        # Parse source info
-        try:
-            s_date = datetime.datetime.strptime(source["date"], "%Y-%m-%d")
-            s_month = source["date"][:7] # YYYY-MM
-            s_weekday = s_date.strftime("%A")
-        except:
-            return 0
-            
-        # Determine the time to look for
-        target_time = match_time if match_time else source["time"]
 
-        count = 0
-        for c in self.classes:
-            if c["id"] == source_class_id:
-                continue
-                
-            # Check match
-            if not c["date"].startswith(s_month):
-                continue
-                
-            # Match against the target_time (which might be the OLD time)
-            if c["time"] != target_time:
-                continue
+        # Determine the time to look for (which might be the OLD time)
+        target_time = match_time if match_time else source.time
 
-            try:
-                c_date = datetime.datetime.strptime(c["date"], "%Y-%m-%d")
-                if c_date.strftime("%A") != s_weekday:
-                    continue
-            except:
-                continue
-                
-            # Update properties
-            c["time"] = source["time"]
-            c["coach"] = source["coach"]
-            c["max_students"] = source.get("max_students", 4)
-            count += 1
-            
-        if count > 0:
-            self._save_json(self.classes, self.classes_file)
-            
+        matched = [s for s in self.series.in_month(source.month) if s.weekday == source.weekday and s.time == target_time]
+        self._check_series_moves([(s, source.time, source.coach) for s in matched], skip=source_class_id)
+        count = 0
+        for series in matched:
+            for field in ClassSeries.PROPERTIES:
+                setattr(series, field, getattr(source, field))
+                series.set_override(source.id, field, False)  # The source now matches its series
+            self.series.rekey(series)
+            self._save_series(series)
+            count += self._apply_series(series, skip=source_class_id)
         return count
 
-    def get_classes(self, month: Optional[str] = None) -> List[Dict]:
-        # Simple filter by YYYY-MM if provided
-        if not month:
-            # Sort by date and time
-            self.classes.sort(key=lambda x: (x["date"], x["time"]))
-            return self.classes
-        
-        filtered = [c for c in self.classes if c["date"].startswith(month)]
-        filtered.sort(key=lambda x: (x["date"], x["time"]))
-        return filtered
+    def get_classes(self, month: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[ClassSession]:
+        return list(self.iter_classes(month, date_from, date_to))
+
+    def get_class(self, class_id: str) -> Optional[ClassSession]:
+        return self.class_store.get(class_id)
+
+    def classes_version(self, month: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None) -> int:
+        """Monotonic version of the classes a get_classes() call with the same filters covers."""
+        return self.class_store.version_range(month, date_from and date_from[:7], date_to and date_to[:7])
+
+    def month_stats_version(self, month: str) -> tuple:
+        """Changes whenever calculate_month_stats(month) may return something else."""
+        return (self.classes_version(month), self.players_version, self.targets_version)
+
+    @_reads
+    def iter_classes(self, month: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     after: Optional[tuple] = None, limit: Optional[int] = None) -> Iterator[ClassSession]:
+        """
+        Classes in (date, time) order, optionally filtered by a YYYY-MM prefix and/or an
+        inclusive "YYYY-MM-DD" date range (ValueError when malformed), and starting after
+        the (date, time, id) key `after`, at most `limit` of them. Shards are kept sorted,
+        so only the matching months are loaded and nothing is re-sorted; date bounds are
+        found by binary search. The classes are collected under the lock before returning.
+        """
+        if after:
+            date_from = max(date_from, after[0]) if date_from else after[0]
+        if date_from is None and date_to is None:
+            classes = self.class_store.iter_classes(month)
+        else:
+            start = parse_date(date_from) if date_from else None
+            end = parse_date(date_to) if date_to else None
+            classes = self.class_store.iter_range(start, end)
+            if month:
+                classes = (c for c in classes if c.date.startswith(month))
+        if after:
+            after = tuple(after)
+            classes = dropwhile(lambda c: (c.date, c.time, c.id) <= after, classes)
+        return iter(list(islice(classes, limit)))
 
+    @_mutation(exclusive=True)
     def copy_month_schedule(self, target_month_str: str) -> (bool, str):
         """
         Copies the schedule structure (Weekday, Time, Coach) from the previous month 
@@ -384,217 +1037,471 @@ class ScheduleManager:
             prev_target = self.get_target(source_month_str)
             self.set_target(target_month_str, prev_target)
             
-            # 2. Get source classes
-            source_classes = self.get_classes(source_month_str)
-            if not source_classes:
+            # 2. Get source series (every class of the month belongs to one)
+            source_series = self.series.in_month(source_month_str)
+            if not source_series:
                 return False, f"No classes found in previous month ({source_month_str})"
 
-            # 3. Extract unique patterns (Weekday, Time, Coach)
-            import datetime
-            patterns = set()
-            for cls in source_classes:
-                dt = datetime.datetime.strptime(cls["date"], "%Y-%m-%d")
-                weekday = dt.strftime("%A") # "Monday", "Tuesday"...
-                time = cls["time"]
-                coach = cls.get("coach")
-                patterns.add((weekday, time, coach))
+            # 3. Unique patterns (Weekday, Time, Coach), with the series' capacity
+            patterns = {}
+            for series in source_series:
+                patterns.setdefault((series.weekday, series.time, series.coach), series.max_students)
             
             # 4. Create series for each pattern
             count = 0
-            for (weekday, time, coach) in patterns:
-                created = self.create_monthly_series(target_month_str, weekday, time, [], coach)
+            conflicting = 0
+            for (weekday, time, coach), max_students in patterns.items():
+                try:
+                    created = self.create_monthly_series(target_month_str, weekday, time, [], coach, max_students)
+                except ScheduleConflict:
+                    conflicting += 1  # The coach or the courts are taken then
+                    continue
                 count += len(created)
-            
+
+            if conflicting:
+                return True, f"Successfully created {count} classes from {source_month_str} ({conflicting} slots skipped because of conflicts)"
             return True, f"Successfully created {count} classes from {source_month_str}"
 
         except Exception as e:
             return False, str(e)
 
-    def update_player(self, player_id: str, name: str = None, level: int = None, default_days: List[str] = None, makeup_credits: int = None) -> bool:
-        player = self.get_player(player_id)
-        if not player:
-            return False
-        
-        if name:
-            player["name"] = name
-        if level is not None:
-            player["level"] = level
-        if default_days is not None:
-            player["default_days"] = default_days
-        if makeup_credits is not None:
-            player["makeup_credits"] = makeup_credits
-            
-        self._save_json(self.players, self.players_file)
-        return True
-
+    @_mutation(players="player_id")
     def adjust_player_credits(self, player_id: str, amount: int) -> bool:
         player = self.get_player(player_id)
         if not player:
             return False
         
         # Ensure it doesn't go below 0
-        current = player.get("makeup_credits", 0)
-        player["makeup_credits"] = max(0, current + amount)
-        self._save_json(self.players, self.players_file)
+        player.makeup_credits = max(0, player.makeup_credits + amount)
+        self._save_players(player)
         return True
 
+    @_mutation(exclusive=True)
+    def roll_out_schedule(self, first_month: str, last_month: str, source_month: str = None, series_ids: List[str] = None,
+                          carry_targets: bool = True, enroll_defaults: bool = False, dry_run: bool = False) -> Dict:
+        """
+        Creates the weekly slots of `source_month`, or of the template series `series_ids`,
+        in every month from `first_month` to `last_month`, saved together as one mutation.
+        Slots a month already has are skipped, and so are slots that would double-book
+        a coach or overbook the courts (reported under "conflicts").
+        carry_targets: months without a target get the source month's (if it has one).
+        enroll_defaults: players whose default_days name a slot get a standing enrollment
+        in its new series. dry_run: reports what would be created, without creating it.
+        Raises ValueError for malformed months or an empty source.
+        """
+        months = _month_range(first_month, last_month)
+        if series_ids:
+            templates = [self.series.get(series_id) for series_id in series_ids]
+            missing = [series_id for series_id, series in zip(series_ids, templates) if series is None]
+            if missing:
+                raise ValueError(f"Unknown series: {', '.join(missing)}")
+            source_month = source_month or templates[0].month
+        elif source_month:
+            _month_range(source_month, source_month)
+            templates = self.series.in_month(source_month)
+        else:
+            raise ValueError("A source month or template series is required")
+        if not templates:
+            raise ValueError(f"No classes found in {source_month}")
+
+        # The patterns are detected once, for all months
+        patterns = {}
+        for series in sorted(templates, key=lambda s: (WEEKDAYS.index(s.weekday), s.time, s.id)):
+            patterns.setdefault((series.weekday, series.time, series.coach), series.max_students)
+        standing = {}  # (weekday, time, coach) -> players with that default slot
+        if enroll_defaults:
+            for player in self.players:
+                for key in player.default_slots:
+                    standing.setdefault(key, []).append(player.id)
+        target = self.monthly_targets.get(source_month) if carry_targets else None
+
+        report = []
+        created_total = skipped_total = 0
+        for month in months:
+            year, mon = map(int, month.split("-"))
+            existing = {(s.weekday, s.time, s.coach) for s in self.series.in_month(month)}
+            entry = {"month": month, "created": [], "skipped": [], "conflicts": [], "enrolled": 0, "target": None}
+            for (weekday, time, coach), max_students in patterns.items():
+                slot = {"weekday": weekday, "time": time, "coach": coach, "max_students": max_students}
+                if (weekday, time, coach) in existing:
+                    entry["skipped"].append(slot)
+                    continue
+                weekday_index = WEEKDAYS.index(weekday)
+                days = [date(year, mon, week[weekday_index]).toordinal()
+                        for week in calendar.monthcalendar(year, mon) if week[weekday_index]]
+                conflicts = self._conflicts_of([(day, time, coach) for day in days])
+                if conflicts:
+                    # Coach or courts taken: left out, with the reasons
+                    entry["conflicts"].append({**slot, "conflicts": conflicts})
+                    continue
+                players = standing.get((weekday, time, normalize_coach(coach)), [])
+                if dry_run:
+                    slot["classes"] = len(days)
+                else:
+                    created = self.create_monthly_series(month, weekday, time, [], coach, max_students)
+                    slot["classes"] = len(created)
+                    series = self.series.get(created[0].series_id)
+                    for player_id in players:
+                        entry["enrolled"] += self._enroll_in_series(series, player_id)
+                slot["player_ids"] = list(players)
+                entry["created"].append(slot)
+                created_total += slot["classes"]
+            skipped_total += len(entry["skipped"]) + len(entry["conflicts"])
+            if target is not None and month not in self.monthly_targets:
+                entry["target"] = target
+                if not dry_run:
+                    self.set_target(month, target)
+            report.append(entry)
+
+        return {
+            "dry_run": dry_run,
+            "source_month": source_month,
+            "months": report,
+            "created_classes": created_total,
+            "skipped_slots": skipped_total,
+        }
+
+    @_reads
+    def find_conflicts(self, month: str) -> List[Dict]:
+        """Every coach double-booking (and court overbooking, when courts are limited) in the month."""
+        return self._month_conflicts(month).month_report(month)
+
+    # --- Bulk Import ---
+    @_mutation(exclusive=True)
+    def import_rows(self, rows: List[ImportRow]) -> (Dict[str, int], List[Dict]):
+        """
+        Applies validated import rows (see bulk_import) in order, as one mutation
+        saved once, so rows may refer to players and classes imported above them.
+        Rows that do not fit the current state (duplicate id, unknown player or
+        class, full class, schedule conflict) are rejected as {line, error}.
+        Returns the number imported per kind and the rejected rows.
+        """
+        imported = {"players": 0, "classes": 0, "enrollments": 0}
+        rejected = []
+        new_players = []
+        enrolled = {}  # class_id -> class whose roster grew
+        by_slot = {}  # month -> {(day, time, coach): class}, for enrollments naming no class_id
+
+        def reject(row: ImportRow, error: str):
+            rejected.append({"line": row.line, "error": error})
+
+        def slot_of(month: str) -> Dict:
+            if month not in by_slot:
+                by_slot[month] = {}
+                for c in self.class_store.get_month(month):
+                    by_slot[month].setdefault((c.day, c.time, c.coach or None), c)
+            return by_slot[month]
+
+        for row in rows:
+            f = row.fields
+            if row.kind == "player":
+                if f["id"] is not None and f["id"] in self._player_map:
+                    reject(row, f"Player {f['id']} already exists")
+                    continue
+                player = Player(f["id"] or str(uuid.uuid4()), f["name"], f["level"], f["default_days"], f["makeup_credits"],
+                                f["has_subscription"], version=0)
+                self.players.append(player)
+                self._player_map[player.id] = player
+                self.player_search.add(player.id, player.name)
+                new_players.append(player)
+                imported["players"] += 1
+
+            elif row.kind == "class":
+                student_ids = list(dict.fromkeys(f["student_ids"]))
+                unknown = [pid for pid in student_ids if pid not in self._player_map]
+                if f["id"] is not None and self.class_store.month_of(f["id"]) is not None:
+                    reject(row, f"Class {f['id']} already exists")
+                elif unknown:
+                    reject(row, f"Unknown player: {unknown[0]}")
+                elif len(student_ids) > f["max_students"]:
+                    reject(row, "More students than max_students")
+                else:
+                    cls = ClassSession(f["id"] or str(uuid.uuid4()), f["date"], f["time"], student_ids, f["max_students"], f["coach"])
+                    conflicts = self._conflicts_of([(cls.day, cls.time, cls.coach)])
+                    if conflicts:
+                        reject(row, conflicts[0]["message"])
+                        continue
+                    self._add_class(cls)
+                    self._link(cls)
+                    if cls.month in by_slot:
+                        by_slot[cls.month].setdefault((cls.day, cls.time, cls.coach or None), cls)
+                    imported["classes"] += 1
+
+            else:
+                player_id = f["player_id"]
+                if f["class_id"] is not None:
+                    cls = self.class_store.checkout(f["class_id"])
+                else:
+                    day = parse_date(f["date"]).toordinal()
+                    cls = slot_of(f["date"][:7]).get((day, f["time"], f["coach"]))
+                active = cls and sum(1 for sid in cls.student_ids if cls.status_of(sid) != "absent")
+                if player_id not in self._player_map:
+                    reject(row, f"Unknown player: {player_id}")
+                elif cls is None:
+                    reject(row, "Class not found")
+                elif player_id in cls.student_ids:
+                    reject(row, "Player already in class")
+                elif active >= cls.max_students:
+                    reject(row, "Class is full")
+                else:
+                    cls.student_ids.append(player_id)
+                    enrolled[cls.id] = cls
+                    imported["enrollments"] += 1
+
+        for cls in enrolled.values():
+            self._class_changed(cls)
+        if new_players:
+            self._save_players(*new_players)
+        return imported, rejected
+
+    # --- Exports ---
+    def iter_month_stats_rows(self, first_month: str, last_month: Optional[str] = None) -> Iterator[Dict]:
+        """
+        calculate_month_stats() rows, with their "month", for every month from first_month
+        to last_month (ValueError for a malformed or too long range), one month at a time.
+        """
+        months = _month_range(first_month, last_month or first_month)
+
+        def rows() -> Iterator[Dict]:
+            for month in months:
+                for row in self.calculate_month_stats(month):
+                    yield {"month": month, **row}
+        return rows()
+
+    def iter_roster_rows(self, date_from: Optional[str] = None, date_to: Optional[str] = None, coach: Optional[str] = None,
+                         ledger: bool = False) -> Iterator[Dict]:
+        """
+        One row per (class, rostered player) of the classes dated within the inclusive
+        "YYYY-MM-DD" bounds (ValueError when malformed), optionally only one coach's,
+        in (date, time) order. ledger=True keeps only players with an attendance status.
+
+        Months are read one at a time, each under the shared lock: an export of any
+        length holds one month of rows at most and never blocks writers for long.
+        """
+        start = parse_date(date_from) if date_from else None
+        end = parse_date(date_to) if date_to else None
+        first = date_from and date_from[:7]
+        last = date_to and date_to[:7]
+        months = [m for m in self.class_store.months() if not (first and m < first) and not (last and m > last)]
+
+        def rows() -> Iterator[Dict]:
+            for month in months:
+                with self._lock.read():
+                    batch = self._month_roster_rows(month, start, end, coach, ledger)
+                yield from batch
+        return rows()
+
+    def _month_roster_rows(self, month: str, start: Optional[date], end: Optional[date], coach: Optional[str],
+                           ledger: bool) -> List[Dict]:
+        lo = start.toordinal() if start else 1
+        hi = end.toordinal() if end else date.max.toordinal()
+        rows = []
+        for cls in self.class_store.get_month(month):
+            if not lo <= cls.day <= hi or (coach is not None and cls.coach != coach):
+                continue
+            class_date = cls.date
+            for player_id in cls.student_ids:
+                status = cls.status_of(player_id)
+                if ledger and status is None:
+                    continue
+                player = self._player_map.get(player_id)
+                rows.append({
+                    "date": class_date,
+                    "time": cls.time,
+                    "coach": cls.coach,
+                    "class_id": cls.id,
+                    "max_students": cls.max_students,
+                    "player_id": player_id,
+                    "player_name": player.name if player else None,
+                    "level": player.level if player else None,
+                    "status": status,
+                    "makeup": not self._is_default_class(player_id, cls),
+                })
+        return rows
+
+    # --- Series Management ---
+    @_reads
+    def get_series(self, month: str) -> List[ClassSeries]:
+        """The month's series, by weekday and time."""
+        return sorted(self.series.in_month(month), key=lambda s: (WEEKDAYS.index(s.weekday), s.time, s.id))
+
+    def get_one_series(self, series_id: str) -> Optional[ClassSeries]:
+        return self.series.get(series_id)
+
+    @_mutation(exclusive=True)
+    def update_series(self, series_id: str, time: str = None, coach: str = None, max_students: int = None,
+                      expected_version: int = None) -> Optional[int]:
+        """
+        Changes the series and, through it, its occurrences (except the fields they
+        override). Returns the occurrences updated, None when there is no such series.
+        """
+        series = self.series.get(series_id)
+        if series is None:
+            return None
+        self._check_version("series", series, expected_version)
+        self._check_series_moves([(series, time or series.time, series.coach if coach is None else coach)])
+        if time:
+            series.time = time
+        if coach is not None:
+            series.coach = coach
+        if max_students is not None:
+            series.max_students = max_students
+        self.series.rekey(series)
+        self._save_series(series)
+        return self._apply_series(series)
+
+    @_mutation(exclusive=True)
+    def delete_series(self, series_id: str, expected_version: int = None) -> Optional[int]:
+        """Deletes the series with all its occurrences. Returns the classes deleted, None when there is no such series."""
+        series = self.series.get(series_id)
+        if series is None:
+            return None
+        self._check_version("series", series, expected_version)
+        count = self._delete_classes(self._occurrences(series))  # Deleting the last one deletes the series
+        if self.series.get(series_id) is not None:
+            self._drop_series(series)
+        return count
+
+    @_mutation(exclusive=True)
+    def enroll_in_series(self, series_id: str, player_id: str) -> Optional[int]:
+        """Standing enrollment: returns the occurrences joined, None when there is no such series."""
+        series = self.series.get(series_id)
+        return None if series is None else self._enroll_in_series(series, player_id)
+
+    @_mutation(exclusive=True)
+    def unenroll_from_series(self, series_id: str, player_id: str) -> Optional[int]:
+        """Returns the occurrences left, None when there is no such series."""
+        series = self.series.get(series_id)
+        return None if series is None else self._unenroll_from_series(series, player_id)
+
     # --- Rescheduling Logic ---
+    @_mutation(classes="class_id", players="player_id")
     def remove_student_from_class(self, class_id: str, player_id: str, award_credit: bool = False) -> (bool, str):
         player = self.get_player(player_id)
         if not player:
             return False, "Player not found"
             
-        for cls in self.classes:
-            if cls["id"] == class_id:
-                if player_id in cls["student_ids"]:
-                    cls["student_ids"].remove(player_id)
-                    # Clean up attendance if exists
-                    if "attendance" in cls and player_id in cls["attendance"]:
-                        del cls["attendance"][player_id]
-                        
-                    # REFUND LOGIC:
-                    # If this class is NOT in their default_days, assume it used a credit (or was an extra add).
-                    # Refund the credit.
-                    # We need to reconstruct the "Weekday|Time|Coach" key to check default_days.
-                    try:
-                        import datetime
-                        dt = datetime.datetime.strptime(cls["date"], "%Y-%m-%d")
-                        w_day = dt.strftime("%A")
-                        c_time = cls["time"]
-                        c_coach = cls.get("coach") or "No Coach" # "No Coach" matches frontend format
-                        
-                        # In default_days strings, coach might be "No Coach" or name.
-                        # The generic format is "Day|Time|Coach".
-                        # Let's check matches.
-                        is_default = False
-                        if player.get("default_days"):
-                            for d_day in player["default_days"]:
-                                parts = d_day.split("|")
-                                if len(parts) >= 2:
-                                    dy, tm = parts[0], parts[1]
-                                    dc = parts[2] if len(parts) > 2 else "No Coach"
-                                    
-                                    # Compare
-                                    if dy == w_day and tm == c_time:
-                                        # Compare coach narrowly? Or just day/time?
-                                        # Usually specific to coach too.
-                                        if dc == c_coach:
-                                            is_default = True
-                                            break
-                                        # Be lenient with "No Coach" vs None?
-                                        if (dc == "No Coach" and cls.get("coach") is None):
-                                            is_default = True
-                                            break
-                        
-                        if not is_default or award_credit:
-                            # It was a makeup or manual add -> Refund
-                            player["makeup_credits"] = player.get("makeup_credits", 0) + 1
-                            msg = "Player removed, credit refunded"
-                        else:
-                            msg = "Player removed from default class"
-
-                    except Exception as e:
-                         print(f"Error checking default days: {e}")
-                         msg = "Player removed (error checking defaults)"
-                    
-                    self._save_json(self.classes, self.classes_file)
-                    self._save_json(self.players, self.players_file)
-                    return True, msg
-                return False, "Player not in class"
-        return False, "Class not found"
+        cls = self.class_store.checkout(class_id)
+        if not cls:
+            return False, "Class not found"
 
+        if player_id in cls.student_ids:
+            cls.student_ids.remove(player_id)
+            # Clean up attendance if exists
+            if cls.status_of(player_id) is not None:
+                self._set_attendance(cls, player_id, None)
+                
+            # REFUND LOGIC:
+            # If this class is NOT in their default_days, assume it used a credit (or was an extra add).
+            # Refund the credit.
+            is_default = self._is_default_class(player_id, cls)
+            if not is_default or award_credit:
+                # It was a makeup or manual add -> Refund
+                player.makeup_credits += 1
+                msg = "Player removed, credit refunded"
+            else:
+                msg = "Player removed from default class"
+            
+            self._class_changed(cls)
+            self._save_players(player)
+            return True, msg
+        return False, "Player not in class"
+
+    @_mutation(classes="class_id", players="player_id")
     def mark_attendance(self, class_id: str, player_id: str, status: str) -> (bool, str):
         # status: "present" or "absent"
         player = self.get_player(player_id)
         if not player:
             return False, "Player not found"
             
-        for cls in self.classes:
-            if cls["id"] == class_id:
-                if player_id not in cls["student_ids"]:
-                    return False, "Player not in class roster"
-                
-                if "attendance" not in cls:
-                    cls["attendance"] = {}
-                
-                # Check if already marked to avoid double counting stats
-                old_status = cls["attendance"].get(player_id)
-                if old_status == status:
-                    return True, f"Already marked as {status}"
-
-                # Reverse old status effects if applicable
-                if old_status == "absent":
-                    player["makeup_credits"] = max(0, player.get("makeup_credits", 1) - 1)
-                elif old_status == "present":
-                    if "stats" in player:
-                        player["stats"]["classes_attended"] = max(0, player["stats"].get("classes_attended", 1) - 1)
-                    if "attendance_history" in player:
-                        player["attendance_history"] = [
-                            h for h in player["attendance_history"] 
-                            if not (h["date"] == cls["date"] and h["time"] == cls["time"] and h["class_id"] == class_id)
-                        ]
-
-                # Apply new status
-                if not status or status == "":
-                    if player_id in cls["attendance"]:
-                        del cls["attendance"][player_id]
-                    msg = "Attendance status cleared"
+        cls = self.class_store.checkout(class_id)
+        if not cls:
+            return False, "Class not found"
+
+        success, msg, changed = self._apply_attendance(cls, player, status)
+        if changed:
+            self._class_changed(cls)
+            self._save_players(player)
+        return success, msg
+
+    @_mutation(exclusive=True)
+    def mark_attendance_bulk(self, marks: Dict[str, Dict[str, str]]) -> List[Dict]:
+        """
+        Marks several players of one or more classes, {class_id: {player_id: status}},
+        with the rules of mark_attendance, and saves once. Returns one
+        {class_id, player_id, status, success, message} per mark, in request order.
+        """
+        results = []
+        changed_players = {}
+        for class_id, statuses in marks.items():
+            cls = self.class_store.checkout(class_id)
+            changed = False
+            for player_id, status in statuses.items():
+                player = self.get_player(player_id)
+                if not player:
+                    success, msg = False, "Player not found"
+                elif not cls:
+                    success, msg = False, "Class not found"
                 else:
-                    cls["attendance"][player_id] = status
-                    if status == "absent":
-                        player["makeup_credits"] = player.get("makeup_credits", 0) + 1
-                        msg = "Marked absent, makeup added"
-                    else:
-                        # status == "present"
-                        # INCREMENT STATS HERE (Deferred from booking)
-                        if "stats" not in player:
-                            player["stats"] = {"classes_attended": 0, "makeups_used": 0}
-                        
-                        player["stats"]["classes_attended"] = player["stats"].get("classes_attended", 0) + 1
-                        
-                        # Check if this was a makeup class to increment makeups_used
-                        # Logic: Not in default_days
-                        try:
-                            import datetime
-                            dt = datetime.datetime.strptime(cls["date"], "%Y-%m-%d")
-                            w_day = dt.strftime("%A")
-                            c_time = cls["time"]
-                            c_coach = cls.get("coach") or "No Coach"
-                            
-                            is_default = False
-                            if player.get("default_days"):
-                                for d_day in player["default_days"]:
-                                    parts = d_day.split("|")
-                                    if len(parts) >= 2:
-                                        dy, tm = parts[0], parts[1]
-                                        dc = parts[2] if len(parts) > 2 else "No Coach"
-                                        if dy == w_day and tm == c_time:
-                                            # Loose match on coach to be safe? Or strict?
-                                            # If I'm default Monday 10am Coach A, and I attend Monday 10am Coach B -> Is that a makeup?
-                                            # Yes, technically.
-                                            if dc == c_coach:
-                                                is_default = True
-                                            if (dc == "No Coach" and cls.get("coach") is None):
-                                                is_default = True
-                            
-                            if not is_default:
-                                player["stats"]["makeups_used"] = player["stats"].get("makeups_used", 0) + 1
-                                
-                        except:
-                            pass
-
-                        if "attendance_history" not in player:
-                            player["attendance_history"] = []
-                        
-                        history_entry = {"date": cls["date"], "time": cls["time"], "class_id": class_id, "coach": cls.get("coach")}
-                        if history_entry not in player["attendance_history"]:
-                            player["attendance_history"].append(history_entry)
-                        msg = "Marked present"
+                    success, msg, marked = self._apply_attendance(cls, player, status)
+                    if marked:
+                        changed = True
+                        changed_players[player_id] = player
+                results.append({"class_id": class_id, "player_id": player_id, "status": status,
+                                "success": success, "message": msg})
+            if changed:
+                self._class_changed(cls)
+        if changed_players:
+            self._save_players(*changed_players.values())
+        return results
+
+    def _apply_attendance(self, cls: ClassSession, player: Player, status: str) -> (bool, str, bool):
+        """
+        Sets a player's status in a class and updates their credits, stats and history.
+        Saves nothing; the last item tells whether anything changed.
+        """
+        player_id, class_id = player.id, cls.id
+        if player_id not in cls.student_ids:
+            return False, "Player not in class roster", False
+        
+        # Check if already marked to avoid double counting stats
+        old_status = cls.status_of(player_id)
+        if old_status == status:
+            return True, f"Already marked as {status}", False
+
+        # Reverse old status effects if applicable
+        self._reverse_attendance(cls, player, old_status)
+
+        # Apply new status (keeps the monthly counters in sync)
+        self._set_attendance(cls, player_id, status or None)
+        if not status or status == "":
+            msg = "Attendance status cleared"
+        else:
+            if status == "absent":
+                player.makeup_credits += 1
+                msg = "Marked absent, makeup added"
+            else:
+                # status == "present"
+                # INCREMENT STATS HERE (Deferred from booking)
+                player.classes_attended += 1
                 
-                self._save_json(self.classes, self.classes_file)
-                self._save_json(self.players, self.players_file)
-                return True, msg
-        return False, "Class not found"
+                # Check if this was a makeup class to increment makeups_used
+                # Logic: Not in default_days
+                # If I'm default Monday 10am Coach A, and I attend Monday 10am Coach B -> that's a makeup.
+                if not self._is_default_class(player_id, cls):
+                    player.makeups_used += 1
+
+                self.attendance.add(player_id, AttendanceEntry(class_id, cls.day, cls.time, cls.coach))
+                msg = "Marked present"
+        return True, msg, True
+
+    def _reverse_attendance(self, cls: ClassSession, player: Player, status: Optional[str]):
+        """Takes back what a status gave the player: the makeup credit of an absence, the check-in of a presence."""
+        if status == "absent":
+            player.makeup_credits = max(0, player.makeup_credits - 1)
+        elif status == "present":
+            player.classes_attended = max(0, player.classes_attended - 1)
+            self.attendance.remove(player.id, cls.id)
 
     def mark_absent(self, class_id: str, player_id: str) -> (bool, str):
         # Legacy/Convenience: Now calls mark_attendance
@@ -602,145 +1509,237 @@ class ScheduleManager:
 
 
 
+    @_reads
     def find_makeup_options(self, player_id: str, month: Optional[str] = None) -> List[Dict]:
         """
         Find classes where:
         1. Class has space (< 4 students).
         2. All existing students have level <= requesting_player.level.
-        3. Matches month (YYYY-MM) if provided.
+        3. Matches month (YYYY-MM) if provided, else lies in the current month or later.
         """
         player = self.get_player(player_id)
         if not player:
             return []
 
-        player_level = player["level"]
+        player_level = player.level
         options = []
 
-        # Create a quick lookup for all players to check levels
-        player_map = {p["id"]: p for p in self.players}
-
-        for cls in self.classes:
-            # 0. Filter by month if provided
-            if month and not cls["date"].startswith(month):
-                continue
-            # 1. Check Capacity
-            # Count only students NOT marked 'absent'
-            active_students_count = 0
-            for sid in cls["student_ids"]:
-                if cls.get("attendance", {}).get(sid) != 'absent':
-                    active_students_count += 1
-            
-            if active_students_count >= cls["max_students"]:
-                continue
-            
-            # Check if player is already in this class
-            if player_id in cls["student_ids"]:
-                continue
-
+        # 0. Filter by month if provided. The open-slot index already holds, per month and
+        # in (date, time) order, only classes with space (1.) and their roster's max level.
+        # Without a month, past months are skipped: indexing them would load the whole archive.
+        months = self.class_store.months(month)
+        if not month:
+            this_month = date.today().isoformat()[:7]
+            months = [m for m in months if m >= this_month]
+        for m in months:
             # 2. Check Level Compatibility
             # The rule: "never a higher level" -> Current students must not be higher than me.
             # If a student in the class is Level 3, and I am Level 2 -> I CANNOT join.
             # So, MAX(class_levels) <= My Level
-            
-            can_join = True
-            current_levels = []
-            
-            for sid in cls["student_ids"]:
-                student = player_map.get(sid)
-                if student:
-                    current_levels.append(student["level"])
-                    if student["level"] > player_level:
-                        can_join = False
-                        break
-            
-            if can_join:
+            for entry in self._month_slots(m).open_slots(m, max_level=player_level):
+                cls = self.class_store.get(entry["key"][2])
+                if month and len(month) > 7 and not cls.date.startswith(month):
+                    continue
+                # Check if player is already in this class
+                if player_id in cls.student_ids:
+                    continue
+
                 # Enrich with detail for frontend
                 options.append({
-                    **cls,
-                    "current_levels": current_levels
+                    **cls.to_dict(),
+                    "current_levels": list(entry["levels"])
                 })
         
-        # Sort options by date
-        options.sort(key=lambda x: (x["date"], x["time"]))
         return options
 
+    @_mutation(classes="class_id", players="player_id")
     def book_makeup(self, class_id: str, player_id: str, use_credit: bool = False) -> (bool, str):
         player = self.get_player(player_id)
         if not player:
             return False, "Player not found"
             
-        if use_credit and player.get("makeup_credits", 0) <= 0:
+        if use_credit and player.makeup_credits <= 0:
             return False, "No makeups available"
             
-        for cls in self.classes:
-            if cls["id"] == class_id:
-                # Count only students NOT marked 'absent'
-                active_students_count = 0
-                for sid in cls["student_ids"]:
-                    if cls.get("attendance", {}).get(sid) != 'absent':
-                        active_students_count += 1
-
-                if active_students_count >= cls["max_students"]:
-                    return False, "Class is full"
-                if player_id in cls["student_ids"]:
-                    return False, "Player already in class"
-                
-                cls["student_ids"].append(player_id)
-                
-                if use_credit:
-                    player["makeup_credits"] -= 1
-                    # DEFERRED: do not increment stats here. Wait for check-in.
-                    # player["stats"]["makeups_used"] = player["stats"].get("makeups_used", 0) + 1
-                else:
-                    # Regular booking count
-                    pass
-                    # DEFERRED: player["stats"]["classes_attended"] = player["stats"].get("classes_attended", 0) + 1
+        cls = self.class_store.checkout(class_id)
+        if not cls:
+            return False, "Class not found"
+
+        # Count only students NOT marked 'absent' (precomputed by the open-slot index)
+        active_students_count = self._month_slots(cls.month).entry(class_id)["active"]
+
+        if active_students_count >= cls.max_students:
+            return False, "Class is full"
+        if player_id in cls.student_ids:
+            return False, "Player already in class"
+        
+        cls.student_ids.append(player_id)
+        
+        if use_credit:
+            player.makeup_credits -= 1
+            # DEFERRED: do not increment stats here. Wait for check-in.
+            # player.makeups_used += 1
+        else:
+            # Regular booking count
+            pass
+            # DEFERRED: player.classes_attended += 1
+
+        self._class_changed(cls)
+        self._save_players(player)
+        return True, "Success"
+
+    @_reads
+    def plan_makeup_assignments(self, month: str, player_ids: Optional[List[str]] = None, use_preferences: bool = True) -> Dict:
+        """
+        Computes one assignment of makeup credits to open classes of `month` for all
+        players with credits (or only `player_ids`), respecting capacity and the level
+        rule. Nothing is booked: the returned preview is applied with commit_makeup_plan.
+        """
+        if player_ids is None:
+            players = [p for p in self.players if p.makeup_credits > 0]
+        else:
+            players = [self._player_map[pid] for pid in player_ids if pid in self._player_map]
 
-                self._save_json(self.classes, self.classes_file)
-                self._save_json(self.players, self.players_file)
-                return True, "Success"
-        return False, "Class not found"
+        slots = [(self.class_store.get(e["key"][2]), e) for e in self._month_slots(month).open_slots(month)]
+        result = plan_makeups(players, slots, use_preferences)
+
+        plan_id = str(uuid.uuid4())
+        assignments = [(p.id, c.id) for p, c in result["assignments"]]
+        with self._meta_lock:
+            self._makeup_plans[plan_id] = {
+                "month": month,
+                "stamp": (self.class_store.version(month), self.players_version),
+                "assignments": assignments,
+            }
+            # Only the latest previews are kept
+            while len(self._makeup_plans) > 20:
+                del self._makeup_plans[next(iter(self._makeup_plans))]
+
+        return {
+            "plan_id": plan_id,
+            "month": month,
+            "assignments": [
+                {
+                    "player_id": p.id,
+                    "name": p.name,
+                    "class_id": c.id,
+                    "date": c.date,
+                    "time": c.time,
+                    "coach": c.coach,
+                }
+                for p, c in result["assignments"]
+            ],
+            "unassigned": result["unassigned"],
+        }
+
+    @_mutation(exclusive=True)
+    def commit_makeup_plan(self, plan_id: str) -> (bool, str):
+        """Books a previewed plan in one transaction: either every seat is booked or none."""
+        plan = self._makeup_plans.get(plan_id)
+        if not plan:
+            return False, "Plan not found"
+        month = plan["month"]
+        if plan["stamp"] != (self.class_store.version(month), self.players_version):
+            return False, "Schedule changed since the preview, please preview again"
+
+        # Validate the whole plan first, in booking order
+        slots = self._month_slots(month)
+        active = {}
+        max_level = {}
+        credits = {}
+        for player_id, class_id in plan["assignments"]:
+            player = self.get_player(player_id)
+            cls = self.class_store.get(class_id)
+            if not player or not cls:
+                return False, "Plan refers to a deleted player or class"
+            entry = slots.entry(class_id)
+            active[class_id] = active.get(class_id, entry["active"]) + 1
+            credits[player_id] = credits.get(player_id, player.makeup_credits) - 1
+            if active[class_id] > cls.max_students or credits[player_id] < 0:
+                return False, "Plan no longer fits, please preview again"
+            if max_level.get(class_id, entry["max_level"]) > player.level or player_id in cls.student_ids:
+                return False, "Plan no longer fits, please preview again"
+            max_level[class_id] = player.level
+
+        booked = {}
+        for player_id, class_id in plan["assignments"]:
+            player = booked.setdefault(player_id, self.get_player(player_id))
+            cls = self.class_store.get(class_id)
+            cls.student_ids.append(player_id)
+            player.makeup_credits -= 1
+            self._class_changed(cls)
+
+        del self._makeup_plans[plan_id]
+        self._save_players(*booked.values())
+        return True, f"Booked {len(plan['assignments'])} makeups"
 
     # --- Target Management ---
     def get_target(self, month: str) -> int:
         return self.monthly_targets.get(month, 4) # Default 4
 
+    @_mutation(exclusive=True)
     def set_target(self, month: str, target: int):
         self.monthly_targets[month] = target
-        self._save_json(self.monthly_targets, self.targets_file)
+        self.targets_version += 1
+        self._targets_dirty = True
+        self.changes.record("target", month, "upsert", {"month": month, "target": target}, month)
 
+    def occupancy_version(self, first_month: str, last_month: Optional[str] = None) -> int:
+        """Changes whenever occupancy_report() over the same months may return something else."""
+        return self.class_store.version_range(first=first_month, last=last_month or first_month)
+
+    @_reads
+    def occupancy_report(self, first_month: str, last_month: Optional[str] = None) -> Dict:
+        """
+        Capacity, enrolment and attendance of the months from first_month to last_month,
+        as per-month totals, coach x month matrices and a weekday x slot x coach heatmap
+        (see OccupancyCache.report). ValueError for a malformed or too long range.
+        """
+        months = _month_range(first_month, last_month or first_month)
+        occupancies = [
+            self.occupancy.month(month, self.class_store.version(month), functools.partial(self.class_store.get_month, month))
+            for month in months
+        ]
+        return OccupancyCache.report(months, occupancies)
+
+    @_reads
     def calculate_month_stats(self, month: str) -> List[Dict]:
         """
         Returns stats for all students for the given month:
         - Attendance vs Target
         - Absences
         - Rollover Credits (current balance)
+
+        Served from the incrementally maintained counters (O(players)), and from a
+        cached payload while the month, players and targets are unchanged.
         """
+        is_month = len(month) == 7
+        stamp = self.month_stats_version(month)
+        with self._meta_lock:
+            cached = self._month_stats_cache.get(month)
+            if is_month and cached and cached[0] == stamp:
+                self._month_stats_cache.move_to_end(month)
+                return cached[1]
+
         stats = []
         
-        # Get all classes for the month
-        month_classes = [c for c in self.classes if c["date"].startswith(month)]
-        
+        if is_month:
+            counts = self._month_attendance(month)
+        else:
+            # Not a plain "YYYY-MM": count the matching classes directly
+            counts = self._count_attendance(self.class_store.iter_classes(month))
+
+        # Get target (default 4)
+        target = self.get_target(month)
+
         for student in self.players:
-            student_id = student["id"]
-            name = student["name"]
-            
-            # Get target (default 8)
-            target = self.get_target(month)
-            
-            attended_count = 0
-            absences_count = 0
+            student_id = student.id
+            name = student.name
             
-            for c in month_classes:
-                if "attendance" in c and student_id in c["attendance"]:
-                    status = c["attendance"][student_id]
-                    if status == "present":
-                        attended_count += 1
-                    elif status == "absent":
-                        absences_count += 1
+            attended_count, absences_count = counts.get(student_id, (0, 0))
             
             # Current credits as rollover
-            rollover_credits = student.get("makeup_credits", 0)
+            rollover_credits = student.makeup_credits
             
             stats.append({
                 "student_id": student_id,
@@ -754,4 +1753,7 @@ class ScheduleManager:
             
         # Sort by name
         stats.sort(key=lambda x: x["name"])
+        if is_month:
+            with self._meta_lock:
+                self._remember(self._month_stats_cache, month, (stamp, stats))
         return stats
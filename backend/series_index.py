@@ -0,0 +1,102 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from records import ClassSeries
+
+
+class SeriesIndex:
+    """
+    Recurring-class series by id, by month, by (month, weekday, time, coach) and
+    by standing-roster player, so enrolling into or editing a weekly slot never
+    rescans the month's classes, nor deleting a player every series.
+
+    Series are only changed by exclusive scheduler mutations and read under the
+    shared lock, so the index has no lock of its own. After changing a series'
+    time or coach, call `rekey`; standing rosters change through `enroll` and
+    `unenroll`.
+    """
+
+    def __init__(self, series: Iterable[ClassSeries] = ()):
+        self._by_id = {}  # series_id -> series
+        self._by_key = {}  # (month, weekday, time, coach) -> [series_id]
+        self._by_month = {}  # month -> [series_id]
+        self._key_of = {}  # series_id -> key it is filed under
+        self._by_player = {}  # player_id -> {series_id} with the player on the standing roster
+        for s in series:
+            self.add(s)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[ClassSeries]:
+        return iter(list(self._by_id.values()))
+
+    def get(self, series_id: str) -> Optional[ClassSeries]:
+        return self._by_id.get(series_id)
+
+    def add(self, series: ClassSeries):
+        self._by_id[series.id] = series
+        self._file(series)
+        for player_id in series.student_ids:
+            self._by_player.setdefault(player_id, set()).add(series.id)
+
+    def remove(self, series_id: str) -> Optional[ClassSeries]:
+        series = self._by_id.pop(series_id, None)
+        if series is not None:
+            self._unfile(series_id)
+            for player_id in series.student_ids:
+                self._unfile_player(player_id, series_id)
+        return series
+
+    def enroll(self, series: ClassSeries, player_id: str) -> bool:
+        """Adds the player to the standing roster. False when already on it."""
+        if player_id in series.student_ids:
+            return False
+        series.student_ids.append(player_id)
+        self._by_player.setdefault(player_id, set()).add(series.id)
+        return True
+
+    def unenroll(self, series: ClassSeries, player_id: str) -> bool:
+        """Removes the player from the standing roster. False when not on it."""
+        if player_id not in series.student_ids:
+            return False
+        series.student_ids.remove(player_id)
+        self._unfile_player(player_id, series.id)
+        return True
+
+    def of_player(self, player_id: str) -> List[ClassSeries]:
+        """Series with the player on their standing roster."""
+        return [self._by_id[sid] for sid in self._by_player.get(player_id, ())]
+
+    def rekey(self, series: ClassSeries):
+        if self._key_of.get(series.id) != series.key:
+            self._unfile(series.id)
+            self._file(series)
+
+    def find(self, month: str, weekday: str, time: str, coach: Optional[str]) -> List[ClassSeries]:
+        return [self._by_id[sid] for sid in self._by_key.get((month, weekday, time, coach), ())]
+
+    def in_month(self, month: str) -> List[ClassSeries]:
+        return [self._by_id[sid] for sid in self._by_month.get(month, ())]
+
+    def to_rows(self) -> List[Dict]:
+        return [s.to_dict() for s in self._by_id.values()]
+
+    def _file(self, series: ClassSeries):
+        key = series.key
+        self._key_of[series.id] = key
+        self._by_key.setdefault(key, []).append(series.id)
+        self._by_month.setdefault(series.month, []).append(series.id)
+
+    def _unfile_player(self, player_id: str, series_id: str):
+        ids = self._by_player.get(player_id)
+        if ids is not None:
+            ids.discard(series_id)
+            if not ids:
+                del self._by_player[player_id]
+
+    def _unfile(self, series_id: str):
+        key = self._key_of.pop(series_id)
+        for index, k in ((self._by_key, key), (self._by_month, key[0])):
+            ids = index[k]
+            ids.remove(series_id)
+            if not ids:
+                del index[k]
@@ -0,0 +1,189 @@
+import fcntl
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+
+class SharedJournal:
+    """
+    Lets several worker processes (uvicorn --workers N) share one set of JSON files.
+
+    Every write happens under an exclusive fcntl lock on `<path>.lock`. The writer
+    first applies what other processes wrote, so it mutates up-to-date state, then
+    saves its files and appends one JSON line to the journal naming what changed
+    (see `note`). Other processes notice new lines with a single stat() (`poll`)
+    and hand the entries to `apply`, which reloads only the parts they name.
+    `apply(None)` asks for a full reload: the journal was rotated (it is restarted
+    once it exceeds `max_bytes`) and entries may have been missed.
+
+    Lines are {"origin", "version", "changes"}; the first line of a journal holds
+    the `version` it started from and a random id telling journals apart (a new
+    one may get the old one's inode number, and even its size). `version` is free for the owner to use (the
+    scheduler keeps its change log version there, so versions agree across workers).
+    """
+
+    def __init__(self, path: str, apply: Callable[[Optional[List[Dict]]], None], max_bytes: int = 4 << 20):
+        self.path = path
+        self.apply = apply
+        self.max_bytes = max_bytes
+        self.version = None
+        self._origin = uuid.uuid4().hex  # Our own entries are skipped when polling
+        self._inode = None
+        self._journal_id = None
+        self._mtime = None
+        self._offset = 0
+        self._poll_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._lock_file = None
+        self._depth = 0
+        self._pending = {}
+
+        with self.locked():
+            if not os.path.exists(self.path):
+                self._start(int(time.time() * 1000))
+            # Position at the end: the owner loads its files after this, so nothing is missed
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                data = f.read()
+            self._inode, self._mtime = st.st_ino, st.st_mtime_ns
+            self._journal_id = self._header_id(data)
+            self._offset = data.rfind(b"\n") + 1
+            for line in data[:self._offset].splitlines():
+                if line.strip():
+                    self.version = json.loads(line).get("version", self.version)
+
+    @staticmethod
+    def _header_id(data: bytes) -> Optional[str]:
+        try:
+            return json.loads(data[:data.index(b"\n")]).get("journal")
+        except ValueError:
+            return None
+
+    def _start(self, version: int):
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w") as f:
+            f.write(json.dumps({"version": version, "journal": uuid.uuid4().hex}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+
+    # --- Cross-process lock ---
+    @contextmanager
+    def locked(self):
+        """Exclusive across processes and threads. Re-entrant within a thread."""
+        with self._write_lock:
+            if not self._depth:
+                self._lock_file = open(f"{self.path}.lock", "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    @contextmanager
+    def writing(self):
+        """
+        A write: locked, with other processes' entries applied first. What the
+        caller `note`s meanwhile is appended as one entry when the outermost
+        write ends.
+        """
+        with self.locked():
+            outermost = self._depth == 1
+            if outermost:
+                self.poll()
+                self._pending = {}
+            try:
+                yield
+            finally:
+                if outermost and self._pending:
+                    self._append(self._pending)
+
+    def note(self, **changes):
+        """Records what the current write changed. Lists are merged, flags or-ed, anything else replaced."""
+        for key, value in changes.items():
+            if isinstance(value, list):
+                merged = self._pending.setdefault(key, [])
+                merged.extend(v for v in value if v not in merged or isinstance(v, dict))
+            elif isinstance(value, bool):
+                self._pending[key] = self._pending.get(key, False) or value
+            else:
+                self._pending[key] = value
+
+    def _append(self, changes: Dict):
+        line = json.dumps({"origin": self._origin, "version": self.version, "changes": changes}, separators=(",", ":"))
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+        with self._poll_lock:
+            if self._offset < end:
+                self._offset, self._mtime = end, mtime
+        if end > self.max_bytes:
+            # Others notice the new journal id and reload everything
+            self._start(self.version if self.version is not None else int(time.time() * 1000))
+            with self._poll_lock:
+                with open(self.path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    data = f.read()
+                self._inode, self._mtime, self._offset = st.st_ino, st.st_mtime_ns, len(data)
+                self._journal_id = self._header_id(data)
+
+    # --- Following other processes ---
+    def poll(self):
+        """Applies entries other processes appended since the last poll. One stat() when there are none."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino == self._inode and st.st_size == self._offset and st.st_mtime_ns == self._mtime:
+            return
+        with self._poll_lock:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                journal_id = self._header_id(f.readline())
+                rotated = st.st_ino != self._inode or journal_id != self._journal_id
+                f.seek(0 if rotated else self._offset)
+                data = f.read()
+            # A line still being appended is picked up next time
+            complete = data.rfind(b"\n") + 1
+            entries = []
+            for line in data[:complete].splitlines():
+                if line.strip():
+                    entries.append(json.loads(line))
+            self._inode, self._mtime, self._journal_id = st.st_ino, st.st_mtime_ns, journal_id
+            self._offset = (0 if rotated else self._offset) + complete
+            for entry in entries:
+                self.version = entry.get("version", self.version)
+            if rotated:
+                self.apply(None)
+                return
+            theirs = [e for e in entries if "changes" in e and e.get("origin") != self._origin]
+            if theirs:
+                self.apply(theirs)
+
+
+def journaled(method):
+    """
+    Runs a manager method as one write: writes to the same manager queue up on its
+    `write_lock`, and in shared mode each is one write of the manager's `journal`.
+    """
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        with self.write_lock:
+            if self.journal is None:
+                return method(self, *args, **kwargs)
+            with self.journal.writing():
+                return method(self, *args, **kwargs)
+    return run
@@ -0,0 +1,111 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional
+from records import ClassSession
+
+
+class SlotIndex:
+    """
+    Index of classes with free capacity, per month and ordered by (day, time).
+
+    Each indexed class carries precomputed fields:
+    - active: students on the roster that are NOT marked absent
+    - levels: levels of the rostered students (roster order)
+    - max_level: highest level on the roster (0 when empty)
+
+    Months are indexed on first use; afterwards the manager refreshes single
+    classes whenever their roster or attendance changes. `level_of(player_id)`
+    returns a player's level, or None for unknown players.
+
+    Thread-safe: an entry is always computed from the class as it is when the
+    refresh runs, so the last refresh after concurrent roster edits wins.
+    """
+
+    def __init__(self, level_of):
+        self.level_of = level_of
+        self._entries = {}  # class_id -> entry
+        self._open = {}  # month -> sorted [(day, time, class_id)] of classes with free capacity
+        self._by_player = {}  # player_id -> {class_id} (indexed months only)
+        self._lock = threading.RLock()
+
+    def is_built(self, month: str) -> bool:
+        return month in self._open
+
+    def build(self, month: str, classes: List[ClassSession]):
+        with self._lock:
+            if month in self._open:
+                return  # Built meanwhile by another thread
+            self._open[month] = []
+            for cls in classes:
+                self.refresh(cls)
+
+    def entry(self, class_id: str) -> Optional[Dict]:
+        with self._lock:  # Not while a refresh has it removed
+            return self._entries.get(class_id)
+
+    def refresh(self, cls: ClassSession):
+        """(Re)computes the entry of a class. No-op while its month has not been indexed."""
+        with self._lock:
+            month = cls.month
+            self.remove(cls.id)
+            if month not in self._open:
+                return
+
+            attendance = cls.attendance or {}
+            active = 0
+            current_levels = []
+            for sid in cls.student_ids:
+                if attendance.get(sid) != "absent":
+                    active += 1
+                level = self.level_of(sid)
+                if level is not None:
+                    current_levels.append(level)
+                self._by_player.setdefault(sid, set()).add(cls.id)
+
+            key = (cls.day, cls.time, cls.id)
+            entry = {
+                "key": key,
+                "month": month,
+                "active": active,
+                "levels": current_levels,
+                "max_level": max(current_levels, default=0),
+                "max_students": cls.max_students,
+                "student_ids": list(cls.student_ids),
+            }
+            self._entries[cls.id] = entry
+            if active < cls.max_students:
+                insort(self._open[month], key)
+
+    def remove(self, class_id: str):
+        with self._lock:
+            entry = self._entries.pop(class_id, None)
+            if entry is None:
+                return
+            for sid in entry["student_ids"]:
+                ids = self._by_player.get(sid)
+                if ids is not None:
+                    ids.discard(class_id)
+                    if not ids:
+                        del self._by_player[sid]
+            open_keys = self._open.get(entry["month"])
+            if open_keys is not None:
+                i = bisect_left(open_keys, entry["key"])
+                if i < len(open_keys) and open_keys[i] == entry["key"]:
+                    del open_keys[i]
+
+    def drop_month(self, month: str):
+        with self._lock:
+            for class_id in [cid for cid, e in self._entries.items() if e["month"] == month]:
+                self.remove(class_id)
+            self._open.pop(month, None)
+
+    def classes_of(self, player_id: str) -> List[str]:
+        """Indexed classes that have the player on their roster."""
+        with self._lock:
+            return list(self._by_player.get(player_id, ()))
+
+    def open_slots(self, month: str, max_level: int = None) -> List[Dict]:
+        """Entries of the month with free capacity, by day and time, optionally with max_level <= `max_level`."""
+        with self._lock:
+            entries = [self._entries[key[2]] for key in self._open.get(month, ())]
+        return [e for e in entries if max_level is None or e["max_level"] <= max_level]
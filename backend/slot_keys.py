@@ -0,0 +1,26 @@
+from typing import FrozenSet, List, Optional, Tuple
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Label the frontend uses in "Day|Time|Coach" strings for classes without a coach
+NO_COACH = "No Coach"
+
+SlotKey = Tuple[str, str, str]  # (weekday, time, coach)
+
+
+def normalize_coach(coach: Optional[str]) -> str:
+    return coach or NO_COACH
+
+
+def parse_default_days(default_days: Optional[List[str]]) -> FrozenSet[SlotKey]:
+    """Parses "Day|Time|Coach" strings (coach optional) into normalized slot keys."""
+    keys = set()
+    for d_day in default_days or []:
+        parts = d_day.split("|")
+        if len(parts) >= 2:
+            keys.add((parts[0], parts[1], normalize_coach(parts[2] if len(parts) > 2 else None)))
+    return frozenset(keys)
+
+
+def class_slot_key(cls) -> SlotKey:
+    return (cls.weekday, cls.time, normalize_coach(cls.coach))
@@ -0,0 +1,157 @@
+import os
+import random
+import shutil
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from schedule_manager import ScheduleManager
+
+# Drives thousands of concurrent scheduler mutations through one manager, the way
+# FastAPI's threadpool does, and checks that capacity and credit invariants hold.
+
+PLAYERS_FILE = "stress_players.json"
+CLASSES_FILE = "stress_classes.json"
+CLASSES_DIR = "stress_classes" # Month shards live next to CLASSES_FILE
+TARGETS_FILE = "stress_targets.json"
+SERIES_FILE = "stress_series.json"
+ATTENDANCE_FILE = "stress_attendance.jsonl"
+
+THREADS = 32
+BOOKINGS = 4000
+REMOVALS = 800
+CHECK_INS = 1500
+CLASSES = 300
+PLAYERS = 200
+CREDITS = 6
+
+def cleanup():
+    for f in (PLAYERS_FILE, CLASSES_FILE, TARGETS_FILE, SERIES_FILE, ATTENDANCE_FILE):
+        if os.path.exists(f): os.remove(f)
+    if os.path.exists(CLASSES_DIR): shutil.rmtree(CLASSES_DIR)
+
+cleanup()
+random.seed(7)
+# Switch threads as often as possible, so check-then-act races actually interleave
+sys.setswitchinterval(1e-6)
+
+manager = ScheduleManager(players_file=PLAYERS_FILE, classes_file=CLASSES_FILE, targets_file=TARGETS_FILE,
+                          series_file=SERIES_FILE, attendance_file=ATTENDANCE_FILE)
+classes = []
+for i in range(CLASSES):
+    classes.append(manager.create_class(f"2025-03-{i % 28 + 1:02d}", f"{9 + i // 28}:00", [], "Alice", 4))
+players = [manager.add_player(f"Player {i:03d}", random.randint(1, 3), []) for i in range(PLAYERS)]
+for p in players:
+    manager.adjust_player_credits(p.id, CREDITS)
+
+def run_all(tasks):
+    with ThreadPoolExecutor(THREADS) as pool:
+        return list(pool.map(lambda task: task(), tasks))
+
+print("--- Test 1: Concurrent bookings and removals ---")
+def book(class_id, player_id):
+    def task():
+        ok, _ = manager.book_makeup(class_id, player_id, use_credit=True)
+        return ("book", class_id, player_id, ok)
+    return task
+
+def remove(cls):
+    def task():
+        # Whoever is on the roster right now; may already be gone when the removal runs
+        roster = list(cls.student_ids)
+        if not roster:
+            return ("remove", cls.id, None, False)
+        player_id = random.choice(roster)
+        ok, _ = manager.remove_student_from_class(cls.id, player_id, award_credit=True)
+        return ("remove", cls.id, player_id, ok)
+    return task
+
+def other(i):
+    # Reads and exclusive mutations mixed in with the bookings
+    def task():
+        if i % 4 == 0:
+            manager.create_class(f"2025-04-{i % 28 + 1:02d}", "18:00", [], f"Coach {i}", 4)
+        elif i % 4 == 1:
+            manager.find_makeup_options(random.choice(players).id, "2025-03")
+        elif i % 4 == 2:
+            manager.calculate_month_stats("2025-03")
+        else:
+            manager.get_classes("2025-03")
+        return ("other", None, None, True)
+    return task
+
+tasks = [book(random.choice(classes).id, random.choice(players).id) for _ in range(BOOKINGS)]
+tasks += [remove(random.choice(classes)) for _ in range(REMOVALS)]
+tasks += [other(i) for i in range(200)]
+random.shuffle(tasks)
+results = run_all(tasks)
+
+booked = Counter(r[2] for r in results if r[0] == "book" and r[3])
+refunded = Counter(r[2] for r in results if r[0] == "remove" and r[3])
+print(f"{sum(booked.values())} bookings and {sum(refunded.values())} removals succeeded")
+
+over = [c for c in manager.get_classes("2025-03") if len(c.student_ids) > c.max_students]
+dupes = [c for c in manager.get_classes("2025-03") if len(set(c.student_ids)) != len(c.student_ids)]
+if not over and not dupes:
+    print("PASS: No class over capacity or with duplicate students")
+else:
+    print(f"FAIL: {len(over)} classes over capacity, {len(dupes)} with duplicates")
+
+wrong = [p for p in players if p.makeup_credits != CREDITS - booked[p.id] + refunded[p.id] or p.makeup_credits < 0]
+if not wrong:
+    print("PASS: Every credit spent or refunded exactly once")
+else:
+    print(f"FAIL: {len(wrong)} players with wrong credits, e.g. {wrong[0].makeup_credits}")
+
+seats = sum(len(c.student_ids) for c in manager.get_classes("2025-03"))
+if seats == sum(booked.values()) - sum(refunded.values()):
+    print("PASS: Rosters match the successful bookings")
+else:
+    print(f"FAIL: {seats} seats taken for {sum(booked.values()) - sum(refunded.values())} bookings")
+
+stale = [c for c in classes if manager.slot_index.entry(c.id)["active"] != len(c.student_ids)]
+if not stale:
+    print("PASS: Open-slot index matches the rosters")
+else:
+    print(f"FAIL: {len(stale)} stale open-slot entries")
+
+print("\n--- Test 2: Concurrent check-ins ---")
+enrolled = [(c.id, pid) for c in classes for pid in c.student_ids]
+
+def check_in(class_id, player_id, status):
+    return lambda: manager.mark_attendance(class_id, player_id, status)
+
+tasks = []
+for _ in range(CHECK_INS):
+    class_id, player_id = random.choice(enrolled)
+    tasks.append(check_in(class_id, player_id, random.choice(["present", "present", "absent", ""])))
+run_all(tasks)
+
+present = Counter(pid for c in classes for pid, status in (c.attendance or {}).items() if status == "present")
+wrong = [p for p in players if p.classes_attended != present[p.id] or manager.attendance.count(p.id) != present[p.id]]
+if not wrong:
+    print("PASS: Attendance stats match the class check-ins")
+else:
+    print(f"FAIL: {len(wrong)} players with wrong attendance stats")
+
+mismatches = manager.verify_month_counts("2025-03")
+if not mismatches:
+    print("PASS: Monthly counters consistent")
+else:
+    print(f"FAIL: {len(mismatches)} counter mismatches")
+
+print("\n--- Test 3: Saved state matches memory ---")
+reloaded = ScheduleManager(players_file=PLAYERS_FILE, classes_file=CLASSES_FILE, targets_file=TARGETS_FILE,
+                           series_file=SERIES_FILE, attendance_file=ATTENDANCE_FILE)
+saved = {c.id: (c.student_ids, c.attendance or {}) for c in reloaded.get_classes()}
+live = {c.id: (c.student_ids, c.attendance or {}) for c in manager.get_classes()}
+if saved == live:
+    print("PASS: Saved classes match")
+else:
+    print(f"FAIL: {sum(1 for k in live if saved.get(k) != live[k])} saved classes differ")
+
+if all(reloaded.get_player(p.id).to_dict() == p.to_dict() for p in players):
+    print("PASS: Saved players match")
+else:
+    print("FAIL: Saved players differ")
+
+cleanup()
@@ -0,0 +1,231 @@
+import contextvars
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from event_stream import EventHub
+from history_manager import HistoryManager
+from http_cache import ResponseCache
+from locks import KeyedLocks
+from schedule_manager import ScheduleManager
+from user_manager import UserManager
+
+# Requests without a tenant use the original single-center files
+DEFAULT_TENANT = "default"
+TENANT_HEADER = "x-tenant"
+# Tenant ids name directories: no dots or slashes, so they never leave the tenants directory
+TENANT_ID = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+_PATH_PREFIX = re.compile(r"^/t/([^/]+)(/.*)?$")
+
+_current = contextvars.ContextVar("tenant", default=None)
+
+
+class Tenant:
+    """One center's stores, each in its own files under `directory`, loaded and dropped together."""
+
+    def __init__(self, tenant_id: str, directory: str, shared: bool = False, schedule_options: Dict = None):
+        self.id = tenant_id
+        self.directory = directory
+        path = lambda name: os.path.join(directory, name)
+        self.users = UserManager(path("users.json"), shared=shared)
+        self.history = HistoryManager(path("history.json"), shared=shared)
+        self.schedule = ScheduleManager(
+            players_file=path("players.json"),
+            classes_file=path("classes.json"),
+            targets_file=path("targets.json"),
+            series_file=path("series.json"),
+            attendance_file=path("attendance.jsonl"),
+            shared=shared,
+            **(schedule_options or {}),
+        )
+        # Live events and cached responses never cross tenants
+        self.events = EventHub()
+        self.schedule.changes.listeners.append(self.events.publish)
+        self.cache = ResponseCache(scope=tenant_id, shared_version=(lambda: self.schedule.changes.version) if shared else None)
+        self.users.create_default_admin()
+        self.leases = 0  # Requests using the tenant right now
+        self.last_used = time.monotonic()
+
+
+class TenantRegistry:
+    """
+    The centers served by one process, loaded on first use and dropped again once idle.
+
+    Each tenant keeps its data in `<root>/<tenant_id>/` (the default tenant in
+    `default_dir`) and has its own managers, so their write locks and group
+    commits are per tenant: a busy center never queues another's writes.
+    A request holds a lease on its tenant (`acquire` / `release`); tenants nobody
+    holds are dropped after `idle_seconds`, least recently used first once more
+    than `max_loaded` are in memory. Every write is on disk when it returns, so
+    dropping a tenant loses nothing.
+
+    Without a `root`, only the default tenant exists. With `create_missing`,
+    requests for an unknown tenant create its directory; otherwise a center is
+    added by creating its directory.
+    """
+
+    def __init__(self, root: Optional[str] = None, default_dir: str = ".", shared: bool = False,
+                 idle_seconds: float = 900, max_loaded: int = 32, create_missing: bool = False,
+                 schedule_options: Dict = None):
+        self.root = root
+        self.default_dir = default_dir
+        self.shared = shared
+        self.idle_seconds = idle_seconds
+        self.max_loaded = max_loaded
+        self.create_missing = create_missing
+        self.schedule_options = schedule_options or {}
+        self._tenants: Dict[str, Tenant] = {}
+        self._lock = threading.Lock()
+        self._loading = KeyedLocks()  # One load per tenant at a time; other tenants load meanwhile
+        self._pinned = None  # The default tenant, once used outside requests (see current)
+        self._pin_lock = threading.Lock()
+
+    def directory(self, tenant_id: str) -> str:
+        """Where a tenant's files live. KeyError for unknown tenants."""
+        if tenant_id == DEFAULT_TENANT:
+            return self.default_dir
+        if self.root is None:
+            raise KeyError(tenant_id)
+        directory = os.path.join(self.root, tenant_id)
+        if not os.path.isdir(directory):
+            if not self.create_missing:
+                raise KeyError(tenant_id)
+            os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def acquire(self, tenant_id: str) -> Tenant:
+        """The tenant's stores, loading them if needed, leased until `release`. KeyError for unknown tenants."""
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                tenant.leases += 1
+                return tenant
+        with self._loading.hold([tenant_id]):
+            with self._lock:
+                tenant = self._tenants.get(tenant_id)
+                if tenant is not None:
+                    tenant.leases += 1
+                    return tenant
+            # Loading can take a while: other tenants are served meanwhile
+            tenant = Tenant(tenant_id, self.directory(tenant_id), self.shared, self.schedule_options)
+            with self._lock:
+                tenant.leases += 1
+                self._tenants[tenant_id] = tenant
+                self._sweep()
+        return tenant
+
+    def release(self, tenant: Tenant):
+        with self._lock:
+            tenant.leases -= 1
+            tenant.last_used = time.monotonic()
+            self._sweep()
+
+    def _sweep(self):
+        # Drops idle tenants, then the least recently used unleased ones beyond max_loaded
+        now = time.monotonic()
+        idle = sorted((t for t in self._tenants.values() if not t.leases), key=lambda t: t.last_used)
+        excess = len(self._tenants) - self.max_loaded
+        for tenant in idle:
+            if now - tenant.last_used >= self.idle_seconds or excess > 0:
+                del self._tenants[tenant.id]
+                excess -= 1
+
+    def loaded(self) -> List[Tenant]:
+        with self._lock:
+            return list(self._tenants.values())
+
+    @contextmanager
+    def use(self, tenant_id: str):
+        """Makes a tenant current (see `current`) for the block."""
+        tenant = self.acquire(tenant_id)
+        token = _current.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current.reset(token)
+            self.release(tenant)
+
+    def current(self) -> Tenant:
+        """
+        The tenant of the running request (or `use` block). Elsewhere (scripts, the
+        shell) the default tenant, which then stays loaded.
+        """
+        tenant = _current.get()
+        if tenant is not None:
+            return tenant
+        with self._pin_lock:
+            if self._pinned is None:
+                self._pinned = self.acquire(DEFAULT_TENANT)  # Never released
+        return self._pinned
+
+    @staticmethod
+    def select(path: str, header: Optional[str]) -> Tuple[str, str]:
+        """
+        (tenant_id, path) for a request: "/t/<tenant>/..." selects the tenant and is
+        stripped from the path, else the X-Tenant header, else the default tenant.
+        ValueError for malformed tenant ids.
+        """
+        match = _PATH_PREFIX.match(path)
+        if match:
+            tenant_id, path = match.group(1), match.group(2) or "/"
+        else:
+            tenant_id = header or DEFAULT_TENANT
+        if not TENANT_ID.fullmatch(tenant_id):
+            raise ValueError(tenant_id)
+        return tenant_id, path
+
+
+class TenantMiddleware:
+    """
+    Runs each HTTP request with its tenant current, leased until the response
+    (streamed bodies included) is fully sent.
+    """
+
+    def __init__(self, app, registry: TenantRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = dict(scope["headers"]).get(TENANT_HEADER.encode())
+        try:
+            tenant_id, path = self.registry.select(scope["path"], header.decode("latin-1") if header else None)
+        except ValueError:
+            await JSONResponse({"detail": "Invalid tenant id"}, status_code=400)(scope, receive, send)
+            return
+        try:
+            # Loading runs off the event loop: it reads every file of the tenant
+            tenant = await run_in_threadpool(self.registry.acquire, tenant_id)
+        except KeyError:
+            await JSONResponse({"detail": "Unknown tenant"}, status_code=404)(scope, receive, send)
+            return
+        if path != scope["path"]:
+            scope = dict(scope, path=path, raw_path=path.encode())
+        token = _current.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            self.registry.release(tenant)
+
+
+class TenantBound:
+    """
+    Stands in for one store of the current tenant: `TenantBound(registry, "schedule")`
+    forwards every attribute to `registry.current().schedule`.
+    """
+
+    def __init__(self, registry: TenantRegistry, store: str):
+        self._registry = registry
+        self._store = store
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._registry.current(), self._store), name)
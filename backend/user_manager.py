@@ -1,12 +1,26 @@
 import json
 import os
+import threading
 from typing import Optional, Dict
+from shared_state import SharedJournal, journaled
 
 class UserManager:
-    def __init__(self, storage_file="users.json"):
+    def __init__(self, storage_file="users.json", shared=False):
         self.storage_file = storage_file
+        # Shared mode: several worker processes use the same file (see shared_state.py)
+        self.journal = SharedJournal(f"{storage_file}.journal", self._apply_shared) if shared else None
+        self.write_lock = threading.RLock()  # Writes from concurrent requests, one at a time
         self.users = self._load_users()
 
+    def _apply_shared(self, entries):
+        # Another worker saved the users: the file is small, reload it
+        self.users = self._load_users()
+
+    def refresh(self):
+        # Picks up changes saved by other workers (one stat() when there are none)
+        if self.journal:
+            self.journal.poll()
+
     def _load_users(self) -> Dict:
         if not os.path.exists(self.storage_file):
             return {}
@@ -24,11 +38,14 @@ class UserManager:
                 f.flush()
                 os.fsync(f.fileno())
             os.replace(temp_file, self.storage_file)
+            if self.journal:
+                self.journal.note(users=True)
         except Exception as e:
             print(f"Error saving {self.storage_file}: {e}")
             if os.path.exists(temp_file):
                 os.remove(temp_file)
 
+    @journaled
     def create_user(self, username, password, email, name, sport="beach tennis", role="user"):
         if username in self.users:
             return False, "Username already exists"
@@ -57,6 +74,7 @@ class UserManager:
         
         return True, "User created successfully. Please verify your email."
 
+    @journaled
     def verify_user(self, username, code):
         user = self.users.get(username)
         if not user:
@@ -74,6 +92,7 @@ class UserManager:
         
         return False, "Invalid verification code"
 
+    @journaled
     def create_default_admin(self):
         if "llorhan" not in self.users:
             print("Creating default admin account...")
@@ -84,20 +103,29 @@ class UserManager:
             self.users["llorhan"]["is_verified"] = True
             self._save_users()
 
-    def get_all_users(self):
+    def get_all_users(self, fields=None):
         # Return list of users without passwords
-        users_list = []
-        for username, data in self.users.items():
-            user_data = data.copy()
+        return [self._public_user(username, data, fields) for username, data in self.users.items()]
+
+    def iter_users(self, fields=None, after=None):
+        # (username, user) pairs ordered by username, starting after the username `after`
+        for username in sorted(self.users):
+            if after is None or username > after:
+                yield username, self._public_user(username, self.users[username], fields)
+
+    def _public_user(self, username, data, fields=None):
+        # Keep verification_code so admin can see it
+        hidden = ("password", "reset_token")
+        if fields is None:
+            user_data = {k: v for k, v in data.items() if k not in hidden}
+            user_data["username"] = username
+            return user_data
+        user_data = {f: data[f] for f in fields if f in data and f not in hidden}
+        if "username" in fields:
             user_data["username"] = username
-            if "password" in user_data:
-                del user_data["password"]
-            if "reset_token" in user_data:
-                del user_data["reset_token"]
-            # Keep verification_code so admin can see it
-            users_list.append(user_data)
-        return users_list
+        return user_data
 
+    @journaled
     def update_user(self, username, data):
         if username not in self.users:
             return False, "User not found"
@@ -112,6 +140,7 @@ class UserManager:
         self._save_users()
         return True, "User updated successfully"
 
+    @journaled
     def delete_user(self, username):
         if username not in self.users:
             return False, "User not found"
@@ -121,6 +150,7 @@ class UserManager:
         return True, "User deleted successfully"
 
     # --- Student Management ---
+    @journaled
     def add_student(self, parent_username, student_name, student_email, sport="beach tennis"):
         if parent_username not in self.users:
             return False, "Parent user not found"
@@ -150,6 +180,7 @@ class UserManager:
             return []
         return self.users[parent_username].get("students", [])
 
+    @journaled
     def update_student(self, parent_username, student_id, data):
         if parent_username not in self.users:
             return False, "Parent user not found"
@@ -176,6 +207,7 @@ class UserManager:
         self._save_users()
         return True, "Student updated successfully"
 
+    @journaled
     def delete_student(self, parent_username, student_id):
         if parent_username not in self.users:
             return False, "Parent user not found"
@@ -208,6 +240,7 @@ class UserManager:
     def get_user(self, username):
         return self.users.get(username)
 
+    @journaled
     def generate_reset_token(self, email):
         # Find user by email
         target_user = None
@@ -232,6 +265,7 @@ class UserManager:
         
         return True, token
 
+    @journaled
     def reset_password(self, token, new_password):
         # Find user with this token
         target_username = None
@@ -23,7 +23,10 @@ const AdminPage = () => {
 
     const fetchUsers = async () => {
         try {
-            const response = await axios.get(`${config.API_URL}/users`);
+            // Only the columns shown here (skips nested student lists)
+            const response = await axios.get(`${config.API_URL}/users`, {
+                params: { fields: 'username,name,email,sport,role,is_verified,verification_code' }
+            });
             setUsers(response.data);
         } catch (err) {
             console.error("Failed to fetch users", err);
@@ -20,6 +20,7 @@ function MakeupSchedulerPage() {
     const [classes, setClasses] = useState([]);
     const [selectedPlayer, setSelectedPlayer] = useState('');
     const [makeupOptions, setMakeupOptions] = useState([]);
+    const [attendanceHistory, setAttendanceHistory] = useState([]); // selected player's latest check-ins
 
     const [showAddPlayer, setShowAddPlayer] = useState(false);
     const [showAddClass, setShowAddClass] = useState(false);
@@ -182,6 +183,18 @@ function MakeupSchedulerPage() {
         }
     };
 
+    // Attendance history lives in its own ledger: load the selected player's latest check-ins
+    // (again whenever the players reload, e.g. after marking attendance)
+    useEffect(() => {
+        if (!selectedPlayer) {
+            setAttendanceHistory([]);
+            return;
+        }
+        axios.get(`${API_URL}/scheduler/players/${selectedPlayer}/attendance?limit=10`)
+            .then(res => setAttendanceHistory(res.data.items))
+            .catch(err => console.error("Error fetching attendance history", err));
+    }, [selectedPlayer, players]);
+
     // Fetch classes for the dropdown when enrollMonth changes
     // Fetch classes for the dropdown when enrollMonth changes
     useEffect(() => {
@@ -218,7 +231,8 @@ function MakeupSchedulerPage() {
             fetchClasses();
         } catch (error) {
             console.error("Error adding class", error);
-            alert("Failed to create class(es)");
+            const conflict = error.response?.data?.detail?.conflicts && error.response.data.detail.message;
+            alert(conflict ? "Schedule conflict: " + conflict : "Failed to create class(es)");
         }
     };
 
@@ -338,7 +352,8 @@ function MakeupSchedulerPage() {
                 time: editingClass.time,
                 coach: editingClass.coach,
                 student_ids: editingClass.student_ids,
-                max_students: Number(editingClass.max_students) || 4
+                max_students: Number(editingClass.max_students) || 4,
+                version: editingClass.version // 409 if someone else changed the class meanwhile
             });
 
             // Series Update Logic
@@ -373,6 +388,17 @@ function MakeupSchedulerPage() {
             setEditingClass(null);
             fetchClasses();
         } catch (error) {
+            if (error.response?.data?.detail?.conflicts) {
+                // The coach already teaches then, or all courts are taken
+                alert("Schedule conflict: " + error.response.data.detail.message);
+                return;
+            }
+            if (error.response?.status === 409) {
+                alert("This class was changed by someone else. Reload it and apply your edit again.");
+                setEditingClass(null);
+                fetchClasses();
+                return;
+            }
             alert("Failed to update class");
         }
     };
@@ -455,7 +481,8 @@ function MakeupSchedulerPage() {
                 name: editingPlayer.name,
                 level: editingPlayer.level,
                 default_days: editingPlayer.default_days,
-                makeup_credits: editingPlayer.makeup_credits
+                makeup_credits: editingPlayer.makeup_credits,
+                version: editingPlayer.version // 409 if someone else changed the player meanwhile
             });
 
             // If there are new weekly classes, enroll them
@@ -1542,8 +1569,8 @@ function MakeupSchedulerPage() {
                                 <div className="mb-8">
                                     <h3 className="text-xs font-bold text-gray-500 uppercase tracking-widest mb-3">Recent Attendance History</h3>
                                     <div className="flex gap-3 overflow-x-auto pb-2">
-                                        {(players.find(p => p.id === selectedPlayer)?.attendance_history || []).length > 0 ? (
-                                            [...(players.find(p => p.id === selectedPlayer)?.attendance_history || [])].reverse().slice(0, 10).map((h, i) => (
+                                        {attendanceHistory.length > 0 ? (
+                                            attendanceHistory.map((h, i) => (
                                                 <div key={i} className="flex-shrink-0 bg-gray-900/60 border border-gray-700 px-4 py-3 rounded-xl text-center min-w-[100px]">
                                                     <div className="text-gray-300 font-bold">{new Date(h.date + 'T00:00:00').toLocaleDateString(undefined, { month: 'short', day: 'numeric' })}</div>
                                                     <div className="text-gray-500 text-[10px] mt-1 pr-1">{h.time}</div>